@@ -1,6 +1,28 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from .authority import merge_agents
 from .models import *
 
-admin.site.register(Agent)
+def merge_selected(modeladmin, request, queryset):
+    """
+    Merges the selected agents into the oldest of them.
+    """
+    pks = sorted(queryset.values_list('pk', flat=True))
+    if len(pks) < 2:
+        modeladmin.message_user(request, 'Select at least two agents to merge.', messages.WARNING)
+        return
+    if queryset.order_by().values('name_type').distinct().count() > 1:
+        modeladmin.message_user(request, 'Only agents of the same name type can be merged.', messages.WARNING)
+        return
+    moved = merge_agents(pks[0], pks[1:], request.user)
+    modeladmin.message_user(request, 'Merged %d agents into %s; %d references repointed.' % (len(pks) - 1, Agent.objects.get(pk=pks[0]), moved))
+merge_selected.short_description = 'Merge selected agents into the oldest'
+
+class AgentAdmin(admin.ModelAdmin):
+    list_display = ('display', 'name', 'name_type')
+    list_filter = ('name_type',)
+    search_fields = ('name', 'display', 'name_key')
+    actions = [merge_selected]
+
+admin.site.register(Agent, AgentAdmin)
 admin.site.register(AgentDateType)
 admin.site.register(AgentAffiliation)
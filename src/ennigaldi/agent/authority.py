@@ -0,0 +1,288 @@
+import json
+import math
+from django.db import transaction
+from changefeed.models import change, record_many
+from ennigaldi.text import name_key, trigrams, similarity
+from ennigaldi.writes import serialized
+from objectinfo.bulk import bulk_update, chunks
+from objectinfo.models import AgentRole, Inscription, Ownership, Rights
+from objectinfo.signals import work_ids
+from .models import Agent, AgentDateType, AgentAffiliation
+
+###########################################################
+# Name keys
+CHUNK = 2000
+
+def agent_keys(chunk=CHUNK, using=None):
+    """
+    Yields (pk, name_type, name, name_key) for every agent, read
+    in keyset-paginated chunks.
+    """
+    queryset = Agent.objects.using(using).order_by('pk').values_list('pk', 'name_type', 'name', 'name_key')
+    last = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last)[:chunk])
+        if not rows:
+            return
+        for row in rows:
+            yield row
+        last = rows[-1][0]
+
+def rekey(chunk=CHUNK, using=None):
+    """
+    Fills in the name_key of agents saved before it existed, or
+    written to without Agent.save(). Returns the number of agents
+    changed.
+    """
+    stale = [(pk, name_key(name)[:255]) for pk, kind, name, key in agent_keys(chunk, using) if key != name_key(name)[:255]]
+    for i in range(0, len(stale), chunk):
+        with transaction.atomic(using=using):
+            for pk, key in stale[i:i + chunk]:
+                Agent.objects.using(using).filter(pk=pk).update(name_key=key)
+    return len(stale)
+# /Name keys
+###########################################################
+
+
+###########################################################
+# Similar names
+# Finds the pairs of agents whose name keys have a trigram
+# similarity of at least threshold without comparing every pair.
+# Agents are first blocked by name type, then compared through
+# an inverted index with prefix filtering (Bayardo et al., "All
+# pairs similarity search"): with the trigrams of each name in
+# order of how rare they are across the table, two names can
+# only reach the threshold if they share one of the first
+# len - ceil(threshold × len) + 1 trigrams of each. Only those
+# prefixes are indexed, and as they are made of rare trigrams
+# their posting lists stay short, so the work grows roughly with
+# the number of agents rather than its square.
+THRESHOLD = 0.6
+# Merging without review asks for more: distinct people, e.g.
+# "Jose Santos" and "Josefa Santos", easily score above 0.7.
+MERGE_THRESHOLD = 0.8
+
+class NameIndex(object):
+    def __init__(self, rows, threshold=THRESHOLD):
+        """
+        rows is a list of (pk, name_key).
+        """
+        self.threshold = threshold
+        self.grams = dict((pk, trigrams(key)) for pk, key in rows)
+        self.frequency = {}
+        for grams in self.grams.values():
+            for g in grams:
+                self.frequency[g] = self.frequency.get(g, 0) + 1
+        self.postings = {}
+
+    def prefix(self, grams):
+        ordered = sorted(grams, key=lambda g: (self.frequency.get(g, 0), g))
+        length = len(ordered) - int(math.ceil(self.threshold * len(ordered) - 1e-9)) + 1
+        return ordered[:length]
+
+    def candidates(self, grams):
+        found = set()
+        for g in self.prefix(grams):
+            found.update(self.postings.get(g, ()))
+        return found
+
+    def matches(self, grams, candidates):
+        result = []
+        for other in candidates:
+            score = similarity(grams, self.grams[other])
+            if score >= self.threshold:
+                result.append((other, score))
+        return result
+
+    def index(self, pk):
+        for g in self.prefix(self.grams[pk]):
+            self.postings.setdefault(g, []).append(pk)
+
+    def pairs(self):
+        """
+        Yields (pk, other pk, similarity) once for every pair of
+        similar names, indexing each name after probing with it.
+        """
+        for pk in sorted(self.grams, key=lambda pk: (len(self.grams[pk]), pk)):
+            grams = self.grams[pk]
+            for other, score in self.matches(grams, self.candidates(grams)):
+                yield (min(pk, other), max(pk, other), score)
+            self.index(pk)
+
+    def search(self, name, limit=None):
+        """
+        Returns [(pk, similarity)] of the indexed names similar to
+        name, best first. pairs() must have been run, or index()
+        called for every pk.
+        """
+        grams = trigrams(name_key(name))
+        found = sorted(self.matches(grams, self.candidates(grams)), key=lambda m: (-m[1], m[0]))
+        return found[:limit] if limit else found
+
+def similar_pairs(threshold=THRESHOLD, chunk=CHUNK, using=None):
+    """
+    Returns [(pk, other pk, similarity)] for every pair of agents
+    of the same name type with similar names.
+    """
+    blocks = {}
+    for pk, kind, name, key in agent_keys(chunk, using):
+        blocks.setdefault(kind, []).append((pk, key or name_key(name)))
+    pairs = []
+    for kind in sorted(blocks):
+        pairs.extend(NameIndex(blocks[kind], threshold).pairs())
+    return pairs
+
+def clusters(pairs):
+    """
+    Groups the agents linked by pairs into clusters, with a
+    union-find, and returns them as sorted lists of pks, largest
+    first.
+    """
+    parent = {}
+
+    def find(pk):
+        root = pk
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while pk != root:
+            parent[pk], pk = root, parent.get(pk, pk)
+        return root
+
+    for pk, other, score in pairs:
+        a, b = find(pk), find(other)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+    groups = {}
+    for pk in parent:
+        groups.setdefault(find(pk), set()).add(pk)
+    for root in groups:
+        groups[root].add(root)
+    return sorted((sorted(g) for g in groups.values()), key=lambda g: (-len(g), g[0]))
+
+def merge_groups(pairs, threshold=MERGE_THRESHOLD):
+    """
+    Returns [(keep, [duplicates])] for the clusters of pairs, where
+    keep is the oldest agent of the cluster and duplicates are
+    the agents whose own similarity to it is at least threshold.
+    Agents joined to it only through a chain of matches are left
+    for a curator to review.
+    """
+    scores = dict(((pk, other), score) for pk, other, score in pairs)
+    groups = []
+    for group in clusters(pairs):
+        keep = group[0]
+        duplicates = [pk for pk in group[1:] if scores.get((keep, pk), 0) >= threshold]
+        if duplicates:
+            groups.append((keep, duplicates))
+    return groups
+
+def duplicate_clusters(threshold=THRESHOLD, using=None):
+    return clusters(similar_pairs(threshold, using=using))
+
+def authority_index(threshold=THRESHOLD, using=None):
+    """
+    Returns a NameIndex of all agents, e.g. to look up the
+    existing authority for each name of an import with search().
+    """
+    index = NameIndex([(pk, key or name_key(name)) for pk, kind, name, key in agent_keys(using=using)], threshold)
+    for pk in index.grams:
+        index.index(pk)
+    return index
+# /Similar names
+###########################################################
+
+
+###########################################################
+# Merging
+# Every reference to the duplicates is pointed at the agent
+# kept, then the duplicates are deleted, all in one
+# transaction. Foreign keys in the change feed applications go
+# through objectinfo.bulk.bulk_update, so the change feed and
+# history record the new values; the rights holders, a
+# many-to-many field, are rewritten in its through table.
+
+# (model, field) of the references that are repointed; each is
+# in objectinfo.bulk.BULK_FIELDS.
+REFERENCES = [
+    (AgentRole, 'agent'),
+    (Inscription, 'inscription_author'),
+    (Ownership, 'owner'),
+]
+
+# Columns of the agent kept that are filled in from a duplicate
+# when blank.
+FILL_FIELDS = ('culture', 'orcid', 'email', 'phone_primary', 'phone_mobile', 'phone_business',
+               'phone_home', 'address_1', 'address_2', 'city', 'state_province', 'zip_code',
+               'country', 'website')
+
+def merge_rights_holders(keep, duplicates):
+    through = Rights.rights_holder.through
+    rows = list(through.objects.filter(agent_id__in=duplicates).values_list('pk', 'rights_id'))
+    if not rows:
+        return 0
+    rights = set(r for pk, r in rows)
+    held = set()
+    for part in chunks(rights):
+        held.update(through.objects.filter(agent_id=keep, rights_id__in=part).values_list('rights_id', flat=True))
+    # A rights statement already listing the agent kept loses the
+    # duplicate; any other gets the agent kept in its place.
+    repoint = []
+    drop = []
+    for pk, r in rows:
+        if r in held:
+            drop.append(pk)
+        else:
+            repoint.append(pk)
+            held.add(r)
+    for part in chunks(drop):
+        through.objects.filter(pk__in=part).delete()
+    for part in chunks(repoint):
+        through.objects.filter(pk__in=part).update(agent_id=keep)
+    holders = {}
+    for part in chunks(rights):
+        for r, agent in through.objects.filter(rights_id__in=part).values_list('rights_id', 'agent_id'):
+            holders.setdefault(r, []).append(agent)
+    record_many([
+        change(Rights, obj.pk, 'm2m', json.dumps({'rights_holder': sorted(holders.get(obj.pk, []))}), work_ids(obj))
+        for obj in Rights.objects.filter(pk__in=rights)
+    ])
+    return len(rows)
+
+def fill_blanks(keep, duplicates):
+    changes = {}
+    for other in duplicates:
+        for field in FILL_FIELDS:
+            if not getattr(keep, field) and not changes.get(field) and getattr(other, field):
+                changes[field] = getattr(other, field)
+        if keep.user_id is None and 'user_id' not in changes and other.user_id is not None:
+            changes['user_id'] = other.user_id
+    if 'user_id' in changes:
+        # The link to a login is one-to-one.
+        Agent.objects.filter(pk__in=[d.pk for d in duplicates]).update(user=None)
+    if changes:
+        Agent.objects.filter(pk=keep.pk).update(**changes)
+
+@serialized
+def merge_agents(keep, duplicates, user=None):
+    """
+    Merges the agents with pks in duplicates into the agent with
+    pk keep. Returns the number of references repointed.
+    """
+    duplicates = [pk for pk in set(duplicates) if pk != keep]
+    if not duplicates:
+        return 0
+    kept = Agent.objects.get(pk=keep)
+    others = list(Agent.objects.filter(pk__in=duplicates).order_by('pk'))
+    comment = 'Merged agents %s into %d' % (', '.join(str(o.pk) for o in others), keep)
+    moved = 0
+    for model, field in REFERENCES:
+        moved += bulk_update(model.objects.filter(**{field + '__in': duplicates}), {field: keep}, user, comment)
+    moved += merge_rights_holders(keep, duplicates)
+    moved += AgentDateType.objects.filter(dated__in=duplicates).update(dated=keep)
+    moved += AgentAffiliation.objects.filter(person__in=duplicates).update(person=keep)
+    moved += AgentAffiliation.objects.filter(organisation__in=duplicates).update(organisation=keep)
+    fill_blanks(kept, others)
+    Agent.objects.filter(pk__in=duplicates).delete()
+    return moved
+# /Merging
+###########################################################
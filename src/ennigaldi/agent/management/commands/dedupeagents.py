@@ -0,0 +1,48 @@
+import csv
+from django.core.management.base import BaseCommand
+from agent.authority import MERGE_THRESHOLD, THRESHOLD, authority_index, clusters, merge_agents, merge_groups, rekey, similar_pairs
+from agent.models import Agent
+
+
+class Command(BaseCommand):
+    help = 'Lists clusters of agents with similar names, and optionally merges into the oldest agent of each cluster the agents most similar to it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                            help='Trigram similarity from 0 to 1 above which two names are taken as the same (default %s).' % THRESHOLD)
+        parser.add_argument('--search', help='List the agents similar to this name instead.')
+        parser.add_argument('--merge', action='store_true',
+                            help='Merge into the agent with the lowest pk of each cluster the agents whose own similarity to it is at least --merge-threshold.')
+        parser.add_argument('--merge-threshold', type=float, default=MERGE_THRESHOLD,
+                            help='Similarity to the agent kept needed to merge without review (default %s).' % MERGE_THRESHOLD)
+
+    def handle(self, *args, **options):
+        changed = rekey()
+        if changed:
+            self.stderr.write('%d name keys updated.' % changed)
+        writer = csv.writer(self.stdout)
+        if options['search']:
+            found = authority_index(options['threshold']).search(options['search'])
+            names = dict(Agent.objects.filter(pk__in=[pk for pk, score in found]).values_list('pk', 'display'))
+            writer.writerow(['agent_id', 'display', 'similarity'])
+            for pk, score in found:
+                writer.writerow([pk, names[pk], '%.2f' % score])
+            return
+        pairs = similar_pairs(options['threshold'])
+        groups = clusters(pairs)
+        names = {}
+        for pk, display in Agent.objects.values_list('pk', 'display').iterator():
+            names[pk] = display
+        writer.writerow(['cluster', 'agent_id', 'display'])
+        for number, group in enumerate(groups, 1):
+            for pk in group:
+                writer.writerow([number, pk, names.get(pk, '')])
+        self.stderr.write('%d clusters of %d agents.' % (len(groups), sum(len(g) for g in groups)))
+        if options['merge']:
+            moved = 0
+            merged = merge_groups(pairs, options['merge_threshold'])
+            for keep, duplicates in merged:
+                moved += merge_agents(keep, duplicates)
+            count = sum(len(duplicates) for keep, duplicates in merged)
+            self.stderr.write('%d agents merged, %d references repointed; %d left for review.'
+                              % (count, moved, sum(len(g) - 1 for g in groups) - count))
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.db.models import Q
+from ennigaldi.text import name_key
 from historicdate.models import HistoricDate, DateType
 from place.models import Place
 
@@ -16,7 +17,7 @@ class Agent(models.Model):
         ('other', 'Other'),
     )
     # VRA Core 4   name
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)
     # Spectrum 4.0 Organisation, people, person
     # VRA Core 4   name > type
     name_type = models.CharField(max_length=15, default='personal', choices=name_types)
@@ -27,7 +28,10 @@ class Agent(models.Model):
     dates = models.ManyToManyField(HistoricDate, related_name='date_for_agent', through='AgentDateType')
     # Use this for complex name display or autopopulate from
     # above data using a pre-save hook.
-    display = models.CharField(max_length=255)
+    display = models.CharField(max_length=255, db_index=True)
+    # Accent-folded, sorted words of name, kept up to date on
+    # save; see ennigaldi.text.name_key and agent.authority.
+    name_key = models.CharField(max_length=255, db_index=True, blank=True, editable=False)
     # Further identification, if available
     user = models.OneToOneField(User, models.CASCADE, null=True)
     orcid = models.CharField(max_length=31, blank=True)
@@ -47,6 +51,10 @@ class Agent(models.Model):
     country = models.CharField(max_length=31, blank=True)
     website = models.CharField(max_length=255, blank=True)
 
+    def save(self, *args, **kwargs):
+        self.name_key = name_key(self.name)[:255]
+        super(Agent, self).save(*args, **kwargs)
+
     def __str__(self):
         return self.display
 
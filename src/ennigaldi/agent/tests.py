@@ -1,6 +1,11 @@
+import datetime
+from io import StringIO
+from django.core.management import call_command
 from django.test import TestCase
+from .authority import duplicate_clusters, authority_index, merge_agents
 from .models import Agent, AgentDateType, AgentAffiliation
 from historicdate.models import HistoricDate
+from objectinfo.models import ObjectRegister, ObjectName, IsoLanguage, Production, AgentRole, Inscription, Rights
 
 class TestAgent(TestCase):
     def setUp(self):
@@ -40,3 +45,62 @@ class TestAgent(TestCase):
         self.assertTrue("60" not in caesar_lives.datation.earliest)
         self.assertTrue("60" in caesar_acts.datation.earliest)
         self.assertEqual(caesar,caesar_lives.dated)
+
+class TestAuthority(TestCase):
+    def setUp(self):
+        self.portinari = Agent.objects.create(name="Candido Portinari", display="Candido Portinari")
+        self.inverted = Agent.objects.create(name="Portinari, Cândido", display="Portinari, Cândido", email="cp@example.com")
+        self.typo = Agent.objects.create(name="Candido Portinary", display="Candido Portinary")
+        self.other = Agent.objects.create(name="Tarsila do Amaral", display="Tarsila do Amaral")
+        self.corporate = Agent.objects.create(name="Candido Portinari", name_type="corporate", display="Projeto Portinari")
+
+    def test_name_key(self):
+        """
+        Check that accents, case, punctuation and word order do
+        not change the key.
+        """
+        self.assertEqual(self.inverted.name_key, 'candido portinari')
+        self.assertEqual(self.portinari.name_key, self.inverted.name_key)
+
+    def test_clusters(self):
+        """
+        Check that similar names of the same name type, and only
+        those, end up in one cluster.
+        """
+        self.assertEqual(duplicate_clusters(), [[self.portinari.pk, self.inverted.pk, self.typo.pk]])
+        found = [pk for pk, score in authority_index().search('PORTINARI, Candido')]
+        self.assertEqual(found[:2], sorted([self.portinari.pk, self.inverted.pk]))
+        self.assertNotIn(self.other.pk, found)
+
+    def test_merge(self):
+        """
+        Check that merging repoints roles, inscriptions and rights
+        holders to the agent kept and deletes the duplicates.
+        """
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        production = Production.objects.create(date=HistoricDate.objects.create(display="1935"))
+        work = ObjectRegister.objects.create(preferred_title=ObjectName.objects.create(title="Café", lang=ptbr), production=production)
+        role = AgentRole.objects.create(agent=self.inverted, work=production, agent_role='painter', agent_role_display='Painted by')
+        inscription = Inscription.objects.create(work=work, inscription_type='signature', inscription_author=self.typo)
+        rights = Rights.objects.create(work=work, right_begin_date=datetime.date(1935, 1, 1), right_end_date=datetime.date(2032, 1, 1), rights_display='©')
+        rights.rights_holder.add(self.portinari, self.inverted)
+        moved = merge_agents(self.portinari.pk, [self.inverted.pk, self.typo.pk])
+        self.assertEqual(moved, 3)
+        self.assertEqual(AgentRole.objects.get(pk=role.pk).agent_id, self.portinari.pk)
+        self.assertEqual(Inscription.objects.get(pk=inscription.pk).inscription_author_id, self.portinari.pk)
+        self.assertEqual(list(rights.rights_holder.values_list('pk', flat=True)), [self.portinari.pk])
+        self.assertFalse(Agent.objects.filter(pk__in=[self.inverted.pk, self.typo.pk]).exists())
+        self.assertEqual(Agent.objects.get(pk=self.portinari.pk).email, "cp@example.com")
+
+    def test_merge_chain(self):
+        """
+        Check that the command only merges the agents similar to the
+        one kept, not those joined to it through a chain of matches.
+        """
+        names = ["Maria da Silva", "Mario da Silva", "Mario da Silveira", "Marcos da Silveira"]
+        silvas = [Agent.objects.create(name=name, display=name) for name in names]
+        self.assertIn([a.pk for a in silvas], duplicate_clusters())
+        call_command('dedupeagents', merge=True, merge_threshold=0.6, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(list(Agent.objects.filter(pk__in=[a.pk for a in silvas]).values_list('name', flat=True).order_by('pk')),
+                         ["Maria da Silva", "Mario da Silveira", "Marcos da Silveira"])
+        self.assertFalse(Agent.objects.filter(pk__in=[self.inverted.pk, self.typo.pk]).exists())
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class ChangefeedConfig(AppConfig):
+    name = 'changefeed'
+
+    def ready(self):
+        from . import signals
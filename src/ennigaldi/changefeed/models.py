@@ -0,0 +1,85 @@
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models.fields.files import FieldFile
+
+###########################################################
+# Change feed
+# One row per saved or deleted record in the feed applications
+# (objectinfo, reorg and storageunit by default), numbered by a
+# monotonic sequence. Mirrors and search indexes remember the
+# last sequence number they applied and ask for the changes
+# after it, instead of re-exporting the whole collection.
+# Under SQLite writers are serialised, so sequence numbers
+# become visible in order; on a database with concurrent
+# writers, consumers should re-read a few numbers back.
+class Change(models.Model):
+    actions = (
+        ('save', 'Saved'),
+        ('delete', 'Deleted'),
+        # Partial changes: 'data' only holds the columns set by a
+        # bulk edit, or the related pks of one many-to-many field.
+        ('update', 'Columns changed'),
+        ('m2m', 'Relations changed'),
+    )
+    seq = models.BigAutoField(primary_key=True)
+    # 'app_label.model_name', as in Django serialisations.
+    model = models.CharField(max_length=127)
+    object_pk = models.CharField(max_length=63)
+    action = models.CharField(max_length=7, choices=actions)
+    # Comma-separated pks of the works whose record this row
+    # belongs to, if any, so indexers can rebuild just those.
+    works = models.CharField(max_length=255, blank=True)
+    # JSON object of the row's column values (empty on delete).
+    data = models.TextField(blank=True)
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['seq']
+        index_together = ('model', 'object_pk')
+
+    def __str__(self):
+        return '#%d %s %s %s' % (self.seq, self.action, self.model, self.object_pk)
+
+    def as_dict(self):
+        return {
+            'seq': self.seq,
+            'model': self.model,
+            'pk': self.object_pk,
+            'action': self.action,
+            'works': [int(w) for w in self.works.split(',') if w],
+            'data': json.loads(self.data) if self.data else None,
+            'time': self.timestamp.isoformat(),
+        }
+
+
+def model_label(model):
+    return '%s.%s' % (model._meta.app_label, model._meta.model_name)
+
+def row_data(instance):
+    """
+    Returns the column values of a row, keyed by attname,
+    as a JSON string.
+    """
+    data = {}
+    for field in instance._meta.concrete_fields:
+        value = field.value_from_object(instance)
+        if isinstance(value, FieldFile):
+            value = value.name or None
+        data[field.attname] = value
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+
+def change(model, pk, action, data='', works=()):
+    return Change(model=model_label(model), object_pk=str(pk), action=action, data=data, works=','.join(str(w) for w in works))
+
+def record(model, pk, action, data='', works=()):
+    change(model, pk, action, data, works).save()
+
+def record_many(changes):
+    """
+    Appends a list of unsaved Change rows in one INSERT, for bulk
+    operations that bypass the model signals.
+    """
+    Change.objects.bulk_create(changes)
+# /Change feed
+###########################################################
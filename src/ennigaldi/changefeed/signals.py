@@ -0,0 +1,36 @@
+import json
+from django.apps import apps
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from objectinfo.signals import work_ids
+from .models import record, row_data
+
+FEED_APPS = getattr(settings, 'CHANGEFEED_APPS', ('objectinfo', 'reorg', 'storageunit'))
+
+def record_save(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    record(sender, instance.pk, 'save', row_data(instance), work_ids(instance))
+
+def record_delete(sender, instance, **kwargs):
+    record(sender, instance.pk, 'delete', works=work_ids(instance))
+
+def record_m2m(sender, instance, action, reverse, model, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # Record the new state of the forward side's field only.
+    if reverse:
+        return
+    for field in type(instance)._meta.many_to_many:
+        if field.remote_field.through is sender:
+            pks = list(getattr(instance, field.name).values_list('pk', flat=True))
+            record(type(instance), instance.pk, 'm2m', json.dumps({field.name: pks}), work_ids(instance))
+
+for label in FEED_APPS:
+    for model in apps.get_app_config(label).get_models():
+        uid = 'changefeed_%s_%s' % (label, model._meta.model_name)
+        post_save.connect(record_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(record_delete, sender=model, dispatch_uid=uid)
+        for field in model._meta.local_many_to_many:
+            if field.remote_field.through._meta.auto_created:
+                m2m_changed.connect(record_m2m, sender=field.remote_field.through, dispatch_uid=uid + '_' + field.name)
@@ -0,0 +1,46 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from objectinfo.models import ObjectRegister, ObjectName, Dimension, IsoLanguage
+from storageunit.models import Unit
+from .models import Change
+
+class TestChangeFeed(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='mirror', password='harvest-me')
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        t1 = ObjectName.objects.create(title="Oratório", lang=ptbr)
+        self.work = ObjectRegister.objects.create(preferred_title=t1)
+
+    def test_signals_record_changes(self):
+        """
+        Check that saves and deletes are recorded in order, with
+        the work they belong to.
+        """
+        start = Change.objects.last().seq
+        dim = Dimension.objects.create(work=self.work, dimension_type='height', dimension_value=300)
+        dim.delete()
+        changes = list(Change.objects.filter(seq__gt=start))
+        self.assertEqual([c.action for c in changes], ['save', 'delete'])
+        self.assertEqual(changes[0].works, str(self.work.pk))
+        self.assertTrue('"dimension_value":300' in changes[0].data)
+
+    def test_changes_since(self):
+        """
+        Check that the endpoint pages through the feed and sends
+        a row changed twice only once.
+        """
+        self.assertEqual(self.client.get('/changes/').status_code, 403)
+        self.client.login(username='mirror', password='harvest-me')
+        start = Change.objects.last().seq
+        unit = Unit.objects.create(acronym='R01', name='Reserve')
+        unit.name = 'Main reserve'
+        unit.save()
+        Unit.objects.create(acronym='R02')
+
+        page = self.client.get('/changes/', {'since': start, 'limit': 2}).json()
+        self.assertTrue(page['more'])
+        self.assertEqual(len(page['changes']), 1)
+        self.assertEqual(page['changes'][0]['data']['name'], 'Main reserve')
+        page = self.client.get('/changes/', {'since': page['next']}).json()
+        self.assertFalse(page['more'])
+        self.assertEqual(page['changes'][0]['data']['acronym'], 'R02')
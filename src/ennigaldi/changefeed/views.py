@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.http import JsonResponse, HttpResponseBadRequest
+from .models import Change
+
+def authorised(request):
+    if request.user.is_authenticated:
+        return True
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return header.startswith('Token ') and header[6:] in getattr(settings, 'CHANGEFEED_TOKENS', ())
+
+def feed(since, limit, models=None):
+    """
+    Returns the page of changes after since that changes()
+    serves, optionally only those of some models, given as
+    'app_label.model_name'.
+    """
+    rows = Change.objects.filter(seq__gt=since)
+    top = None
+    if models is not None:
+        # Once the filtered changes are all sent, next skips the
+        # others too, so that they are not scanned again.
+        top = Change.objects.order_by('-seq').values_list('seq', flat=True).first() or since
+        rows = rows.filter(model__in=models, seq__lte=top)
+    rows = list(rows.order_by('seq')[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for row in rows:
+        key = (row.model, row.object_pk)
+        if row.action in ('update', 'm2m') and key in latest and latest[key]['action'] != 'delete':
+            # Fold partial changes into the row's latest state.
+            previous = latest.pop(key)
+            merged = row.as_dict()
+            merged['action'] = previous['action']
+            merged['data'] = dict(previous['data'] or {}, **merged['data'])
+            latest[key] = merged
+        else:
+            latest.pop(key, None)
+            latest[key] = row.as_dict()
+
+    return {
+        'since': since,
+        'next': top if top is not None and not more else (rows[-1].seq if rows else since),
+        'more': more,
+        'changes': sorted(latest.values(), key=lambda c: c['seq']),
+    }
+
+def changes(request):
+    """
+    Returns the changes after sequence number `since`, oldest
+    first, at most `limit` at a time. A row changed several times
+    within one page is sent once, with its latest state. Clients
+    keep `next` and ask again while `more` is true.
+    """
+    if not authorised(request):
+        return JsonResponse({'error': 'Authentication required.'}, status=403)
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = min(int(request.GET.get('limit', 500)), getattr(settings, 'CHANGEFEED_MAX_LIMIT', 5000))
+    except ValueError:
+        return HttpResponseBadRequest('since and limit must be integers.')
+    if limit < 1:
+        return HttpResponseBadRequest('limit must be positive.')
+    return JsonResponse(feed(since, limit))
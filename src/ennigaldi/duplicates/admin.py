@@ -0,0 +1,11 @@
+from django.contrib import admin
+from .models import Candidate
+
+class CandidateAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'work1', 'work2', 'score', 'title_score', 'size_score', 'image_score', 'status')
+    list_editable = ('status',)
+    list_filter = ('status',)
+    list_select_related = ('work1__preferred_title', 'work2__preferred_title')
+    raw_id_fields = ('work1', 'work2')
+
+admin.site.register(Candidate, CandidateAdmin)
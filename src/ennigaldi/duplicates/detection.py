@@ -0,0 +1,228 @@
+import json
+import random
+import zlib
+from django.db.models import Count, F, Q
+from ennigaldi.text import fold, trigrams
+from ennigaldi.writes import serialized
+from objectinfo.bulk import chunks
+from objectinfo.models import ObjectRegister
+from storageunit.capacity import TYPES, current_dimensions
+from .models import Signature, Bucket, Candidate
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+###########################################################
+# Signatures
+# Titles are compared through MinHash: PERMUTATIONS hash values
+# of the title's trigrams, of which two titles share a fraction
+# equal on average to their trigram similarity. They are cut into
+# BANDS bands of ROWS values; two works land in the same bucket
+# when one band is equal, which happens for most pairs whose
+# titles are at least about (1 / BANDS) ** (1 / ROWS) ≈ 0.6
+# similar and few below. Snapshots are reduced to a 64-bit
+# difference hash (dHash), cut into IMAGE_BANDS bands, so that
+# photographs differing in up to IMAGE_BANDS - 1 bits of the hash
+# still share a bucket.
+PERMUTATIONS = 32
+BANDS = 8
+ROWS = PERMUTATIONS // BANDS
+IMAGE_BANDS = 4
+_PRIME = (1 << 61) - 1
+_random = random.Random(20170301)
+_COEFFICIENTS = [(_random.randrange(1, _PRIME), _random.randrange(0, _PRIME)) for i in range(PERMUTATIONS)]
+
+def minhash(text):
+    """
+    Returns the MinHash values of the trigrams of a folded text,
+    or [] if it has none.
+    """
+    values = [zlib.crc32(g.encode('utf-8')) for g in trigrams(text)]
+    if not values:
+        return []
+    return [min((a * v + b) % _PRIME for v in values) for a, b in _COEFFICIENTS]
+
+def dhash(image):
+    """
+    Returns the difference hash of a PIL image as 16 hex digits:
+    one bit per pair of neighbouring pixels of a 9×8 grey
+    thumbnail, set where the left one is brighter.
+    """
+    pixels = list(image.convert('L').resize((9, 8), Image.ANTIALIAS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = bits << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return '%016x' % bits
+
+def snapshot_hash(work):
+    if Image is None or not work.snapshot:
+        return ''
+    try:
+        work.snapshot.open('rb')
+        try:
+            return dhash(Image.open(work.snapshot))
+        finally:
+            work.snapshot.close()
+    except (IOError, OSError, ValueError):
+        # Missing or unreadable files are signed without a hash.
+        return ''
+
+def buckets(signature):
+    keys = []
+    values = signature.minhash.split(',') if signature.minhash else []
+    for band in range(BANDS if values else 0):
+        rows = ','.join(values[band * ROWS:(band + 1) * ROWS])
+        keys.append('t%d:%08x' % (band, zlib.crc32(rows.encode('ascii'))))
+    width = 16 // IMAGE_BANDS
+    for band in range(IMAGE_BANDS if signature.image_hash else 0):
+        keys.append('i%d:%s' % (band, signature.image_hash[band * width:(band + 1) * width]))
+    return keys
+
+def sign(works):
+    """
+    Returns an unsaved Signature for each ObjectRegister in works.
+    """
+    sizes = current_dimensions(works=[w.pk for w in works])
+    signatures = []
+    for work in works:
+        title = fold(work.preferred_title.title)[:255]
+        size = dict((kind, value) for kind, value in sizes.get(work.pk, {}).items() if value)
+        signatures.append(Signature(
+            work=work,
+            title=title,
+            minhash=','.join(str(v) for v in minhash(title)),
+            size=json.dumps(size, sort_keys=True) if size else '',
+            image_hash=snapshot_hash(work),
+            signed=work.last_modified,
+        ))
+    return signatures
+# /Signatures
+###########################################################
+
+
+###########################################################
+# Comparison
+# Works sharing a bucket are scored on every part both have:
+# the share of equal MinHash values, the ratio of each shared
+# dimension, and the share of equal bits in the snapshot hashes,
+# weighted by WEIGHTS. Pairs scoring at least THRESHOLD are kept
+# as Candidates for review. Buckets holding more than MAX_BUCKET
+# works (a title shared by a whole lot of sherds, say) are not
+# used, as they would bring back the quadratic comparison.
+WEIGHTS = {'title': 0.5, 'size': 0.2, 'image': 0.3}
+THRESHOLD = 0.7
+MAX_BUCKET = 200
+
+def title_score(a, b):
+    if not a.minhash or not b.minhash:
+        return None
+    a, b = a.minhash.split(','), b.minhash.split(',')
+    return sum(1 for x, y in zip(a, b) if x == y) / float(PERMUTATIONS)
+
+def size_score(a, b):
+    if not a.size or not b.size:
+        return None
+    a, b = json.loads(a.size), json.loads(b.size)
+    shared = [kind for kind in TYPES if kind in a and kind in b]
+    if not shared:
+        return None
+    return sum(min(a[k], b[k]) / float(max(a[k], b[k])) for k in shared) / len(shared)
+
+def image_score(a, b):
+    if not a.image_hash or not b.image_hash:
+        return None
+    return 1 - bin(int(a.image_hash, 16) ^ int(b.image_hash, 16)).count('1') / 64.0
+
+def score(a, b):
+    """
+    Returns (score, title, size, image) for two Signatures.
+    """
+    parts = {'title': title_score(a, b), 'size': size_score(a, b), 'image': image_score(a, b)}
+    weights = sum(WEIGHTS[p] for p, value in parts.items() if value is not None)
+    total = sum(WEIGHTS[p] * value for p, value in parts.items() if value is not None) / weights if weights else 0
+    return total, parts['title'], parts['size'], parts['image']
+
+def compare(signature, keys):
+    """
+    Returns {other work pk: score tuple} for the works sharing one
+    of keys with signature's work and scoring at least THRESHOLD.
+    """
+    common = (Bucket.objects.filter(key__in=keys).values('key')
+              .annotate(works=Count('work')).filter(works__gt=MAX_BUCKET).values_list('key', flat=True))
+    keys = set(keys) - set(common)
+    others = set(Bucket.objects.filter(key__in=keys).exclude(work=signature.work_id).values_list('work', flat=True))
+    found = {}
+    for part in chunks(others):
+        for other in Signature.objects.filter(work__in=part):
+            result = score(signature, other)
+            if result[0] >= THRESHOLD:
+                found[other.work_id] = result
+    return found
+
+def stale(chunk, using=None):
+    """
+    Yields chunks of the works not signed since they were last
+    saved.
+    """
+    queryset = (ObjectRegister.objects.using(using).select_related('preferred_title')
+                .filter(Q(signature__isnull=True) | Q(last_modified__gt=F('signature__signed'))).order_by('pk'))
+    last = 0
+    while True:
+        works = list(queryset.filter(pk__gt=last)[:chunk])
+        if not works:
+            return
+        yield works
+        last = works[-1].pk
+
+@serialized
+def update_works(works):
+    """
+    Signs works, replaces their buckets and re-scores their open
+    candidates. Returns the number of candidates kept.
+    """
+    pks = [w.pk for w in works]
+    signatures = sign(works)
+    Signature.objects.filter(work__in=pks).delete()
+    Signature.objects.bulk_create(signatures)
+    Bucket.objects.filter(work__in=pks).delete()
+    keys = dict((s.work_id, buckets(s)) for s in signatures)
+    Bucket.objects.bulk_create([Bucket(key=key, work_id=pk) for pk in pks for key in keys[pk]])
+
+    # Reviewed pairs are left as they were reviewed.
+    reviewed = set(Candidate.objects.filter(Q(work1__in=pks) | Q(work2__in=pks)).exclude(status='open').values_list('work1', 'work2'))
+    Candidate.objects.filter(Q(work1__in=pks) | Q(work2__in=pks), status='open').delete()
+    found = {}
+    for signature in signatures:
+        for other, result in compare(signature, keys[signature.work_id]).items():
+            pair = (min(signature.work_id, other), max(signature.work_id, other))
+            if pair not in reviewed:
+                found[pair] = result
+    Candidate.objects.bulk_create([
+        Candidate(work1_id=pair[0], work2_id=pair[1], score=result[0], title_score=result[1], size_score=result[2], image_score=result[3])
+        for pair, result in sorted(found.items())
+    ])
+    return len(found)
+
+def update(chunk=200, using=None):
+    """
+    Signs and compares the works added or changed since the last
+    run. Returns (works signed, candidates found).
+    """
+    signed = 0
+    found = 0
+    for works in stale(chunk, using):
+        found += update_works(works)
+        signed += len(works)
+    return signed, found
+
+def ranked(limit=None):
+    """
+    Returns the open candidates, most alike first.
+    """
+    candidates = Candidate.objects.filter(status='open').select_related('work1__preferred_title', 'work2__preferred_title')
+    return candidates[:limit] if limit else candidates
+# /Comparison
+###########################################################
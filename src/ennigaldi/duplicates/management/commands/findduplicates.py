@@ -0,0 +1,20 @@
+import csv
+from django.core.management.base import BaseCommand
+from duplicates.detection import ranked, update
+
+
+class Command(BaseCommand):
+    help = 'Compares the works added or changed since the last run with the collection, and lists likely duplicates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk', type=int, default=200, help='Works signed per transaction.')
+        parser.add_argument('--limit', type=int, default=100, help='Candidates listed, most alike first (0 for all).')
+
+    def handle(self, *args, **options):
+        signed, found = update(options['chunk'])
+        self.stderr.write('%d works signed, %d candidates found.' % (signed, found))
+        writer = csv.writer(self.stdout)
+        writer.writerow(['score', 'work1', 'title1', 'work2', 'title2', 'title_score', 'size_score', 'image_score'])
+        for c in ranked(options['limit'] or None):
+            writer.writerow(['%.2f' % c.score, c.work1_id, c.work1.preferred_title.title, c.work2_id, c.work2.preferred_title.title] +
+                            ['' if s is None else '%.2f' % s for s in (c.title_score, c.size_score, c.image_score)])
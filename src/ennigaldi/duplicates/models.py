@@ -0,0 +1,64 @@
+from django.db import models
+from objectinfo.models import ObjectRegister
+
+###########################################################
+# Near-duplicate works
+# Field surveys sometimes register one object twice, with a
+# slightly different title or snapshot. Each work gets a
+# Signature summing up its title, size and snapshot; its MinHash
+# bands and snapshot hash bands are stored as Buckets, and only
+# works sharing a bucket are compared, so registering a work
+# costs a few index lookups rather than a comparison with the
+# whole collection. See duplicates.detection.
+class Signature(models.Model):
+    work = models.OneToOneField(ObjectRegister, models.CASCADE, primary_key=True, related_name='signature')
+    # Folded preferred title, see ennigaldi.text.fold.
+    title = models.CharField(max_length=255, blank=True)
+    # Comma-separated MinHash values of the title's trigrams.
+    minhash = models.TextField(blank=True)
+    # JSON of {dimension type: value} of the whole work.
+    size = models.CharField(max_length=255, blank=True)
+    # 64-bit difference hash of the snapshot, in hex.
+    image_hash = models.CharField(max_length=16, blank=True)
+    # ObjectRegister.last_modified when this was computed; the
+    # work is signed again once it is saved after that.
+    signed = models.DateTimeField()
+
+    def __str__(self):
+        return 'Signature of work %d' % self.work_id
+
+class Bucket(models.Model):
+    # 't<band>:<hash>' for title bands, 'i<band>:<bits>' for
+    # snapshot hash bands.
+    key = models.CharField(max_length=31)
+    work = models.ForeignKey(ObjectRegister, models.CASCADE, related_name='+')
+
+    class Meta:
+        index_together = (('key', 'work'), ('work', 'key'))
+
+class Candidate(models.Model):
+    statuses = (
+        ('open', 'To review'),
+        ('duplicate', 'Duplicate'),
+        ('distinct', 'Not a duplicate'),
+    )
+    # work1 has the lower pk.
+    work1 = models.ForeignKey(ObjectRegister, models.CASCADE, related_name='+')
+    work2 = models.ForeignKey(ObjectRegister, models.CASCADE, related_name='+')
+    score = models.FloatField(db_index=True)
+    # Similarity of each part of the signatures, from 0 to 1, or
+    # null when either work lacks that part.
+    title_score = models.FloatField(null=True, blank=True)
+    size_score = models.FloatField(null=True, blank=True)
+    image_score = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=15, default='open', choices=statuses, db_index=True)
+    found = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = ('work1', 'work2')
+
+    def __str__(self):
+        return 'Works %d and %d (%.2f)' % (self.work1_id, self.work2_id, self.score)
+# /Near-duplicate works
+###########################################################
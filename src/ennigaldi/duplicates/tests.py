@@ -0,0 +1,47 @@
+from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from objectinfo.models import ObjectRegister, ObjectName, IsoLanguage, Dimension
+from .detection import update, ranked
+from .models import Candidate, Signature
+
+class TestDuplicates(TestCase):
+    def setUp(self):
+        self.ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        self.vase = self.work("Vaso de cerâmica com alça", 120)
+        self.copy = self.work("Vaso de ceramica com alca", 121)
+        self.plate = self.work("Prato raso", 30)
+
+    def work(self, title, height):
+        image = SimpleUploadedFile(name='snapshot.png', content=open('../sample/350x150.png', 'rb').read(), content_type='image/png')
+        work = ObjectRegister.objects.create(snapshot=image, preferred_title=ObjectName.objects.create(title=title, lang=self.ptbr))
+        Dimension.objects.create(work=work, dimension_type='height', dimension_value=height)
+        return work
+
+    def test_candidates(self):
+        """
+        Check that the pair with near-identical titles, sizes and
+        snapshots is found, and only it.
+        """
+        self.assertEqual(update(), (3, 1))
+        candidate = ranked()[0]
+        self.assertEqual((candidate.work1_id, candidate.work2_id), (self.vase.pk, self.copy.pk))
+        self.assertEqual(candidate.title_score, 1.0)
+        self.assertEqual(candidate.image_score, 1.0)
+        self.assertGreater(candidate.size_score, 0.99)
+
+    def test_incremental(self):
+        """
+        Check that later runs only sign new or changed works, and
+        that reviewed pairs are not brought back.
+        """
+        update()
+        self.assertEqual(update(), (0, 0))
+        Candidate.objects.update(status='distinct')
+        self.copy.source = 'Field survey'
+        self.copy.save()
+        self.assertEqual(update(), (1, 0))
+        self.assertEqual(Candidate.objects.get().status, 'distinct')
+        self.assertEqual(Signature.objects.count(), 3)
+        late = self.work("Vaso de cerâmica com alça", 119)
+        self.assertEqual(update()[0], 1)
+        self.assertEqual(Candidate.objects.filter(status='open', work2=late).count(), 2)
@@ -0,0 +1,41 @@
+from django.db.backends.sqlite3 import base
+
+# Production settings for a single-file install. WAL lets readers
+# carry on while a curator saves, synchronous=NORMAL only fsyncs
+# at checkpoints (still safe against corruption under WAL), and
+# the mmap/cache sizes keep the working set of a mid-sized
+# collection in memory. Negative cache_size is in KiB.
+DEFAULT_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', 268435456),
+    ('cache_size', -65536),
+    ('temp_store', 'MEMORY'),
+)
+
+def apply_pragmas(connection, pragmas):
+    """
+    Runs the PRAGMA statements on a DB-API sqlite3 connection.
+    Accepts a dict or a sequence of (name, value) pairs.
+    """
+    if hasattr(pragmas, 'items'):
+        pragmas = pragmas.items()
+    cursor = connection.cursor()
+    for name, value in pragmas:
+        cursor.execute('PRAGMA %s = %s' % (name, value))
+    cursor.close()
+
+
+# Drop-in replacement for django.db.backends.sqlite3 which sets
+# the pragmas above on every new connection. Override them with
+# a 'pragmas' entry in the database OPTIONS.
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super(DatabaseWrapper, self).get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', DEFAULT_PRAGMAS)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super(DatabaseWrapper, self).get_new_connection(conn_params)
+        apply_pragmas(conn, self.pragmas)
+        return conn
@@ -0,0 +1,77 @@
+import threading
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+###########################################################
+# Reporting database
+# Read-only pages (lists, detail and M305 sheets, exports,
+# unit browsing) are sent to the REPORTING_DATABASE alias so
+# that they do not compete with data entry on the primary.
+# The choice is made per request by ReportingMiddleware and
+# handed to the router through a thread-local, since routers
+# have no access to the request.
+_state = threading.local()
+
+def reporting_alias():
+    alias = getattr(settings, 'REPORTING_DATABASE', 'reporting')
+    return alias if alias in settings.DATABASES else None
+
+def use_primary():
+    """
+    Sends the remaining reads of the current request to the
+    primary database.
+    """
+    _state.reporting = False
+
+
+class ReportingRouter(object):
+    def db_for_read(self, model, **hints):
+        if getattr(_state, 'reporting', False):
+            return reporting_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Once a request writes, it must read its own writes.
+        use_primary()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != reporting_alias()
+
+
+# After a successful write the browser gets a short-lived cookie,
+# and until it expires that curator's reads stay on the primary,
+# so the page they are redirected to shows what they just saved
+# even if the reporting copy lags behind.
+class ReportingMiddleware(object):
+    cookie = 'primary_db'
+
+    def __init__(self, get_response):
+        if reporting_alias() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.views = getattr(settings, 'REPORTING_VIEWS', [])
+        self.sticky = getattr(settings, 'REPORTING_STICKY_SECONDS', 10)
+
+    def __call__(self, request):
+        use_primary()
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary()
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(self.cookie, '1', max_age=self.sticky, httponly=True)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if (request.method in ('GET', 'HEAD')
+                and match is not None and match.url_name in self.views
+                and self.cookie not in request.COOKIES):
+            _state.reporting = True
+# /Reporting database
+###########################################################
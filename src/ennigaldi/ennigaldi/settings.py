@@ -44,6 +44,15 @@ INSTALLED_APPS = [
     'storageunit.apps.StorageunitConfig',
     'objectinfo.apps.ObjectinfoConfig',
     'reorg.apps.ReorgConfig',
+    'profiler.apps.ProfilerConfig',
+    'changefeed.apps.ChangefeedConfig',
+    'history.apps.HistoryConfig',
+    'duplicates.apps.DuplicatesConfig',
+    'oai.apps.OaiConfig',
+    'image.apps.ImageConfig',
+    'labels.apps.LabelsConfig',
+    'fieldsync.apps.FieldsyncConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
@@ -54,6 +63,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'profiler.middleware.QueryProfileMiddleware',
+    'ennigaldi.routers.ReportingMiddleware',
 #    'countries_plus.middleware.AddRequestCountryMiddleware',
 ]
 
@@ -83,13 +94,195 @@ WSGI_APPLICATION = 'ennigaldi.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/1.10/ref/settings/#databases
 
+# The bundled SQLite backend sets WAL journaling and the other
+# pragmas in ennigaldi/backends/sqlite3/base.py on connect; list
+# them under OPTIONS['pragmas'] to override. 'timeout' is how
+# long (in seconds) a writer waits for the database lock.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'ennigaldi.backends.sqlite3',
+        'NAME': 'ennigaldi.db',
+        'OPTIONS': {
+            'timeout': 20,
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'mmap_size': 268435456,
+                'cache_size': -65536,
+                'temp_store': 'MEMORY',
+            },
+        },
+    },
+    # Read-only views are served from this alias; see REPORTING_*
+    # below. By default it is a second connection to the same file,
+    # which under WAL reads without blocking the writer. Point it
+    # at a replica (a copy kept up to date with litestream or
+    # sqlite3 .backup, or a PostgreSQL standby) to take the load
+    # off the primary altogether.
+    'reporting': {
+        'ENGINE': 'ennigaldi.backends.sqlite3',
         'NAME': 'ennigaldi.db',
-    }
+        'OPTIONS': {
+            'timeout': 20,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
+DATABASE_ROUTERS = ['ennigaldi.routers.ReportingRouter']
+
+# Views (by URL name) whose GET requests read from the reporting
+# database, and how long a curator's reads stay on the primary
+# after they save something.
+
+REPORTING_DATABASE = 'reporting'
+REPORTING_VIEWS = [
+    'object_list',
+    'objectregister_detail',
+    'sicg_m305',
+    'vra_core_xml',
+    'yaml',
+    'unit_list',
+    'unit_list_top',
+    'unit_detail',
+    'capacity_report',
+    'batch_list',
+    'work_map',
+    'oai',
+    'linked_art',
+    'linked_art_dump',
+    'iiif_info',
+    'iiif_image',
+    'iiif_manifest',
+]
+REPORTING_STICKY_SECONDS = 10
+
+# Tests read from the primary; see ennigaldi/testing.py.
+TEST_RUNNER = 'ennigaldi.testing.TestRunner'
+
+# Change feed
+# Saves and deletes in these applications are appended to the
+# change feed served at /changes/?since=N. Besides logged-in
+# users, clients sending "Authorization: Token <token>" with one
+# of CHANGEFEED_TOKENS may read it.
+
+CHANGEFEED_APPS = ('objectinfo', 'reorg', 'storageunit')
+CHANGEFEED_TOKENS = ()
+CHANGEFEED_MAX_LIMIT = 5000
+
+# Batch dashboard
+# The figures of each batch are cached in the BATCH_STATS_CACHE
+# cache alias (the default cache if None) for BATCH_STATS_SECONDS.
+# A change clears them at once in the process that made it; other
+# processes see it when the entry expires, unless the cache is
+# shared between them.
+
+BATCH_STATS_CACHE = None
+BATCH_STATS_SECONDS = 300
+
+# OAI-PMH
+# Harvesters page through /oai/ OAI_PAGE_SIZE records at a time.
+# Serialised records are kept in the OAI_CACHE cache alias (the
+# default cache if None) for OAI_CACHE_SECONDS; a record is built
+# again as soon as its work changes. OAI_BASE_URL prefixes the
+# work page URLs given as identifiers.
+
+OAI_REPOSITORY_NAME = 'Ennigaldi collection'
+OAI_REPOSITORY_IDENTIFIER = 'ennigaldi'
+OAI_ADMIN_EMAILS = []
+OAI_BASE_URL = ''
+OAI_PAGE_SIZE = 100
+OAI_CACHE = None
+OAI_CACHE_SECONDS = 86400
+
+# Linked Art
+# JSON-LD documents of works, at /work/<id>/jsonld/ and, for all
+# works as NDJSON, at /work/jsonld/ or `manage.py exportjsonld`.
+# Documents are cached as OAI records are; LINKED_ART_BASE_URL
+# prefixes the document ids.
+
+LINKED_ART_BASE_URL = ''
+LINKED_ART_CACHE = None
+LINKED_ART_CACHE_SECONDS = 86400
+
+# IIIF
+# Snapshots and work images are served through the IIIF Image API
+# at /iiif/<w_id or i_id>/, from tile pyramids built on first use
+# (or by `manage.py buildtiles`) under IIIF_CACHE_ROOT, which
+# defaults to MEDIA_ROOT/iiif. Manifests are at
+# /iiif/work/<id>/manifest.json. IIIF_MAX_AREA caps the pixels of
+# a response.
+
+IIIF_CACHE_ROOT = None
+IIIF_TILE_SIZE = 512
+IIIF_MAX_AREA = 4096 * 4096
+
+# Labels
+# Label sheets at /labels/batch/<id>/ and /labels/unit/<id>/ are
+# drawn within the request up to LABEL_INLINE_PAGES pages, and
+# queued as a print_labels job beyond that. `manage.py
+# printlabels` and the job draw a page per process in a pool of
+# LABEL_WORKERS processes (one per CPU if None).
+
+LABEL_WORKERS = None
+LABEL_INLINE_PAGES = 10
+
+# Field survey sync
+# Offline clients, registered as Devices in the admin, upload
+# gzipped batches of records in chunks to /sync/uploads/ and pull
+# changes from /sync/pull/. Chunks must fit within
+# DATA_UPLOAD_MAX_MEMORY_SIZE. Partial uploads are kept in
+# FIELDSYNC_UPLOAD_ROOT (a temporary directory if None) for
+# FIELDSYNC_UPLOAD_DAYS days.
+
+FIELDSYNC_UPLOAD_ROOT = None
+FIELDSYNC_MAX_UPLOAD = 200 * 1024 * 1024
+FIELDSYNC_UPLOAD_DAYS = 7
+
+# Background jobs
+# Exports, label sheets (?background=1), M305 sheets of a batch,
+# tile pyramids, bulk edits ("background": true), number checks
+# and gazetteer loads can be queued as jobs in the database and
+# run by `manage.py runjobs` workers, each one job at a time;
+# the UI polls /jobs/<id>/ for progress. JOBS_CONCURRENCY caps,
+# by task name, the jobs running at once over all workers
+# (overriding the task's own limit); JOBS_MAX_RUNNING caps all of
+# them. A job whose worker is silent for JOBS_LEASE_SECONDS is
+# run again. Job files are kept in JOBS_OUTPUT_ROOT (a temporary
+# directory if None), and finished jobs for JOBS_KEEP_DAYS days.
+
+JOBS_CONCURRENCY = {}
+JOBS_MAX_RUNNING = None
+JOBS_LEASE_SECONDS = 300
+JOBS_OUTPUT_ROOT = None
+JOBS_KEEP_DAYS = 30
+
+# Version history
+# Default ages, in days, for `manage.py history`; None skips the
+# step. Schedule it (e.g. nightly) to keep history storage small.
+
+HISTORY_PRUNE_DAYS = None
+HISTORY_COMPACT_DAYS = 30
+HISTORY_COMPRESS_DAYS = 90
+
+# Controlled vocabularies (languages, materials...) are cached in
+# each process; see objectinfo/vocabulary.py. With several server
+# processes, name a shared cache here so that a write made in one
+# is seen by the others within VOCABULARY_CHECK_SECONDS.
+VOCABULARY_CACHE = None
+VOCABULARY_CHECK_SECONDS = 5
+
+# Write transactions (object creation, accession numbering) are
+# serialised per database file and retried this many times, with
+# exponential backoff from WRITE_BACKOFF seconds, if the database
+# is locked by a writer outside the queue.
+
+WRITE_RETRIES = 5
+WRITE_BACKOFF = 0.05
+
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
 
@@ -140,3 +333,46 @@ COUNTRIES_PLUS_DEFAULT_ISO = 'BR'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/opt/django/uploads/'
 STATIC_ROOT = '/opt/django/static/'
+
+
+# SQL profiling
+# Set PROFILER_ENABLED to record query count, SQL time, repeated
+# queries and template render time for the views listed below
+# (None profiles every view). Summarise the log with:
+#     python manage.py sqlreport
+
+PROFILER_ENABLED = False
+PROFILER_LOG = os.path.join(BASE_DIR, 'profiler.log')
+PROFILER_VIEWS = [
+    'object_list',
+    'objectregister_detail',
+    'sicg_m305',
+    'unit_list',
+    'unit_list_top',
+    'unit_detail',
+]
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'profiler': {
+            'format': '%(asctime)s %(message)s',
+        },
+    },
+    'handlers': {
+        'profiler': {
+            'class': 'logging.FileHandler',
+            'filename': PROFILER_LOG,
+            'formatter': 'profiler',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'profiler': {
+            'handlers': ['profiler'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,21 @@
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+###########################################################
+# Test runner
+# The test database lives in memory, where the reporting mirror
+# would be a second connection locking the tables the first one
+# reads, and would not see the data of a test's transaction
+# anyway. Tests therefore read from the primary; those of the
+# router turn the reporting database back on themselves.
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super(TestRunner, self).setup_test_environment(**kwargs)
+        self.primary_only = override_settings(REPORTING_DATABASE=None)
+        self.primary_only.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.primary_only.disable()
+        super(TestRunner, self).teardown_test_environment(**kwargs)
+# /Test runner
+###########################################################
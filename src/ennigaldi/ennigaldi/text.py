@@ -0,0 +1,47 @@
+import re
+import unicodedata
+
+###########################################################
+# Name normalisation
+# Keys under which differently written names compare equal, and
+# the trigrams used to compare names that are merely similar.
+_separators = re.compile(r'[\W_]+', re.UNICODE)
+
+def fold(text):
+    """
+    Returns text without accents, in lower case, with runs of
+    punctuation and spaces turned into single spaces, e.g.
+    'Cândido  Portinari.' -> 'candido portinari'.
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _separators.sub(' ', text.casefold()).strip()
+
+def name_key(name):
+    """
+    Returns the folded words of name in alphabetical order, so
+    that inverted forms share a key: 'Portinari, Candido' and
+    'Cândido Portinari' both give 'candido portinari'.
+    """
+    return ' '.join(sorted(fold(name).split()))
+
+def trigrams(key):
+    """
+    Returns the set of three-letter sequences of the words of a
+    folded key, each word padded as in PostgreSQL's pg_trgm.
+    """
+    grams = set()
+    for word in key.split():
+        padded = '  ' + word + ' '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def similarity(a, b):
+    """
+    Returns the Jaccard similarity of two trigram sets.
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / float(len(a | b))
+# /Name normalisation
+###########################################################
@@ -25,6 +25,12 @@ urlpatterns = [
     url(r'^work/', include('objectinfo.urls')),
     url(r'^unit/', include('storageunit.urls')),
     url(r'^batch/', include('reorg.urls')),
+    url(r'^changes/', include('changefeed.urls')),
+    url(r'^oai/', include('oai.urls')),
+    url(r'^iiif/', include('image.urls')),
+    url(r'^labels/', include('labels.urls')),
+    url(r'^sync/', include('fieldsync.urls')),
+    url(r'^jobs/', include('jobs.urls')),
     url(r'^login/', auth_views.login, name='login'),
     url(r'^logout/', auth_views.logout, {'next_page': 'login'}, name='logout'),
 ]
@@ -0,0 +1,119 @@
+import random
+import sqlite3
+import threading
+import time
+from functools import wraps
+from django.conf import settings
+from django.db import OperationalError, connections, transaction, DEFAULT_DB_ALIAS
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory file locks on Windows; writers are then only
+    # serialised within each process.
+    fcntl = None
+
+###########################################################
+# Serialised writes
+# SQLite allows a single writer at a time. When two curators
+# save at once, the second transaction either waits on the
+# busy timeout or, if it had already read before writing,
+# fails straight away with "database is locked". Funnelling
+# write transactions through one queue per database file
+# (a thread lock plus an advisory lock on a file next to the
+# database, shared by all WSGI processes) removes that
+# contention, and the remaining lock errors, caused by writers
+# outside the queue, are retried with exponential backoff.
+def is_lock_error(error):
+    return isinstance(error, (OperationalError, sqlite3.OperationalError)) and 'locked' in str(error)
+
+
+class WriteQueue(object):
+    def __init__(self, lock_path=None, retries=5, backoff=0.05, max_backoff=2.0):
+        self.lock_path = lock_path
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._file = None
+
+    def _acquire(self):
+        self._lock.acquire()
+        if self.lock_path and fcntl is not None:
+            if self._file is None:
+                self._file = open(self.lock_path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+
+    def _release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def run(self, func, *args, **kwargs):
+        """
+        Runs func holding the write lock, retrying it on lock
+        errors. func must be safe to run again after a failed
+        attempt, e.g. a single transaction that was rolled back.
+        Nested calls run directly inside the outer one.
+        """
+        if getattr(self._local, 'depth', 0):
+            return func(*args, **kwargs)
+        delay = self.backoff
+        attempt = 0
+        while True:
+            self._acquire()
+            self._local.depth = 1
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not is_lock_error(e) or attempt >= self.retries:
+                    raise
+            finally:
+                self._local.depth = 0
+                self._release()
+            attempt += 1
+            time.sleep(delay * (1 + random.random()))
+            delay = min(delay * 2, self.max_backoff)
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+def get_queue(using=DEFAULT_DB_ALIAS):
+    with _queues_lock:
+        if using not in _queues:
+            connection = connections[using]
+            lock_path = None
+            name = connection.settings_dict['NAME']
+            if connection.vendor == 'sqlite' and name and name != ':memory:' and 'mode=memory' not in name:
+                lock_path = name + '.lock'
+            _queues[using] = WriteQueue(
+                lock_path=lock_path,
+                retries=getattr(settings, 'WRITE_RETRIES', 5),
+                backoff=getattr(settings, 'WRITE_BACKOFF', 0.05),
+            )
+        return _queues[using]
+
+def serialized(func=None, using=DEFAULT_DB_ALIAS):
+    """
+    Decorator that runs the function as one transaction through
+    the write queue of the given database.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            def atomic_call():
+                with transaction.atomic(using=using):
+                    return func(*args, **kwargs)
+            # Inside an enclosing transaction a retry would only
+            # repeat part of it, so errors are left to the caller.
+            if connections[using].in_atomic_block:
+                return atomic_call()
+            return get_queue(using).run(atomic_call)
+        return wrapper
+    if func is not None:
+        return decorator(func)
+    return decorator
+# /Serialised writes
+###########################################################
@@ -0,0 +1,14 @@
+from django.contrib import admin
+from .models import Device, Upload
+
+class DeviceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'active', 'last_seen')
+    readonly_fields = ('token', 'last_seen')
+
+class UploadAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'device', 'size', 'received', 'status', 'created')
+    list_filter = ('status', 'device')
+    readonly_fields = ('device', 'key', 'size', 'sha256', 'received', 'status', 'result', 'created')
+
+admin.site.register(Device, DeviceAdmin)
+admin.site.register(Upload, UploadAdmin)
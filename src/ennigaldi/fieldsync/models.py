@@ -0,0 +1,64 @@
+import binascii
+import os
+from django.contrib.auth.models import User
+from django.db import models
+
+###########################################################
+# Field survey sync
+# Tablets used on site register works offline, giving every
+# record a provisional id of their own. When they get a
+# connection they upload their records in batches (see
+# fieldsync.protocol); each record applied is kept here under
+# its provisional id, so that a batch sent twice is only applied
+# once and later batches can refer to records of earlier ones.
+def new_token():
+    return binascii.hexlify(os.urandom(20)).decode('ascii')
+
+class Device(models.Model):
+    name = models.CharField(max_length=63, unique=True)
+    # Records are registered in the name of this user.
+    user = models.ForeignKey(User, models.PROTECT)
+    # Sent as "Authorization: Token <token>".
+    token = models.CharField(max_length=40, unique=True, default=new_token)
+    active = models.BooleanField(default=True)
+    last_seen = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return self.name
+
+class Upload(models.Model):
+    statuses = (
+        ('open', 'Receiving'),
+        ('applied', 'Applied'),
+        ('failed', 'Failed'),
+    )
+    device = models.ForeignKey(Device, models.CASCADE, related_name='uploads')
+    # Chosen by the client, so that it can find its upload again
+    # after losing the server's answer.
+    key = models.CharField(max_length=63)
+    # Size and SHA-256 of the gzipped batch.
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=7, choices=statuses, default='open')
+    # JSON of the provisional id mapping, or the error.
+    result = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ('device', 'key')
+
+    def __str__(self):
+        return '%s %s (%s)' % (self.device, self.key, self.status)
+
+class SyncedRecord(models.Model):
+    device = models.ForeignKey(Device, models.CASCADE, related_name='+')
+    # names, works, dimensions or snapshots
+    kind = models.CharField(max_length=15)
+    local_id = models.CharField(max_length=63)
+    object_pk = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('device', 'kind', 'local_id')
+# /Field survey sync
+###########################################################
@@ -0,0 +1,290 @@
+import base64
+import binascii
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from django.conf import settings
+from django.core.exceptions import ValidationError, ObjectDoesNotExist
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from ennigaldi.writes import serialized
+from history.revisions import revision
+from objectinfo.bulk import chunks
+from objectinfo.models import ObjectRegister, ObjectName, Dimension, Hierarchy
+from reorg.models import AccessionNumber
+from .models import Upload, SyncedRecord
+
+###########################################################
+# Batches
+# A batch is a gzipped JSON object listing new records by kind:
+#   {"names": [{"id": "n1", "title": "Vaso", "lang": "pt_BR"}],
+#    "works": [{"id": "w1", "preferred_title": "n1", "part_of": "w0"}],
+#    "dimensions": [{"id": "d1", "work": "w1", "dimension_type": "height", "dimension_value": 120}],
+#    "snapshots": [{"id": "s1", "work": "w1", "name": "IMG_0001.jpg", "data": "<base64>"}]}
+# References are provisional ids, of this batch or of an earlier
+# one, or server pks given as numbers. A batch is applied in one
+# transaction, so a record that fails validation leaves nothing
+# behind; records already applied are skipped.
+KINDS = ('names', 'works', 'dimensions', 'snapshots')
+FIELDS = {
+    'names': ('title', 'title_type', 'lang', 'translation', 'note', 'source'),
+    'works': ('preferred_title', 'part_of', 'work_type', 'source', 'brief_description', 'comments',
+              'distinguishing_features', 'normal_unit', 'number'),
+    'dimensions': ('work', 'dimension_type', 'dimension_value', 'dimension_part', 'dimension_value_qualifier', 'dimension_value_date'),
+    'snapshots': ('work', 'name', 'data'),
+}
+MODELS = {
+    'names': ObjectName,
+    'works': ObjectRegister,
+    'dimensions': Dimension,
+    'snapshots': ObjectRegister,
+}
+# Fields holding a reference, and the kind they refer to.
+REFERENCES = {
+    'preferred_title': 'names',
+    'part_of': 'works',
+    'work': 'works',
+}
+
+class Ledger(object):
+    """
+    The server pks of the device's provisional ids.
+    """
+    def __init__(self, device, batch):
+        self.device = device
+        self.ids = dict((kind, {}) for kind in KINDS)
+        local = set(str(r.get('id')) for kind in KINDS for r in batch.get(kind, []))
+        local.update(str(r[f]) for kind in KINDS for r in batch.get(kind, []) for f in REFERENCES if isinstance(r.get(f), str))
+        for part in chunks(sorted(local)):
+            for kind, local_id, pk in (SyncedRecord.objects.filter(device=device, local_id__in=part)
+                                       .values_list('kind', 'local_id', 'object_pk')):
+                self.ids[kind][local_id] = pk
+        self.new = []
+
+    def resolve(self, kind, value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            if MODELS[kind].objects.filter(pk=value).exists():
+                return value
+            raise ValidationError('No %s %d.' % (kind[:-1], value))
+        if isinstance(value, str) and value in self.ids[kind]:
+            return self.ids[kind][value]
+        raise ValidationError('Unknown %s %r.' % (kind[:-1], value))
+
+    def add(self, kind, local_id, pk):
+        self.ids[kind][local_id] = pk
+        self.new.append(SyncedRecord(device=self.device, kind=kind, local_id=local_id, object_pk=pk))
+
+def check(kind, record):
+    if not isinstance(record, dict) or not isinstance(record.get('id'), str) or not record['id']:
+        raise ValidationError('Every %s needs a string id.' % kind[:-1])
+    unknown = set(record) - set(FIELDS[kind]) - set(['id'])
+    if unknown:
+        raise ValidationError('%s %s: unknown fields %s.' % (kind[:-1], record['id'], ', '.join(sorted(unknown))))
+
+def values(record, fields):
+    return dict((field, record[field]) for field in fields if field in record)
+
+def apply_name(ledger, record, user):
+    name = ObjectName(**values(record, ('title', 'title_type', 'translation', 'note', 'source')))
+    name.lang_id = record.get('lang')
+    name.full_clean()
+    name.save()
+    return name.pk
+
+def apply_work(ledger, record, user):
+    work = ObjectRegister(**values(record, ('work_type', 'source', 'brief_description', 'comments', 'distinguishing_features')))
+    work.preferred_title_id = ledger.resolve('names', record.get('preferred_title'))
+    work.normal_unit_id = record.get('normal_unit')
+    work.data_user = user
+    # normal_unit may be left empty here, unlike in the form.
+    work.full_clean(exclude=['snapshot', 'data_user'] + (['normal_unit'] if work.normal_unit_id is None else []))
+    work.save()
+    if record.get('part_of') is not None:
+        Hierarchy.objects.create(lesser=work, greater_id=ledger.resolve('works', record['part_of']), relation_type='partOf')
+    if record.get('number', True):
+        try:
+            AccessionNumber.generate(work.pk)
+        except ObjectDoesNotExist as e:
+            raise ValidationError(str(e))
+    return work.pk
+
+def apply_dimension(ledger, record, user):
+    dimension = Dimension(**values(record, ('dimension_type', 'dimension_value', 'dimension_part', 'dimension_value_qualifier', 'dimension_value_date')))
+    dimension.work_id = ledger.resolve('works', record.get('work'))
+    dimension.full_clean()
+    dimension.save()
+    return dimension.pk
+
+def apply_snapshot(ledger, record, user):
+    work = ObjectRegister.objects.get(pk=ledger.resolve('works', record.get('work')))
+    try:
+        data = base64.b64decode(record.get('data') or '', validate=True)
+    except (binascii.Error, ValueError):
+        raise ValidationError('snapshot %s: data is not base64.' % record['id'])
+    name = os.path.basename(record.get('name') or '%s.jpg' % record['id'])
+    work.snapshot.save(name, ContentFile(data), save=True)
+    return work.pk
+
+APPLY = {
+    'names': apply_name,
+    'works': apply_work,
+    'dimensions': apply_dimension,
+    'snapshots': apply_snapshot,
+}
+
+def ordered_works(ledger, records):
+    """
+    Puts the works of a set after their whole, which must be
+    numbered first.
+    """
+    local = set(r['id'] for r in records)
+    done = set(ledger.ids['works'])
+    result, pending = [], list(records)
+    while pending:
+        ready = [r for r in pending if not isinstance(r.get('part_of'), str) or r['part_of'] not in local or r['part_of'] in done]
+        if not ready:
+            raise ValidationError('Works %s are part of each other.' % ', '.join(r['id'] for r in pending))
+        for r in ready:
+            done.add(r['id'])
+        result.extend(ready)
+        pending = [r for r in pending if r['id'] not in done]
+    return result
+
+@serialized
+def apply_batch(device, batch, upload=None):
+    """
+    Applies a batch for device in one transaction. Returns the
+    mapping of provisional ids to pks, by kind, with the
+    accession numbers of the works under 'accession_numbers'. If
+    upload is given, it is marked applied in the same transaction.
+    """
+    if not isinstance(batch, dict) or set(batch) - set(KINDS):
+        raise ValidationError('A batch is an object with %s.' % ', '.join(KINDS))
+    for kind in KINDS:
+        for record in batch.get(kind, []):
+            check(kind, record)
+    ledger = Ledger(device, batch)
+    mapping = dict((kind, {}) for kind in KINDS)
+    with revision(user=device.user, comment='Field sync from %s' % device.name):
+        for kind in KINDS:
+            records = batch.get(kind, [])
+            if kind == 'works':
+                records = ordered_works(ledger, records)
+            for record in records:
+                if record['id'] not in ledger.ids[kind]:
+                    try:
+                        ledger.add(kind, record['id'], APPLY[kind](ledger, record, device.user))
+                    except ValidationError as e:
+                        raise ValidationError('%s %s: %s' % (kind[:-1], record['id'], '; '.join(e.messages)))
+                mapping[kind][record['id']] = ledger.ids[kind][record['id']]
+        SyncedRecord.objects.bulk_create(ledger.new)
+    numbers = {}
+    for part in chunks(sorted(mapping['works'].items(), key=lambda item: item[1])):
+        pks = dict((pk, local) for local, pk in part)
+        for number in AccessionNumber.objects.filter(work__in=list(pks)).select_related('batch'):
+            numbers[pks[number.work_id]] = str(number)
+    mapping['accession_numbers'] = numbers
+    if upload is not None:
+        Upload.objects.filter(pk=upload.pk).update(status='applied', result=json.dumps(mapping))
+    return mapping
+# /Batches
+###########################################################
+
+
+###########################################################
+# Resumable uploads
+# Batches with photographs are large and site connections drop,
+# so a batch is uploaded in chunks: the client declares its size
+# and SHA-256, then sends chunks at the offset the server reports,
+# and after a dropped connection asks for the offset and carries
+# on from there. The last chunk applies the batch.
+def upload_root():
+    return getattr(settings, 'FIELDSYNC_UPLOAD_ROOT', None) or os.path.join(tempfile.gettempdir(), 'ennigaldi-fieldsync')
+
+def max_size():
+    return getattr(settings, 'FIELDSYNC_MAX_UPLOAD', 200 * 1024 * 1024)
+
+def part_path(upload):
+    return os.path.join(upload_root(), '%d.part' % upload.pk)
+
+def expire():
+    """
+    Drops uploads left open for more than FIELDSYNC_UPLOAD_DAYS.
+    """
+    cutoff = timezone.now() - datetime.timedelta(days=getattr(settings, 'FIELDSYNC_UPLOAD_DAYS', 7))
+    for upload in Upload.objects.filter(status='open', created__lt=cutoff):
+        if os.path.exists(part_path(upload)):
+            os.remove(part_path(upload))
+        upload.delete()
+
+def start(device, key, size, sha256):
+    """
+    Returns the open or finished Upload of device under key,
+    creating it if needed.
+    """
+    if not 0 < size <= max_size():
+        raise ValidationError('Uploads must be between 1 and %d bytes.' % max_size())
+    upload, created = Upload.objects.get_or_create(device=device, key=key, defaults={'size': size, 'sha256': sha256.lower()})
+    if not created and (upload.size, upload.sha256) != (size, sha256.lower()):
+        raise ValidationError('Upload %s was started with another size or checksum.' % key)
+    if created:
+        expire()
+        if not os.path.isdir(upload_root()):
+            os.makedirs(upload_root())
+        open(part_path(upload), 'wb').close()
+    return upload
+
+class OffsetMismatch(Exception):
+    def __init__(self, expected):
+        super(OffsetMismatch, self).__init__('Expected offset %d.' % expected)
+        self.expected = expected
+
+def receive(upload, offset, chunk):
+    """
+    Writes chunk at offset and returns the new offset. An empty
+    chunk at the end applies a complete upload again, if that
+    was interrupted.
+    """
+    if not chunk and offset == upload.received == upload.size and upload.status == 'open':
+        finish(upload)
+        return upload.received
+    if offset != upload.received or upload.status != 'open':
+        raise OffsetMismatch(upload.received)
+    if offset + len(chunk) > upload.size:
+        raise ValidationError('The chunk goes past the declared size.')
+    with open(part_path(upload), 'r+b') as f:
+        f.seek(offset)
+        f.write(chunk)
+    # Another request may have sent the same chunk meanwhile.
+    if not Upload.objects.filter(pk=upload.pk, received=offset, status='open').update(received=offset + len(chunk)):
+        upload.refresh_from_db()
+        raise OffsetMismatch(upload.received)
+    upload.received = offset + len(chunk)
+    if upload.received == upload.size:
+        finish(upload)
+    return upload.received
+
+def finish(upload):
+    """
+    Checks and applies a complete upload, recording the mapping
+    or the error on it.
+    """
+    with open(part_path(upload), 'rb') as f:
+        data = f.read()
+    try:
+        if hashlib.sha256(data).hexdigest() != upload.sha256:
+            raise ValidationError('The checksum does not match; start the upload again under a new key.')
+        try:
+            batch = json.loads(gzip.decompress(data).decode('utf-8'))
+        except (OSError, EOFError, ValueError):
+            raise ValidationError('The batch is not gzipped JSON.')
+        apply_batch(upload.device, batch, upload)
+    except ValidationError as e:
+        Upload.objects.filter(pk=upload.pk).update(status='failed', result=json.dumps({'error': e.messages}))
+    os.remove(part_path(upload))
+    upload.refresh_from_db()
+# /Resumable uploads
+###########################################################
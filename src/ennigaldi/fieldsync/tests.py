@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import json
+import shutil
+import tempfile
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from objectinfo.models import ObjectRegister, ObjectName, Dimension, IsoLanguage
+from reorg.models import Batch
+from .models import Device
+from .protocol import apply_batch
+
+BATCH = {
+    'names': [{'id': 'n1', 'title': 'Jogo de chá', 'lang': 'pt_BR'}, {'id': 'n2', 'title': 'Bule', 'lang': 'pt_BR'}],
+    'works': [{'id': 'w2', 'preferred_title': 'n2', 'part_of': 'w1'}, {'id': 'w1', 'preferred_title': 'n1'}],
+    'dimensions': [{'id': 'd1', 'work': 'w2', 'dimension_type': 'height', 'dimension_value': 180}],
+}
+
+
+class SyncTest(TestCase):
+    def setUp(self):
+        IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        Batch.objects.create(batch_year=2017, batch_number=3)
+        self.device = Device.objects.create(name="Tablet 1", user=User.objects.create_user('surveyor'))
+        self.auth = {'HTTP_AUTHORIZATION': 'Token %s' % self.device.token}
+
+    def test_apply_batch(self):
+        """
+        Check that a batch creates and numbers its works, wholes
+        first, and that sending it again changes nothing.
+        """
+        mapping = apply_batch(self.device, BATCH)
+        self.assertEqual(mapping['accession_numbers'], {'w1': '2017.3.1', 'w2': '2017.3.1-1/1'})
+        self.assertEqual(Dimension.objects.get(pk=mapping['dimensions']['d1']).work_id, mapping['works']['w2'])
+        self.assertEqual(apply_batch(self.device, BATCH), mapping)
+        self.assertEqual(ObjectRegister.objects.count(), 2)
+        # Later batches may refer to earlier provisional ids.
+        later = apply_batch(self.device, {'dimensions': [{'id': 'd2', 'work': 'w1', 'dimension_type': 'width', 'dimension_value': 300}]})
+        self.assertEqual(Dimension.objects.get(pk=later['dimensions']['d2']).work_id, mapping['works']['w1'])
+
+    def test_invalid_batch(self):
+        """
+        Check that a batch with a bad record leaves nothing behind.
+        """
+        bad = dict(BATCH, dimensions=[{'id': 'd1', 'work': 'w9', 'dimension_type': 'height', 'dimension_value': 180}])
+        with self.assertRaises(ValidationError):
+            apply_batch(self.device, bad)
+        self.assertEqual(ObjectName.objects.count(), 0)
+
+    def test_resumable_upload(self):
+        """
+        Check a chunked upload, resumed after a wrong offset, and
+        pulling the changes back.
+        """
+        data = gzip.compress(json.dumps(BATCH).encode('utf-8'))
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        with override_settings(FIELDSYNC_UPLOAD_ROOT=root):
+            response = self.client.post('/sync/uploads/', json.dumps({'key': 'b1', 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()}),
+                                        content_type='application/json', **self.auth)
+            self.assertEqual(response.status_code, 201)
+            url = '/sync/uploads/%d/' % response.json()['id']
+            half = len(data) // 2
+            self.assertEqual(self.client.patch(url, data[:half], content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0', **self.auth).json()['offset'], half)
+            response = self.client.patch(url, data[half:], content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0', **self.auth)
+            self.assertEqual((response.status_code, response.json()['offset']), (409, half))
+            response = self.client.patch(url, data[half:], content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(half), **self.auth)
+            self.assertEqual(response.json()['status'], 'applied')
+            self.assertEqual(response.json()['result']['accession_numbers']['w1'], '2017.3.1')
+        self.assertEqual(self.client.get('/sync/pull/').status_code, 403)
+        changes = self.client.get('/sync/pull/', **self.auth).json()['changes']
+        self.assertIn('objectinfo.objectregister', set(c['model'] for c in changes))
@@ -0,0 +1,8 @@
+from django.conf.urls import url
+from . import views
+
+urlpatterns = [
+    url(r'^uploads/$', views.start_upload, name='fieldsync_start'),
+    url(r'^uploads/(?P<pk>[0-9]+)/$', views.upload, name='fieldsync_upload'),
+    url(r'^pull/$', views.pull, name='fieldsync_pull'),
+]
@@ -0,0 +1,104 @@
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse, HttpResponseBadRequest
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from changefeed.views import feed
+from . import protocol
+from .models import Device, Upload
+
+# What a field client keeps a copy of.
+PULL_MODELS = ('objectinfo.objectregister', 'objectinfo.objectname', 'objectinfo.dimension',
+               'objectinfo.isolanguage', 'reorg.accessionnumber', 'storageunit.unit')
+
+def device_for(request):
+    """
+    Returns the active Device of the request's token, or None.
+    """
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not header.startswith('Token '):
+        return None
+    device = Device.objects.select_related('user').filter(token=header[6:], active=True).first()
+    if device is not None:
+        Device.objects.filter(pk=device.pk).update(last_seen=timezone.now())
+    return device
+
+def state(upload):
+    return {
+        'id': upload.pk,
+        'key': upload.key,
+        'size': upload.size,
+        'offset': upload.received,
+        'status': upload.status,
+        'result': json.loads(upload.result) if upload.result else None,
+    }
+
+def denied():
+    return JsonResponse({'error': 'A valid device token is required.'}, status=403)
+
+@csrf_exempt
+def start_upload(request):
+    """
+    POST {"key", "size", "sha256"} to start uploading a gzipped
+    batch, or to find an upload already started under key.
+    """
+    device = device_for(request)
+    if device is None:
+        return denied()
+    if request.method != 'POST':
+        return HttpResponseBadRequest('POST key, size and sha256.')
+    try:
+        body = json.loads(request.body.decode('utf-8'))
+        key, size, sha256 = str(body['key'])[:63], int(body['size']), str(body['sha256'])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected key, size and sha256.'}, status=400)
+    try:
+        upload = protocol.start(device, key, size, sha256)
+    except ValidationError as e:
+        return JsonResponse({'error': e.messages}, status=400)
+    return JsonResponse(state(upload), status=201)
+
+@csrf_exempt
+def upload(request, pk):
+    """
+    GET the offset and status of an upload; PATCH (or POST) the
+    next chunk as the request body with an Upload-Offset header.
+    The chunk that completes the upload applies the batch and the
+    answer carries the id mapping, or the error, as 'result'.
+    """
+    device = device_for(request)
+    if device is None:
+        return denied()
+    found = Upload.objects.filter(pk=pk, device=device).first()
+    if found is None:
+        return JsonResponse({'error': 'No upload %s.' % pk}, status=404)
+    if request.method in ('PATCH', 'POST'):
+        try:
+            offset = int(request.META.get('HTTP_UPLOAD_OFFSET', ''))
+        except ValueError:
+            return JsonResponse({'error': 'Upload-Offset is required.'}, status=400)
+        try:
+            protocol.receive(found, offset, request.body)
+        except protocol.OffsetMismatch:
+            return JsonResponse(state(found), status=409)
+        except ValidationError as e:
+            return JsonResponse({'error': e.messages}, status=400)
+    return JsonResponse(state(found))
+
+@gzip_page
+def pull(request):
+    """
+    The change feed, restricted to what field clients keep.
+    """
+    if device_for(request) is None:
+        return denied()
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = min(int(request.GET.get('limit', 500)), getattr(settings, 'CHANGEFEED_MAX_LIMIT', 5000))
+    except ValueError:
+        return HttpResponseBadRequest('since and limit must be integers.')
+    if limit < 1:
+        return HttpResponseBadRequest('limit must be positive.')
+    return JsonResponse(feed(since, limit, PULL_MODELS))
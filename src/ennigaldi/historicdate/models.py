@@ -29,7 +29,7 @@ class HistoricDate(models.Model):
     # explanations are required. If left blank, will be filled
     # with rendered concatenation of the previous fields
     # at a pre-save hook.
-    display = models.CharField(max_length=255, help_text='Textual representation of date')
+    display = models.CharField(max_length=255, db_index=True, help_text='Textual representation of date')
     earliest = models.CharField(max_length=15, help_text="ISO-8601 format:<br />For '13 billion years ago,' enter: -13000000000<br />For 'Ides of March, 44 B.C.,' enter: -44-03-15<br />For 'January, 1792,' enter: 1792-01", blank=True)
     # 'False' interprets to exact date, 'True' to circa.
     earliest_accuracy = models.BooleanField(default=False, verbose_name="circa")
@@ -76,7 +76,32 @@ class DateType(models.Model):
     dated = models.ForeignKey('genericmodel', models.CASCADE)
 
     def __str__(self):
-        return self.dated.__str__() + ' was ' + self.get_date_type_display + ' in ' + self.datation.__str__()
+        return self.dated.__str__() + ' was ' + self.get_date_type_display() + ' in ' + self.datation.__str__()
 
     class Meta:
         abstract = True
+
+def date_key(value, end=False):
+    """
+    Turns an earliest or latest value ([+ or -]year[-month[-day]])
+    into a sortable integer, year * 10000 + month * 100 + day, for
+    exports. Missing months and days are taken from the start of
+    the period, or from its end if end is True. Returns None for
+    blank, open ('present') or unreadable values.
+    """
+    value = (value or '').strip()
+    sign = 1
+    if value[:1] in ('-', '+'):
+        sign = -1 if value[0] == '-' else 1
+        value = value[1:]
+    parts = value.split('-')
+    try:
+        numbers = [int(part) for part in parts]
+    except ValueError:
+        return None
+    if not numbers or len(numbers) > 3:
+        return None
+    year = numbers[0]
+    month = numbers[1] if len(numbers) > 1 else (12 if end else 1)
+    day = numbers[2] if len(numbers) > 2 else (31 if end else 1)
+    return sign * year * 10000 + month * 100 + day
@@ -16,3 +16,13 @@ class HistoricDateTest(TestCase):
         self.assertEqual(raul.latest_accuracy, True)
         self.assertEqual(caesar.earliest, "-44-03-15")
         self.assertEqual(caesar.earliest_accuracy, False)
+
+    def test_date_key(self):
+        """
+        Check that date keys sort in historical order.
+        """
+        keys = [date_key('-11000'), date_key('-44-03-15'), date_key('-44', end=True), date_key('1792-01'), date_key('1792-01', end=True)]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(date_key('1792-01'), 17920101)
+        self.assertEqual(date_key('present'), None)
+        self.assertEqual(date_key(''), None)
@@ -0,0 +1,5 @@
+from django.contrib import admin
+from .models import Revision, Delta
+
+admin.site.register(Revision)
+admin.site.register(Delta)
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class HistoryConfig(AppConfig):
+    name = 'history'
+
+    def ready(self):
+        from . import revisions
+        revisions.connect_all()
@@ -0,0 +1,29 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from history.revisions import prune, compact, compress
+
+
+class Command(BaseCommand):
+    help = 'Applies the history storage policies: prune, compact and compress old revisions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune-days', type=int, default=getattr(settings, 'HISTORY_PRUNE_DAYS', None),
+                            help='Delete revisions older than this many days.')
+        parser.add_argument('--compact-days', type=int, default=getattr(settings, 'HISTORY_COMPACT_DAYS', None),
+                            help='Squash successive changes to a row in revisions older than this many days.')
+        parser.add_argument('--compress-days', type=int, default=getattr(settings, 'HISTORY_COMPRESS_DAYS', None),
+                            help='Compress revisions older than this many days.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options['prune_days'] is not None:
+            count = prune(now - timedelta(days=options['prune_days']))
+            self.stdout.write('Pruned %d revisions.' % count)
+        if options['compact_days'] is not None:
+            count = compact(now - timedelta(days=options['compact_days']))
+            self.stdout.write('Compacted away %d deltas.' % count)
+        if options['compress_days'] is not None:
+            count = compress(now - timedelta(days=options['compress_days']))
+            self.stdout.write('Compressed %d revisions.' % count)
@@ -0,0 +1,66 @@
+import json
+import zlib
+from django.contrib.auth.models import User
+from django.db import models
+
+###########################################################
+# Version history of work records
+# Rather than a full serialisation of the work and its related
+# rows on every save, each Delta stores only the columns of one
+# row that changed, and all the rows saved together (e.g. the
+# work, its accession number, dimensions and inscriptions from
+# the entry form) share one Revision. Old revisions can later
+# be compressed, compacted or pruned; see the 'history'
+# management command.
+class Revision(models.Model):
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    user = models.ForeignKey(User, models.SET_NULL, blank=True, null=True)
+    comment = models.CharField(max_length=255, blank=True)
+    # zlib-compressed JSON of {delta pk: changes} once the
+    # revision has been compressed, in which case the deltas'
+    # own 'changes' columns are emptied.
+    packed = models.BinaryField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-timestamp']
+
+    def __str__(self):
+        return '%s %s %s' % (self.timestamp.strftime('%Y-%m-%d %H:%M'), self.user or '', self.comment)
+
+    def unpack(self):
+        if not self.packed:
+            return {}
+        return json.loads(zlib.decompress(bytes(self.packed)).decode('utf-8'))
+
+class Delta(models.Model):
+    actions = (
+        ('create', 'Created'),
+        ('update', 'Updated'),
+        ('delete', 'Deleted'),
+    )
+    revision = models.ForeignKey(Revision, models.CASCADE, related_name='deltas')
+    # 'app_label.model_name'
+    model = models.CharField(max_length=127)
+    object_pk = models.CharField(max_length=63)
+    # The (first) work the row belongs to, to list a work's history.
+    work = models.PositiveIntegerField(null=True, db_index=True)
+    action = models.CharField(max_length=7, choices=actions)
+    # JSON. On create, {column: value}; on update, the changed
+    # columns only, as {column: [old, new]}; on delete, the last
+    # values of every column, so the row can be restored.
+    changes = models.TextField(blank=True)
+
+    class Meta:
+        # Not 'revision', which would follow Revision's -timestamp.
+        ordering = ['pk']
+        index_together = ('model', 'object_pk')
+
+    def __str__(self):
+        return '%s %s %s' % (self.action, self.model, self.object_pk)
+
+    def get_changes(self):
+        if self.changes:
+            return json.loads(self.changes)
+        return self.revision.unpack().get(str(self.pk), {})
+# /Version history of work records
+###########################################################
@@ -0,0 +1,224 @@
+import json
+import threading
+import zlib
+from contextlib import contextmanager
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import pre_save, post_save, post_delete
+from objectinfo.signals import WORK_PATHS, work_ids
+from .models import Revision, Delta
+
+_local = threading.local()
+_encoder = DjangoJSONEncoder()
+
+def label(model):
+    return '%s.%s' % (model._meta.app_label, model._meta.model_name)
+
+def tracked_fields(model):
+    # auto_now stamps change on every save and carry no history.
+    return [f for f in model._meta.concrete_fields
+            if not getattr(f, 'auto_now', False) and not getattr(f, 'auto_now_add', False)]
+
+def plain(value):
+    """
+    Converts a column value to what it looks like in JSON, so
+    that old and new values compare equal when unchanged.
+    """
+    if isinstance(value, FieldFile):
+        return value.name or None
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return _encoder.default(value)
+
+def dumps(changes):
+    return json.dumps(changes, separators=(',', ':'), sort_keys=True)
+
+
+###########################################################
+# Recording
+@contextmanager
+def revision(user=None, comment=''):
+    """
+    Groups every tracked save and delete made inside the block
+    into a single Revision, written in two INSERTs at the end.
+    Nested blocks join the outer revision; nothing is written
+    if the block raises.
+    """
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = []
+    try:
+        yield
+        pending = _local.pending
+    finally:
+        _local.pending = None
+    if pending:
+        if user is not None and not user.is_authenticated:
+            user = None
+        save_revision(pending, user, comment)
+
+def save_revision(deltas, user=None, comment=''):
+    rev = Revision.objects.create(user=user, comment=comment)
+    for delta in deltas:
+        delta.revision = rev
+        # A title is saved before the work that uses it, so its
+        # work is only known once the whole revision is done.
+        instance = getattr(delta, '_instance', None)
+        if delta.work is None and instance is not None:
+            ids = work_ids(instance)
+            delta.work = ids[0] if ids else None
+    Delta.objects.bulk_create(deltas)
+    return rev
+
+def add(model, instance, action, changes):
+    ids = work_ids(instance)
+    delta = Delta(model=label(model), object_pk=str(instance.pk), work=ids[0] if ids else None, action=action, changes=dumps(changes))
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        if delta.work is None and action != 'delete':
+            delta._instance = instance
+        pending.append(delta)
+    else:
+        save_revision([delta])
+
+def remember(sender, instance, raw=False, using=None, **kwargs):
+    # The only extra read per save: the stored values of a row
+    # about to be updated, to diff them afterwards.
+    instance._history_old = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    attnames = [f.attname for f in tracked_fields(sender)]
+    row = sender._base_manager.using(using).filter(pk=instance.pk).values_list(*attnames).first()
+    if row is not None:
+        instance._history_old = dict(zip(attnames, (plain(v) for v in row)))
+
+def record_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new = dict((f.attname, plain(f.value_from_object(instance))) for f in tracked_fields(sender))
+    old = getattr(instance, '_history_old', None)
+    if created or old is None:
+        add(sender, instance, 'create', new)
+        return
+    changes = dict((k, [old.get(k), v]) for k, v in new.items() if old.get(k) != v)
+    if changes:
+        add(sender, instance, 'update', changes)
+
+def record_delete(sender, instance, **kwargs):
+    add(sender, instance, 'delete', dict((f.attname, plain(f.value_from_object(instance))) for f in tracked_fields(sender)))
+
+def connect_all():
+    """
+    Tracks every model that is part of a work's record, as
+    listed in objectinfo.signals.WORK_PATHS.
+    """
+    for model in list(WORK_PATHS):
+        uid = 'history_' + label(model)
+        pre_save.connect(remember, sender=model, dispatch_uid=uid)
+        post_save.connect(record_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(record_delete, sender=model, dispatch_uid=uid)
+# /Recording
+###########################################################
+
+
+###########################################################
+# Storage policies
+# Run in this order: prune, compact, then compress, since only
+# uncompressed deltas are compacted.
+def prune(before):
+    """
+    Deletes the revisions older than `before`.
+    """
+    count, per_model = Revision.objects.filter(timestamp__lt=before).delete()
+    return per_model.get(Revision._meta.label, 0)
+
+def merge(run):
+    """
+    Folds a run of deltas on one row, oldest first and all but
+    the first being updates, into one (action, changes) pair.
+    """
+    action, first = run[0][1], json.loads(run[0][2])
+    if action == 'create':
+        merged = first
+        for pk, act, changes in run[1:]:
+            for field, values in json.loads(changes).items():
+                merged[field] = values[1]
+        return action, merged
+    merged = first
+    for pk, act, changes in run[1:]:
+        for field, values in json.loads(changes).items():
+            if field in merged:
+                merged[field][1] = values[1]
+            else:
+                merged[field] = values
+    return action, dict((k, v) for k, v in merged.items() if v[0] != v[1])
+
+def compact(before, batch_size=1000):
+    """
+    Squashes consecutive changes to the same row, among the
+    uncompressed revisions older than `before`, into the last
+    delta of each run. Returns the number of deltas removed.
+    """
+    deltas = (Delta.objects.filter(revision__timestamp__lt=before).exclude(changes='')
+              .order_by('model', 'object_pk', 'revision__timestamp', 'pk')
+              .values_list('pk', 'model', 'object_pk', 'action', 'changes'))
+    removed = []
+    rewritten = []
+
+    def close(run):
+        if len(run) < 2:
+            return
+        action, changes = merge(run)
+        keep = run[-1][0]
+        removed.extend(pk for pk, a, c in run[:-1])
+        if action == 'update' and not changes:
+            removed.append(keep)
+        else:
+            rewritten.append((keep, action, dumps(changes)))
+
+    def flush():
+        with transaction.atomic():
+            for pk, action, changes in rewritten:
+                Delta.objects.filter(pk=pk).update(action=action, changes=changes)
+            Delta.objects.filter(pk__in=removed).delete()
+        count = len(removed)
+        del removed[:]
+        del rewritten[:]
+        return count
+
+    total = 0
+    row, run = None, []
+    for pk, model, object_pk, action, changes in deltas.iterator():
+        if (model, object_pk) != row or action != 'update':
+            close(run)
+            row, run = (model, object_pk), []
+        if action == 'delete':
+            continue
+        run.append((pk, action, changes))
+        if len(removed) >= batch_size:
+            total += flush()
+    close(run)
+    total += flush()
+    Revision.objects.filter(timestamp__lt=before, deltas__isnull=True).delete()
+    return total
+
+def compress(before):
+    """
+    Moves the changes of every revision older than `before`
+    into a single zlib-compressed column on the revision.
+    """
+    count = 0
+    for rev in Revision.objects.filter(timestamp__lt=before, packed__isnull=True).iterator():
+        deltas = rev.deltas.exclude(changes='').values_list('pk', 'changes')
+        packed = dict((str(pk), json.loads(changes)) for pk, changes in deltas)
+        if not packed:
+            continue
+        with transaction.atomic():
+            Revision.objects.filter(pk=rev.pk).update(packed=zlib.compress(dumps(packed).encode('utf-8'), 9))
+            rev.deltas.update(changes='')
+        count += 1
+    return count
+# /Storage policies
+###########################################################
@@ -0,0 +1,68 @@
+from datetime import timedelta
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from objectinfo.models import ObjectRegister, ObjectName, Dimension, IsoLanguage
+from .models import Revision, Delta
+from .revisions import revision, compact, compress
+
+class TestHistory(TestCase):
+    def setUp(self):
+        self.ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+
+    def register(self):
+        t1 = ObjectName.objects.create(title="Santo Antônio", lang=self.ptbr)
+        work = ObjectRegister.objects.create(preferred_title=t1)
+        for dimension_type in ('height', 'width', 'depth'):
+            Dimension.objects.create(work=work, dimension_type=dimension_type, dimension_value=100)
+        return work
+
+    def test_grouped_revision(self):
+        """
+        Check that the rows saved by one entry form make a single
+        revision, written with two queries.
+        """
+        before = Revision.objects.count()
+        with CaptureQueriesContext(connection) as queries:
+            with revision(comment='Registered'):
+                work = self.register()
+        self.assertEqual(Revision.objects.count(), before + 1)
+        self.assertEqual(Delta.objects.filter(work=work.pk).count(), 5)
+        self.assertEqual(len([q for q in queries if 'history_' in q['sql']]), 2)
+
+    def test_update_delta(self):
+        """
+        Check that an update stores only the changed column and
+        costs one read plus the two history writes.
+        """
+        work = self.register()
+        dim = Dimension.objects.filter(work=work, dimension_type='height').get()
+        dim.dimension_value = 120
+        with CaptureQueriesContext(connection) as queries:
+            dim.save()
+        delta = Delta.objects.filter(model='objectinfo.dimension', object_pk=str(dim.pk)).last()
+        self.assertEqual(delta.action, 'update')
+        self.assertEqual(delta.get_changes(), {'dimension_value': [100, 120]})
+        history = [q for q in queries if 'history_' in q['sql'] or ('SELECT' in q['sql'] and 'objectinfo_dimension' in q['sql'])]
+        self.assertEqual(len(history), 3)
+
+    def test_compact_and_compress(self):
+        """
+        Check that successive edits are squashed into one delta
+        and that compressed revisions can still be read.
+        """
+        work = self.register()
+        dim = Dimension.objects.filter(work=work, dimension_type='width').get()
+        for value in (110, 120, 130):
+            dim.dimension_value = value
+            dim.save()
+        later = timezone.now() + timedelta(seconds=1)
+        compact(later)
+        deltas = Delta.objects.filter(model='objectinfo.dimension', object_pk=str(dim.pk))
+        self.assertEqual(deltas.count(), 1)
+        self.assertEqual(deltas.get().get_changes()['dimension_value'], 130)
+        compress(later)
+        delta = deltas.get()
+        self.assertEqual(delta.changes, '')
+        self.assertEqual(delta.get_changes()['dimension_value'], 130)
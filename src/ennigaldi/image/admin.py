@@ -1,3 +1,10 @@
 from django.contrib import admin
+from .models import WorkImage
 
-# Register your models here.
+class WorkImageAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'work', 'sequence', 'width', 'height')
+    list_select_related = ('work__preferred_title',)
+    raw_id_fields = ('work',)
+    readonly_fields = ('width', 'height')
+
+admin.site.register(WorkImage, WorkImageAdmin)
@@ -0,0 +1,362 @@
+import hashlib
+import io
+import json
+import math
+import os
+import shutil
+import tempfile
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image
+from objectinfo.models import ObjectRegister
+from .models import WorkImage
+
+###########################################################
+# Tile pyramids
+# A scan is cut once into TILE-pixel JPEG tiles at scale factors
+# 1, 2, 4... until the whole image fits in one tile, and kept on
+# disk under IIIF_CACHE_ROOT/<identifier>/<version>/, the version
+# being a hash of the stored file name (a new upload gets a new
+# name, so a replaced image gets a new pyramid). Any region at
+# any size is then read from the few tiles of the smallest level
+# still sharp enough, and a viewer asking for tiles gets the
+# stored files as they are.
+TILE = 512
+QUALITY = 90
+
+def tile_size():
+    return getattr(settings, 'IIIF_TILE_SIZE', TILE)
+
+def cache_root():
+    return getattr(settings, 'IIIF_CACHE_ROOT', None) or os.path.join(settings.MEDIA_ROOT, 'iiif')
+
+class IIIFError(Exception):
+    def __init__(self, status, message):
+        super(IIIFError, self).__init__(message)
+        self.status = status
+
+def source(identifier):
+    """
+    Returns the storage name of the image identified by
+    'w_<work id>' (the work's snapshot) or 'i_<WorkImage id>'.
+    """
+    kind, sep, pk = identifier.partition('_')
+    name = None
+    if sep and pk.isdigit():
+        if kind == 'w':
+            name = ObjectRegister.objects.filter(pk=pk).values_list('snapshot', flat=True).first()
+        elif kind == 'i':
+            name = WorkImage.objects.filter(pk=pk).values_list('image', flat=True).first()
+    if not name:
+        raise IIIFError(404, 'No image %s.' % identifier)
+    return name
+
+def write_atomic(path, data):
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(handle, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+class Pyramid(object):
+    def __init__(self, identifier, name=None):
+        self.identifier = identifier
+        self.name = name or source(identifier)
+        self.root = os.path.join(cache_root(), identifier)
+        self.path = os.path.join(self.root, hashlib.sha1(self.name.encode('utf-8')).hexdigest()[:16])
+        self.info = self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.path, 'pyramid.json')) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def build(self, replace=False):
+        """
+        Cuts the tiles into a temporary directory renamed into
+        place at the end, so that a request never reads a half
+        built pyramid, and removes older versions. An existing
+        pyramid of this version is kept unless replace is True.
+        """
+        with default_storage.open(self.name, 'rb') as raw:
+            image = Image.open(raw)
+            image.load()
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        width, height = image.size
+        tile = tile_size()
+        os.makedirs(self.root, exist_ok=True)
+        building = tempfile.mkdtemp(dir=self.root, prefix='.build-')
+        factors = []
+        factor, level = 1, image
+        while True:
+            factors.append(factor)
+            os.mkdir(os.path.join(building, str(factor)))
+            level_width, level_height = level.size
+            for row in range(int(math.ceil(level_height / float(tile)))):
+                for col in range(int(math.ceil(level_width / float(tile)))):
+                    box = (col * tile, row * tile, min((col + 1) * tile, level_width), min((row + 1) * tile, level_height))
+                    level.crop(box).save(os.path.join(building, str(factor), '%d_%d.jpg' % (col, row)), 'JPEG', quality=QUALITY)
+            if level_width <= tile and level_height <= tile:
+                break
+            factor *= 2
+            level = level.resize((int(math.ceil(width / float(factor))), int(math.ceil(height / float(factor)))), Image.LANCZOS)
+        with open(os.path.join(building, 'pyramid.json'), 'w') as f:
+            json.dump({'width': width, 'height': height, 'mode': image.mode, 'tile': tile, 'factors': factors}, f)
+        if replace and os.path.isdir(self.path):
+            stale = tempfile.mkdtemp(dir=self.root, prefix='.stale-')
+            os.rename(self.path, os.path.join(stale, 'pyramid'))
+            shutil.rmtree(stale, ignore_errors=True)
+        try:
+            os.rename(building, self.path)
+        except OSError:
+            # Built meanwhile by another request.
+            shutil.rmtree(building, ignore_errors=True)
+        for entry in os.listdir(self.root):
+            if entry != os.path.basename(self.path) and not entry.startswith('.'):
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+        self.info = self.load()
+        return self
+
+    def ensure(self):
+        return self if self.info is not None else self.build()
+
+    @property
+    def width(self):
+        return self.info['width']
+
+    @property
+    def height(self):
+        return self.info['height']
+
+    def level_size(self, factor):
+        return int(math.ceil(self.width / float(factor))), int(math.ceil(self.height / float(factor)))
+
+    def tile_path(self, factor, col, row):
+        return os.path.join(self.path, str(factor), '%d_%d.jpg' % (col, row))
+
+    def tile_for(self, x, y, w, h, out_width, out_height):
+        """
+        Returns the path of the stored tile that is exactly this
+        region at this size, or None.
+        """
+        tile = self.info['tile']
+        for factor in self.info['factors']:
+            span = tile * factor
+            if (x % span == 0 and y % span == 0 and w == min(span, self.width - x) and h == min(span, self.height - y)
+                    and (out_width, out_height) == (int(math.ceil(w / float(factor))), int(math.ceil(h / float(factor))))):
+                return self.tile_path(factor, x // span, y // span)
+        return None
+
+    def read(self, x, y, w, h, factor):
+        """
+        Returns the region x, y, w, h (in full size pixels) as
+        seen at the level of factor, pasted from its tiles.
+        """
+        tile = self.info['tile']
+        level_width, level_height = self.level_size(factor)
+        left, top = x // factor, y // factor
+        right = min(level_width, int(math.ceil((x + w) / float(factor))))
+        bottom = min(level_height, int(math.ceil((y + h) / float(factor))))
+        canvas = Image.new(self.info['mode'], (max(1, right - left), max(1, bottom - top)))
+        for row in range(top // tile, (bottom - 1) // tile + 1):
+            for col in range(left // tile, (right - 1) // tile + 1):
+                with Image.open(self.tile_path(factor, col, row)) as part:
+                    canvas.paste(part, (col * tile - left, row * tile - top))
+        return canvas
+# /Tile pyramids
+###########################################################
+
+
+###########################################################
+# IIIF Image API 3.0
+# Level 1 compliance, plus percentage regions and sizes,
+# confined sizes, upscaling, mirroring, rotation by multiples of
+# 90 degrees, grey and bitonal qualities and PNG/WebP output.
+# Responses other than stored tiles are written to the
+# pyramid's derived/ directory, so they are only rendered once.
+CONTEXT = 'http://iiif.io/api/image/3/context.json'
+FORMATS = {
+    'jpg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+    'webp': ('WEBP', 'image/webp'),
+}
+QUALITIES = ('default', 'color', 'gray', 'bitonal')
+FEATURES = [
+    'regionByPct', 'regionByPx', 'regionSquare', 'sizeByConfinedWh', 'sizeByH', 'sizeByPct',
+    'sizeByW', 'sizeByWh', 'sizeUpscaling', 'mirroring', 'rotationBy90s',
+]
+# Largest image served, in pixels, so that upscaled sizes cannot
+# exhaust the server's memory.
+MAX_AREA = 4096 * 4096
+
+def max_area():
+    return getattr(settings, 'IIIF_MAX_AREA', MAX_AREA)
+
+# Larger than any image or percentage means, and small enough
+# for the float arithmetic of regions and sizes.
+LARGEST = 10 ** 9
+
+def number(value, real=False):
+    try:
+        result = float(value) if real else int(value)
+    except ValueError:
+        raise IIIFError(400, 'Bad number %s.' % value)
+    # float() also reads nan and inf.
+    if result < 0 or result > LARGEST or not math.isfinite(result) or (not real and not value.isdigit()):
+        raise IIIFError(400, 'Bad number %s.' % value)
+    return result
+
+def parse_region(value, width, height):
+    """
+    Returns x, y, w, h in full size pixels, cropped to the image.
+    """
+    if value == 'full':
+        return 0, 0, width, height
+    if value == 'square':
+        side = min(width, height)
+        return (width - side) // 2, (height - side) // 2, side, side
+    pct = value.startswith('pct:')
+    parts = (value[4:] if pct else value).split(',')
+    if len(parts) != 4:
+        raise IIIFError(400, 'Bad region %s.' % value)
+    x, y, w, h = [number(v, pct) for v in parts]
+    if pct:
+        x, y = int(round(x * width / 100.0)), int(round(y * height / 100.0))
+        w, h = int(round(w * width / 100.0)), int(round(h * height / 100.0))
+    if w <= 0 or h <= 0 or x >= width or y >= height:
+        raise IIIFError(400, 'Region %s is empty or outside the image.' % value)
+    return x, y, min(w, width - x), min(h, height - y)
+
+def parse_size(value, width, height):
+    """
+    Returns the width and height of the result for a region of
+    width x height.
+    """
+    upscale = value.startswith('^')
+    spec = value[1:] if upscale else value
+    if spec == 'max':
+        w, h = width, height
+        scale = min(1.0, math.sqrt(max_area() / float(w * h)))
+        w, h = max(1, int(w * scale)), max(1, int(h * scale))
+    elif spec.startswith('pct:'):
+        n = number(spec[4:], real=True)
+        w, h = int(round(width * n / 100.0)), int(round(height * n / 100.0))
+    else:
+        confined = spec.startswith('!')
+        parts = (spec[1:] if confined else spec).split(',')
+        if len(parts) != 2 or not (parts[0] or parts[1]) or (confined and not (parts[0] and parts[1])):
+            raise IIIFError(400, 'Bad size %s.' % value)
+        if confined:
+            scale = min(number(parts[0]) / float(width), number(parts[1]) / float(height))
+            w, h = int(round(width * scale)), int(round(height * scale))
+        elif parts[0] and parts[1]:
+            w, h = number(parts[0]), number(parts[1])
+        elif parts[0]:
+            w = number(parts[0])
+            h = int(round(height * w / float(width)))
+        else:
+            h = number(parts[1])
+            w = int(round(width * h / float(height)))
+    if w < 1 or h < 1:
+        raise IIIFError(400, 'Size %s is empty.' % value)
+    if not upscale and (w > width or h > height):
+        raise IIIFError(400, 'Size %s is larger than the region; use ^ to upscale.' % value)
+    if w * h > max_area():
+        raise IIIFError(400, 'Size %s is larger than the maximum area.' % value)
+    return w, h
+
+def parse_rotation(value):
+    """
+    Returns (mirror, degrees clockwise).
+    """
+    mirror = value.startswith('!')
+    degrees = number(value[1:] if mirror else value, real=True)
+    if degrees > 360:
+        raise IIIFError(400, 'Bad rotation %s.' % value)
+    if degrees % 90:
+        raise IIIFError(501, 'Only rotations by multiples of 90 degrees are supported.')
+    return mirror, int(degrees) % 360
+
+def parse_quality(value):
+    quality, dot, extension = value.rpartition('.')
+    if quality not in QUALITIES:
+        raise IIIFError(400, 'Bad quality %s.' % quality)
+    if extension not in FORMATS:
+        raise IIIFError(400, 'Unsupported format %s.' % extension)
+    return quality, extension
+
+def render(pyramid, region, size, mirror, degrees, quality):
+    x, y, w, h = region
+    out_width, out_height = size
+    # The smallest level still at least as large as the result.
+    ratio = min(w / float(out_width), h / float(out_height))
+    factor = max([f for f in pyramid.info['factors'] if f <= ratio] or [1])
+    image = pyramid.read(x, y, w, h, factor)
+    if image.size != size:
+        image = image.resize(size, Image.LANCZOS)
+    if mirror:
+        image = image.transpose(Image.FLIP_LEFT_RIGHT)
+    if degrees:
+        # transpose() turns counter-clockwise.
+        image = image.transpose({90: Image.ROTATE_270, 180: Image.ROTATE_180, 270: Image.ROTATE_90}[degrees])
+    if quality == 'gray':
+        image = image.convert('L')
+    elif quality == 'bitonal':
+        image = image.convert('1')
+    return image
+
+def image_file(identifier, region, size, rotation, quality):
+    """
+    Returns (path, content type) of the image answering an Image
+    API request, rendering it if needed.
+    """
+    pyramid = Pyramid(identifier).ensure()
+    box = parse_region(region, pyramid.width, pyramid.height)
+    out = parse_size(size, box[2], box[3])
+    mirror, degrees = parse_rotation(rotation)
+    quality, extension = parse_quality(quality)
+    encoder, content_type = FORMATS[extension]
+    if extension == 'jpg' and quality in ('default', 'color') and not mirror and not degrees:
+        path = pyramid.tile_for(box[0], box[1], box[2], box[3], out[0], out[1])
+        if path:
+            return path, content_type
+    key = '%d,%d,%d,%d/%d,%d/%s%d/%s.%s' % (box + out + ('!' if mirror else '', degrees, quality, extension))
+    path = os.path.join(pyramid.path, 'derived', '%s.%s' % (hashlib.sha1(key.encode('ascii')).hexdigest(), extension))
+    if not os.path.exists(path):
+        image = render(pyramid, box, out, mirror, degrees, quality)
+        data = io.BytesIO()
+        if encoder == 'PNG':
+            image.save(data, encoder)
+        else:
+            if image.mode not in ('RGB', 'L') or encoder == 'WEBP':
+                image = image.convert('L' if encoder == 'JPEG' and quality in ('gray', 'bitonal') else 'RGB')
+            image.save(data, encoder, quality=QUALITY)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, data.getvalue())
+    return path, content_type
+
+def info(identifier, base):
+    """
+    Returns the info.json of an image, base being the URL of its
+    image service.
+    """
+    pyramid = Pyramid(identifier).ensure()
+    return {
+        '@context': CONTEXT,
+        'id': base,
+        'type': 'ImageService3',
+        'protocol': 'http://iiif.io/api/image',
+        'profile': 'level1',
+        'width': pyramid.width,
+        'height': pyramid.height,
+        'maxArea': max_area(),
+        'sizes': [{'width': w, 'height': h} for w, h in (pyramid.level_size(f) for f in reversed(pyramid.info['factors'])) if w * h <= max_area()],
+        'tiles': [{'width': pyramid.info['tile'], 'scaleFactors': pyramid.info['factors']}],
+        'extraQualities': ['color', 'gray', 'bitonal'],
+        'extraFormats': ['png', 'webp'],
+        'extraFeatures': FEATURES,
+    }
+# /IIIF Image API 3.0
+###########################################################
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from image.iiif import Pyramid
+from image.models import WorkImage
+from objectinfo.models import ObjectRegister
+
+
+class Command(BaseCommand):
+    help = 'Builds the IIIF tile pyramids of snapshots and work images that do not have one yet, so that viewers do not wait for them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Build existing pyramids again.')
+
+    def handle(self, *args, **options):
+        sources = [('w_%d' % pk, name) for pk, name in ObjectRegister.objects.exclude(snapshot='').exclude(snapshot__isnull=True)
+                   .order_by('pk').values_list('pk', 'snapshot').iterator()]
+        sources += [('i_%d' % pk, name) for pk, name in WorkImage.objects.order_by('pk').values_list('pk', 'image').iterator()]
+        built = 0
+        for identifier, name in sources:
+            pyramid = Pyramid(identifier, name)
+            if pyramid.info is None or options['rebuild']:
+                try:
+                    pyramid.build(replace=options['rebuild'])
+                except (IOError, OSError) as e:
+                    self.stderr.write('%s: %s' % (identifier, e))
+                    continue
+                built += 1
+        self.stdout.write('%d pyramids built, %d images.' % (built, len(sources)))
@@ -1,3 +1,26 @@
 from django.db import models
+from objectinfo.models import ObjectRegister
 
-# Create your models here.
+###########################################################
+# Images of works
+# Photographs and scans of a work, beyond the field snapshot
+# kept on ObjectRegister. They are served to viewers through the
+# IIIF server in image.iiif, in sequence order after the
+# snapshot.
+class WorkImage(models.Model):
+    work = models.ForeignKey(ObjectRegister, models.CASCADE, related_name='images')
+    image = models.ImageField(upload_to='w_image/', height_field='height', width_field='width', max_length=255)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    width = models.PositiveIntegerField(blank=True, null=True)
+    label = models.CharField(max_length=255, blank=True, help_text='e.g. "Front", "Detail of signature".')
+    sequence = models.PositiveSmallIntegerField(default=0)
+    rights = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['work', 'sequence', 'pk']
+        index_together = (('work', 'sequence'),)
+
+    def __str__(self):
+        return self.label or self.image.name
+# /Images of works
+###########################################################
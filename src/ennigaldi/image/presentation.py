@@ -0,0 +1,76 @@
+from django.urls import reverse
+from .models import WorkImage
+
+###########################################################
+# IIIF Presentation API 3.0
+# One manifest per work, with a canvas for its snapshot followed
+# by one for each WorkImage. Canvases only point at the image
+# services; viewers then fetch info.json and the tiles they
+# display.
+CONTEXT = 'http://iiif.io/api/presentation/3/context.json'
+
+def images(work):
+    """
+    Returns [(identifier, label, width, height)] of the images of
+    a work that have known dimensions, snapshot first.
+    """
+    found = []
+    if work.snapshot and work.snapshot_width and work.snapshot_height:
+        found.append(('w_%d' % work.pk, 'Snapshot', int(work.snapshot_width), int(work.snapshot_height)))
+    for image in WorkImage.objects.filter(work=work, width__isnull=False, height__isnull=False):
+        found.append(('i_%d' % image.pk, image.label or 'Image %d' % (len(found) + 1), image.width, image.height))
+    return found
+
+def canvas(url, index, identifier, label, width, height, absolute):
+    canvas_id = '%scanvas/%d' % (url, index)
+    service = absolute(reverse('iiif_service', args=[identifier]))
+    return {
+        'id': canvas_id,
+        'type': 'Canvas',
+        'label': {'none': [label]},
+        'width': width,
+        'height': height,
+        'items': [{
+            'id': canvas_id + '/page',
+            'type': 'AnnotationPage',
+            'items': [{
+                'id': canvas_id + '/annotation',
+                'type': 'Annotation',
+                'motivation': 'painting',
+                'target': canvas_id,
+                'body': {
+                    'id': service + '/full/max/0/default.jpg',
+                    'type': 'Image',
+                    'format': 'image/jpeg',
+                    'width': width,
+                    'height': height,
+                    'service': [{'id': service, 'type': 'ImageService3', 'profile': 'level1'}],
+                },
+            }],
+        }],
+    }
+
+def manifest(work, absolute):
+    """
+    Returns the manifest of a work; absolute turns a path into an
+    absolute URL, e.g. request.build_absolute_uri.
+    """
+    url = absolute(reverse('iiif_manifest', args=[work.pk]))
+    result = {
+        '@context': CONTEXT,
+        'id': url,
+        'type': 'Manifest',
+        'label': {'none': [work.preferred_title.title]},
+        'seeAlso': [{
+            'id': absolute(reverse('linked_art', args=[work.pk])),
+            'type': 'Dataset',
+            'format': 'application/ld+json',
+            'profile': 'https://linked.art/ns/v1/linked-art.json',
+        }],
+        'items': [canvas(url, i, *image, absolute=absolute) for i, image in enumerate(images(work), 1)],
+    }
+    if work.brief_description:
+        result['summary'] = {'none': [work.brief_description]}
+    return result
+# /IIIF Presentation API 3.0
+###########################################################
@@ -0,0 +1,5 @@
+from objectinfo.signals import register_dependent
+from .models import WorkImage
+
+# Images are listed in the work's IIIF manifest.
+register_dependent(WorkImage, 'pk', 'work_id')
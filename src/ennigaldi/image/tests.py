@@ -1,3 +1,73 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from objectinfo.models import ObjectRegister, ObjectName, IsoLanguage
+from .models import WorkImage
 
-# Create your tests here.
+
+class IIIFTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media, IIIF_CACHE_ROOT=None, IIIF_TILE_SIZE=64)
+        self.settings.enable()
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        self.work = ObjectRegister.objects.create(preferred_title=ObjectName.objects.create(title="Mapa", lang=ptbr))
+        data = io.BytesIO()
+        Image.new('RGB', (300, 200), (200, 30, 30)).save(data, 'PNG')
+        self.image = WorkImage.objects.create(work=self.work, label="Front", image=SimpleUploadedFile('scan.png', data.getvalue(), content_type='image/png'))
+        self.base = '/iiif/i_%d' % self.image.pk
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def fetch(self, path):
+        response = self.client.get(self.base + path)
+        self.assertEqual(response.status_code, 200)
+        return Image.open(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_info_and_tiles(self):
+        """
+        Check that info.json describes the pyramid, and that tile
+        requests are answered from the stored tiles.
+        """
+        info = json.loads(self.client.get(self.base + '/info.json').content.decode('utf-8'))
+        self.assertEqual((info['width'], info['height']), (300, 200))
+        self.assertEqual(info['tiles'], [{'width': 64, 'scaleFactors': [1, 2, 4, 8]}])
+        self.assertEqual(self.fetch('/64,0,64,64/64,/0/default.jpg').size, (64, 64))
+        # The last tile of the second level: 128,128 to 300,200 at half size.
+        self.assertEqual(self.fetch('/256,128,44,72/22,36/0/default.jpg').size, (22, 36))
+        self.assertEqual(self.client.get('/iiif/i_%d/info.json' % (self.image.pk + 1)).status_code, 404)
+        missing = WorkImage.objects.create(work=self.work, image='w_image/missing.png', width=300, height=200)
+        self.assertEqual(self.client.get('/iiif/i_%d/info.json' % missing.pk).status_code, 404)
+
+    def test_regions_sizes_rotation(self):
+        """
+        Check regions, sizes, rotation and qualities, and errors.
+        """
+        self.assertEqual(self.fetch('/full/max/0/default.jpg').size, (300, 200))
+        image = self.fetch('/pct:50,50,50,50/!50,50/90/gray.png')
+        self.assertEqual((image.size, image.mode), ((33, 50), 'L'))
+        self.assertEqual(self.fetch('/square/^400,/0/default.jpg').size, (400, 400))
+        self.assertEqual(self.client.get(self.base + '/full/400,/0/default.jpg').status_code, 400)
+        self.assertEqual(self.client.get(self.base + '/full/max/45/default.jpg').status_code, 501)
+        self.assertEqual(self.client.get(self.base + '/full/max/0/default.tif').status_code, 400)
+        for path in ('/pct:nan,0,10,10/max/0/default.jpg', '/full/pct:inf/0/default.jpg',
+                     '/full/max/nan/default.jpg', '/full/!%s,10/0/default.jpg' % ('9' * 400)):
+            self.assertEqual(self.client.get(self.base + path).status_code, 400)
+
+    def test_manifest(self):
+        """
+        Check that the manifest has a canvas pointing at the image
+        service of each image.
+        """
+        manifest = json.loads(self.client.get('/iiif/work/%d/manifest.json' % self.work.pk).content.decode('utf-8'))
+        self.assertEqual(manifest['label'], {'none': ['Mapa']})
+        canvas = manifest['items'][0]
+        self.assertEqual((canvas['width'], canvas['height']), (300, 200))
+        service = canvas['items'][0]['items'][0]['body']['service'][0]['id']
+        self.assertTrue(service.endswith(self.base))
@@ -0,0 +1,10 @@
+from django.conf.urls import url
+from . import views
+
+urlpatterns = [
+    url(r'^work/(?P<pk>[0-9]+)/manifest\.json$', views.manifest, name='iiif_manifest'),
+    url(r'^(?P<identifier>[wi]_[0-9]+)$', views.service, name='iiif_service'),
+    url(r'^(?P<identifier>[wi]_[0-9]+)/info\.json$', views.info, name='iiif_info'),
+    url(r'^(?P<identifier>[wi]_[0-9]+)/(?P<region>[^/]+)/(?P<size>[^/]+)/(?P<rotation>[^/]+)/(?P<quality>[a-z]+\.[a-z]+)$',
+        views.image, name='iiif_image'),
+]
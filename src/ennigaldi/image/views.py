@@ -1,3 +1,62 @@
-from django.shortcuts import render
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import condition
+from objectinfo.models import ObjectRegister
+from objectinfo.views import work_modified
+from . import iiif, presentation
 
-# Create your views here.
+# Viewers are usually served from another site.
+def cors(response):
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
+def error(e):
+    return cors(HttpResponse(str(e), status=e.status, content_type='text/plain; charset=utf-8'))
+
+def service(request, identifier):
+    """
+    Redirects the base URI of an image service to its info.json.
+    """
+    response = HttpResponse(status=303)
+    response['Location'] = reverse('iiif_info', args=[identifier])
+    return cors(response)
+
+def info(request, identifier):
+    """
+    IIIF Image API info.json.
+    """
+    try:
+        data = iiif.info(identifier, request.build_absolute_uri(reverse('iiif_service', args=[identifier])))
+    except iiif.IIIFError as e:
+        return error(e)
+    except IOError:
+        raise Http404('The file of %s is missing.' % identifier)
+    response = JsonResponse(data, content_type='application/ld+json;profile="%s"' % iiif.CONTEXT)
+    response['Cache-Control'] = 'public, max-age=86400'
+    return cors(response)
+
+def image(request, identifier, region, size, rotation, quality):
+    """
+    IIIF Image API image request:
+    {identifier}/{region}/{size}/{rotation}/{quality}.{format}
+    """
+    try:
+        path, content_type = iiif.image_file(identifier, region, size, rotation, quality)
+    except iiif.IIIFError as e:
+        return error(e)
+    except IOError:
+        raise Http404('The file of %s is missing.' % identifier)
+    response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response['Cache-Control'] = 'public, max-age=86400'
+    return cors(response)
+
+@condition(last_modified_func=work_modified)
+def manifest(request, pk):
+    """
+    IIIF Presentation API manifest of a work.
+    """
+    work = get_object_or_404(ObjectRegister.objects.select_related('preferred_title'), pk=pk)
+    response = JsonResponse(presentation.manifest(work, request.build_absolute_uri),
+                            content_type='application/ld+json;profile="%s"' % presentation.CONTEXT)
+    return cors(response)
@@ -0,0 +1,23 @@
+from django.contrib import admin
+from django.utils import timezone
+from ennigaldi.writes import serialized
+from .models import Job
+
+def retry(modeladmin, request, queryset):
+    """
+    Queues the selected failed or cancelled jobs again, with all
+    their attempts.
+    """
+    count = serialized(queryset.filter(status__in=('failed', 'cancelled')).update)(
+        status='queued', run_after=timezone.now(), attempts=0, cancel=False, finished=None)
+    modeladmin.message_user(request, '%d jobs queued again.' % count)
+retry.short_description = 'Queue selected jobs again'
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'user', 'status', 'priority', 'done', 'total', 'attempts', 'created', 'finished')
+    list_filter = ('status', 'task')
+    readonly_fields = ('task', 'arguments', 'user', 'attempts', 'worker', 'heartbeat', 'cancel', 'done', 'total',
+                       'message', 'result', 'error', 'output', 'created', 'started', 'finished')
+    actions = [retry]
+
+admin.site.register(Job, JobAdmin)
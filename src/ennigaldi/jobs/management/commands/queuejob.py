@@ -0,0 +1,26 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from jobs import queue
+
+
+class Command(BaseCommand):
+    help = 'Queues a background job, e.g. queuejob export_columns \'{"format": "parquet"}\'.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('task', help='One of: %s.' % ', '.join(sorted(queue.TASKS)))
+        parser.add_argument('arguments', nargs='?', default='{}', help='JSON object of the task\'s arguments.')
+        parser.add_argument('--priority', type=int, default=0, help='Higher runs first.')
+        parser.add_argument('--unique', action='store_true', help='Do nothing if the same job is already queued or running.')
+
+    def handle(self, *args, **options):
+        try:
+            arguments = json.loads(options['arguments'])
+        except ValueError as e:
+            raise CommandError('Arguments are not JSON: %s' % e)
+        if not isinstance(arguments, dict):
+            raise CommandError('Arguments must be a JSON object.')
+        try:
+            job = queue.enqueue(options['task'], arguments, priority=options['priority'], unique=options['unique'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write('Job %d: %s' % (job.pk, job.status))
@@ -0,0 +1,24 @@
+import signal
+import threading
+from django.core.management.base import BaseCommand
+from jobs import queue
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs, one at a time; start several workers to run more at once. Stops after the current job on SIGTERM or Ctrl-C.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when no job is ready, e.g. when run from cron.')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds between looks at an empty queue.')
+        parser.add_argument('--name', default=None, help='Worker name shown on its jobs (default host:pid).')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+
+        def stopping(signum, frame):
+            self.stderr.write('Stopping after the current job.')
+            stop.set()
+        signal.signal(signal.SIGTERM, stopping)
+        signal.signal(signal.SIGINT, stopping)
+        ran = queue.work(options['name'], options['once'], options['sleep'], stop)
+        self.stdout.write('%d jobs run.' % ran)
@@ -0,0 +1,64 @@
+from django.contrib.auth.models import User
+from django.db import models
+from django.utils import timezone
+
+###########################################################
+# Background jobs
+# Exports, label sheets, tile pyramids and the like take longer
+# than a request should, so views queue them here and
+# `manage.py runjobs` workers run them (see jobs.queue). The
+# queue lives in the project's own database, so it needs no
+# other service.
+class Job(models.Model):
+    statuses = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    )
+    # The name the task was registered under.
+    task = models.CharField(max_length=63, db_index=True)
+    # JSON object of keyword arguments.
+    arguments = models.TextField(default='{}')
+    user = models.ForeignKey(User, models.SET_NULL, blank=True, null=True, related_name='jobs')
+    status = models.CharField(max_length=9, choices=statuses, default='queued')
+    # Higher runs first.
+    priority = models.SmallIntegerField(default=0)
+    # Not run before this; pushed back after a failed attempt.
+    run_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # The worker running the job, and when it was last heard of.
+    worker = models.CharField(max_length=127, blank=True)
+    heartbeat = models.DateTimeField(blank=True, null=True)
+    # Asked to stop; the task stops at its next progress report.
+    cancel = models.BooleanField(default=False)
+    done = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(blank=True, null=True)
+    message = models.CharField(max_length=255, blank=True)
+    # JSON returned by the task.
+    result = models.TextField(blank=True)
+    # Traceback of the last failed attempt.
+    error = models.TextField(blank=True)
+    # File name of what the task wrote, if anything.
+    output = models.CharField(max_length=255, blank=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    started = models.DateTimeField(blank=True, null=True)
+    finished = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        index_together = ('status', 'run_after')
+
+    def __str__(self):
+        return '%s #%d (%s)' % (self.task, self.pk, self.status)
+
+    @property
+    def fraction(self):
+        if self.status == 'done':
+            return 1.0
+        if self.total:
+            return min(1.0, self.done / float(self.total))
+        return None
+# /Background jobs
+###########################################################
@@ -0,0 +1,285 @@
+import datetime
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import traceback
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Count, F
+from django.utils import timezone
+from ennigaldi.writes import serialized
+from .models import Job
+
+###########################################################
+# Tasks
+# A task is a function registered under a name with @task. A
+# worker calls it as func(job, **arguments), with the arguments
+# the job was queued with; it reports how far it got through
+# progress(job, ...), writes any file to output_path(job, name)
+# and returns a JSON-serialisable result. concurrency caps the
+# jobs of the task running at once, over all workers; failed
+# attempts are tried again after retry_delay seconds, doubled
+# each time, up to max_attempts.
+TASKS = {}
+
+class Task(object):
+    def __init__(self, name, func, concurrency=1, max_attempts=3, retry_delay=60):
+        self.name = name
+        self.func = func
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    def limit(self):
+        return getattr(settings, 'JOBS_CONCURRENCY', {}).get(self.name, self.concurrency)
+
+def task(name, concurrency=1, max_attempts=3, retry_delay=60):
+    """
+    Registers the decorated function as task name.
+    """
+    def decorator(func):
+        TASKS[name] = Task(name, func, concurrency, max_attempts, retry_delay)
+        return func
+    return decorator
+
+class JobError(Exception):
+    """
+    A failure that trying again would not fix, e.g. bad
+    arguments; the job fails at once.
+    """
+
+class Cancelled(Exception):
+    pass
+# /Tasks
+###########################################################
+
+
+###########################################################
+# Queueing
+def output_root():
+    return getattr(settings, 'JOBS_OUTPUT_ROOT', None) or os.path.join(tempfile.gettempdir(), 'ennigaldi-jobs')
+
+def output_dir(job):
+    return os.path.join(output_root(), str(job.pk))
+
+def output_path(job, name):
+    """
+    Returns the path a task writes its file name to, recording it
+    as the job's output.
+    """
+    os.makedirs(output_dir(job), exist_ok=True)
+    job.output = os.path.basename(name)
+    return os.path.join(output_dir(job), job.output)
+
+@serialized
+def enqueue(name, arguments=None, user=None, priority=0, delay=0, unique=False):
+    """
+    Queues task name with arguments (a dict) and returns the Job.
+    With unique, a job of the same task and arguments that is
+    still queued or running is returned instead.
+    """
+    if name not in TASKS:
+        raise ValueError('No task %s.' % name)
+    text = json.dumps(arguments or {}, sort_keys=True)
+    if unique:
+        job = Job.objects.filter(task=name, arguments=text, status__in=('queued', 'running')).order_by('pk').first()
+        if job is not None:
+            return job
+    return Job.objects.create(task=name, arguments=text, user=user, priority=priority,
+                              run_after=timezone.now() + datetime.timedelta(seconds=delay),
+                              max_attempts=TASKS[name].max_attempts)
+
+@serialized
+def cancel(job):
+    """
+    Cancels a queued job, or asks a running one to stop. Returns
+    False if the job had already finished.
+    """
+    if Job.objects.filter(pk=job.pk, status='queued').update(status='cancelled', finished=timezone.now()):
+        return True
+    return bool(Job.objects.filter(pk=job.pk, status='running').update(cancel=True))
+# /Queueing
+###########################################################
+
+
+###########################################################
+# Workers
+# Each worker runs one job at a time; run several for more. A
+# job is claimed with a conditional UPDATE inside a write-queue
+# transaction, so no two workers get the same job and, on
+# SQLite where the write queue spans processes, the concurrency
+# limits hold exactly. A running job's worker refreshes its
+# heartbeat from a thread; a job whose worker has not been heard
+# of for JOBS_LEASE_SECONDS (it died, or its machine did) counts
+# as a failed attempt and is queued again.
+PROGRESS_INTERVAL = 1.0
+CANDIDATES = 10
+
+def lease():
+    return getattr(settings, 'JOBS_LEASE_SECONDS', 300)
+
+def worker_name():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+def retry_delay(job):
+    base = TASKS[job.task].retry_delay if job.task in TASKS else 60
+    return base * 2 ** max(0, job.attempts - 1)
+
+def give_up(job, error, now):
+    """
+    Queues a job again after a failed attempt, or fails it for
+    good once it ran out of attempts.
+    """
+    running = Job.objects.filter(pk=job.pk, status='running', worker=job.worker)
+    if job.attempts < job.max_attempts:
+        return running.update(status='queued', error=error, worker='', heartbeat=None,
+                              run_after=now + datetime.timedelta(seconds=retry_delay(job)))
+    return running.update(status='failed', error=error, finished=now)
+
+def recover(now):
+    cutoff = now - datetime.timedelta(seconds=lease())
+    for job in Job.objects.filter(status='running', heartbeat__lt=cutoff):
+        give_up(job, 'Worker %s stopped answering.' % job.worker, now)
+
+@serialized
+def claim(worker):
+    """
+    Marks the next job that may run now as running on worker and
+    returns it, or None.
+    """
+    now = timezone.now()
+    recover(now)
+    running = dict(Job.objects.filter(status='running').order_by().values('task')
+                   .annotate(count=Count('pk')).values_list('task', 'count'))
+    max_running = getattr(settings, 'JOBS_MAX_RUNNING', None)
+    if max_running is not None and sum(running.values()) >= max_running:
+        return None
+    ready = [name for name, t in TASKS.items() if running.get(name, 0) < t.limit()]
+    candidates = (Job.objects.filter(status='queued', run_after__lte=now, task__in=ready)
+                  .order_by('-priority', 'run_after', 'pk').values_list('pk', flat=True))
+    for pk in candidates[:CANDIDATES]:
+        # Another worker outside this process may have been quicker.
+        if Job.objects.filter(pk=pk, status='queued').update(status='running', worker=worker, started=now, heartbeat=now,
+                                                             attempts=F('attempts') + 1, cancel=False):
+            return Job.objects.get(pk=pk)
+    return None
+
+@serialized
+def report(job):
+    return Job.objects.filter(pk=job.pk, status='running', worker=job.worker, cancel=False).update(
+        done=job.done, total=job.total, message=job.message, heartbeat=timezone.now())
+
+def progress(job, done, total=None, message=None):
+    """
+    Records that the job is done steps of total, at most once
+    every PROGRESS_INTERVAL seconds. Raises Cancelled if the job
+    was cancelled, or was given to another worker, meanwhile.
+    """
+    job.done = done
+    if total is not None:
+        job.total = total
+    if message is not None:
+        job.message = message[:255]
+    now = time.time()
+    if now - getattr(job, '_reported', 0) < PROGRESS_INTERVAL and done != job.total:
+        return
+    job._reported = now
+    if not report(job):
+        raise Cancelled('Cancelled.')
+
+@serialized
+def beat(job):
+    Job.objects.filter(pk=job.pk, status='running', worker=job.worker).update(heartbeat=timezone.now())
+
+class Heartbeat(threading.Thread):
+    def __init__(self, job):
+        super(Heartbeat, self).__init__(daemon=True)
+        self.job = job
+        self.stopping = threading.Event()
+
+    def run(self):
+        beaten = False
+        try:
+            while not self.stopping.wait(lease() / 3.0):
+                beat(self.job)
+                beaten = True
+        finally:
+            # The thread has its own connection, if it used one.
+            if beaten:
+                connection.close()
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+@serialized
+def finish(job, status, **fields):
+    Job.objects.filter(pk=job.pk, status='running', worker=job.worker).update(
+        status=status, finished=timezone.now(), done=job.done, total=job.total, message=job.message,
+        output=job.output, **fields)
+
+def run(job):
+    """
+    Runs a claimed job and records its result, or its error and
+    whether it will be tried again.
+    """
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+    try:
+        result = TASKS[job.task].func(job, **json.loads(job.arguments))
+    except Cancelled as e:
+        finish(job, 'cancelled', error=str(e))
+    except JobError as e:
+        finish(job, 'failed', error=str(e))
+    except Exception:
+        serialized(give_up)(job, traceback.format_exc(), timezone.now())
+    else:
+        if job.total is not None:
+            job.done = job.total
+        finish(job, 'done', result=json.dumps(result))
+    finally:
+        heartbeat.stop()
+
+def purge():
+    """
+    Deletes jobs finished more than JOBS_KEEP_DAYS days ago, with
+    their output.
+    """
+    cutoff = timezone.now() - datetime.timedelta(days=getattr(settings, 'JOBS_KEEP_DAYS', 30))
+    old = Job.objects.filter(status__in=('done', 'failed', 'cancelled'), finished__lt=cutoff)
+    for job in old.only('pk'):
+        shutil.rmtree(output_dir(job), ignore_errors=True)
+    serialized(old.delete)()
+
+def work(worker=None, once=False, sleep=2.0, stop=None):
+    """
+    Claims and runs jobs until stop (a threading.Event) is set,
+    or with once until no job is ready. Returns the number of
+    jobs run.
+    """
+    worker = worker or worker_name()
+    stop = stop or threading.Event()
+    ran = 0
+    purged = 0
+    while not stop.is_set():
+        if time.time() - purged > 3600:
+            purge()
+            purged = time.time()
+        job = claim(worker)
+        if job is not None:
+            run(job)
+            ran += 1
+        elif once:
+            break
+        else:
+            stop.wait(sleep)
+        # As between requests; not inside a test's transaction.
+        if not connection.in_atomic_block:
+            close_old_connections()
+    return ran
+# /Workers
+###########################################################
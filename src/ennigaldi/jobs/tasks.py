@@ -0,0 +1,154 @@
+import gzip
+import os
+import shutil
+import tempfile
+import zipfile
+from django.core.exceptions import ValidationError
+from django.template.loader import render_to_string
+from duplicates import detection
+from image.iiif import Pyramid
+from image.models import WorkImage
+from labels import data, sheets
+from labels.barcodes import SYMBOLOGIES, qrcode
+from objectinfo import export, linkedart
+from objectinfo.bulk import BULK_MODELS, bulk_update_pks
+from objectinfo.models import ObjectRegister
+from place import gazetteer
+from reorg import integrity
+from reorg.models import Batch
+from storageunit.models import Unit
+from .queue import task, progress, output_path, JobError
+
+###########################################################
+# Built-in tasks
+# The long operations of the other apps, as their management
+# commands run them, with their files written as the job's
+# output for the UI to download.
+@task('export_columns')
+def export_columns(job, format='csv', tables=None, database='default'):
+    if format == 'parquet' and export.pyarrow is None:
+        raise JobError('Parquet export needs pyarrow.')
+    try:
+        chosen = [export.get_table(name) for name in tables] if tables else export.TABLES
+    except KeyError as e:
+        raise JobError('Unknown table %s.' % e)
+    directory = tempfile.mkdtemp()
+    counts = {}
+    try:
+        with zipfile.ZipFile(output_path(job, 'tables-%s.zip' % format), 'w', zipfile.ZIP_DEFLATED) as archive:
+            for n, table in enumerate(chosen):
+                progress(job, n, len(chosen), table.name)
+                counts[table.name] = export.export(table, directory, format, using=database)
+                for name in os.listdir(directory):
+                    archive.write(os.path.join(directory, name), name)
+                    os.remove(os.path.join(directory, name))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return counts
+
+@task('export_jsonld')
+def export_jsonld(job, database='default'):
+    total = ObjectRegister.objects.using(database).count()
+    count = 0
+    with gzip.open(output_path(job, 'works.jsonld.ndjson.gz'), 'wt', encoding='utf-8') as f:
+        for line in linkedart.dump(using=database):
+            f.write(line)
+            count += 1
+            if count % linkedart.PAGE == 0:
+                progress(job, count, total)
+    return {'works': count}
+
+@task('build_tiles', concurrency=2)
+def build_tiles(job, identifiers=None, rebuild=False):
+    if identifiers is None:
+        sources = [('w_%d' % pk, name) for pk, name in ObjectRegister.objects.exclude(snapshot='').exclude(snapshot__isnull=True)
+                   .order_by('pk').values_list('pk', 'snapshot').iterator()]
+        sources += [('i_%d' % pk, name) for pk, name in WorkImage.objects.order_by('pk').values_list('pk', 'image').iterator()]
+    else:
+        sources = [(identifier, None) for identifier in identifiers]
+    built, failed = 0, {}
+    for n, (identifier, name) in enumerate(sources):
+        progress(job, n, len(sources), identifier)
+        try:
+            pyramid = Pyramid(identifier, name)
+            if pyramid.info is None or rebuild:
+                pyramid.build(replace=rebuild)
+                built += 1
+        except Exception as e:
+            failed[identifier] = str(e)
+    return {'built': built, 'images': len(sources), 'failed': failed}
+
+@task('print_labels')
+def print_labels(job, kind, pk, works=False, layout='a4-21', code='code128', format='pdf'):
+    if layout not in sheets.LAYOUTS or code not in SYMBOLOGIES or format not in sheets.PAGE_WRITERS:
+        raise JobError('Unknown layout, code or format.')
+    if code == 'qr' and qrcode is None:
+        raise JobError('QR codes need the qrcode package.')
+    model = Batch if kind == 'batch' else Unit
+    target = model.objects.filter(pk=pk).first()
+    if target is None:
+        raise JobError('No %s %s.' % (kind, pk))
+    progress(job, 0, 2, 'Reading labels')
+    labels, name = data.sheet_labels(kind, target, works)
+    progress(job, 1, 2, 'Drawing %d labels' % len(labels))
+    content, content_type, extension = sheets.render(labels, layout, code, format)
+    with open(output_path(job, 'labels-%s.%s' % (name, extension)), 'wb') as f:
+        f.write(content)
+    return {'labels': len(labels)}
+
+@task('render_m305')
+def render_m305(job, batch):
+    """
+    The SICG M305 sheets of the works of a batch, as a zip of
+    HTML pages named by accession number.
+    """
+    works = (ObjectRegister.objects.filter(refid__batch=batch).select_related('preferred_title', 'data_user', 'normal_unit', 'refid__batch')
+             .order_by('refid__object_number', 'refid__part_number'))
+    total = works.count()
+    if not total:
+        raise JobError('Batch %s has no works.' % batch)
+    with zipfile.ZipFile(output_path(job, 'm305-%s.zip' % batch), 'w', zipfile.ZIP_DEFLATED) as archive:
+        for n, work in enumerate(works.iterator()):
+            progress(job, n, total, str(work.refid))
+            archive.writestr('%s.html' % str(work.refid).replace('/', '_'),
+                             render_to_string('objectinfo/sicg_m305.html', {'object': work, 'objectregister': work}))
+    return {'works': total}
+
+@task('bulk_edit', max_attempts=1)
+def bulk_edit(job, model, ids, changes):
+    if model not in BULK_MODELS:
+        raise JobError('Unknown model %s.' % model)
+    try:
+        matched, count = bulk_update_pks(BULK_MODELS[model], ids, changes, user=job.user)
+    except ValidationError as e:
+        raise JobError('; '.join(e.messages))
+    return {'matched': matched, 'updated': count}
+
+@task('check_numbers')
+def check_numbers(job, repair=False, database='default'):
+    if repair:
+        # Repairs read what they rewrite, so only on the primary.
+        if database != 'default':
+            raise JobError('Repairs run on the default database only.')
+        progress(job, 0, message='Repairing')
+        found, changed = integrity.repair()
+        return {'found': found, 'changed': changed}
+    counts = {}
+    for kind, batch, number, detail in integrity.scan(using=database):
+        counts[kind] = counts.get(kind, 0) + 1
+    return counts
+
+@task('find_duplicates')
+def find_duplicates(job):
+    signed, found = detection.update()
+    return {'signed': signed, 'found': found}
+
+@task('load_gazetteer', max_attempts=1)
+def load_gazetteer(job, path, classes=gazetteer.CLASSES, countries=None, min_population=0):
+    try:
+        created, updated = gazetteer.load(path, classes, countries, min_population)
+    except (IOError, OSError) as e:
+        raise JobError(str(e))
+    return {'created': created, 'updated': updated}
+# /Built-in tasks
+###########################################################
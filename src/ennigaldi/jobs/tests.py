@@ -0,0 +1,132 @@
+import datetime
+import json
+import shutil
+import tempfile
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from objectinfo.models import ObjectRegister, ObjectName, IsoLanguage
+from reorg.models import Batch, AccessionNumber
+from .models import Job
+from .queue import TASKS, task, enqueue, claim, progress, work, JobError
+
+
+class JobTest(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings = override_settings(JOBS_OUTPUT_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.calls = []
+
+        @task('test_sum', retry_delay=0)
+        def test_sum(job, numbers):
+            for n, number in enumerate(numbers):
+                progress(job, n, len(numbers))
+            return sum(numbers)
+
+        @task('test_flaky', max_attempts=2, retry_delay=0)
+        def test_flaky(job):
+            self.calls.append(job.attempts)
+            raise IOError('Disk full')
+
+        @task('test_bad')
+        def test_bad(job):
+            raise JobError('Bad arguments.')
+        for name in ('test_sum', 'test_flaky', 'test_bad'):
+            self.addCleanup(TASKS.pop, name)
+
+    def test_run(self):
+        """
+        Check that a job runs with its arguments and records its
+        result and progress.
+        """
+        job = enqueue('test_sum', {'numbers': [1, 2, 3]})
+        self.assertEqual(work(once=True), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, json.loads(job.result), job.done, job.total), ('done', 6, 3, 3))
+        with self.assertRaises(ValueError):
+            enqueue('no_such_task')
+
+    def test_retries(self):
+        """
+        Check that a failing job is tried max_attempts times, and
+        that a JobError fails it at once.
+        """
+        flaky = enqueue('test_flaky')
+        bad = enqueue('test_bad')
+        work(once=True)
+        flaky.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual(self.calls, [1, 2])
+        self.assertEqual((flaky.status, flaky.attempts), ('failed', 2))
+        self.assertIn('Disk full', flaky.error)
+        self.assertEqual((bad.status, bad.attempts, bad.error), ('failed', 1, 'Bad arguments.'))
+
+    def test_concurrency(self):
+        """
+        Check the per-task limit, priorities, and that the job of a
+        silent worker is taken over.
+        """
+        first = enqueue('test_sum', {'numbers': [1]})
+        second = enqueue('test_sum', {'numbers': [2]}, priority=5)
+        self.assertEqual(claim('a').pk, second.pk)
+        self.assertIsNone(claim('b'))
+        with override_settings(JOBS_CONCURRENCY={'test_sum': 2}):
+            self.assertEqual(claim('b').pk, first.pk)
+            Job.objects.filter(pk=second.pk).update(heartbeat=timezone.now() - datetime.timedelta(hours=1))
+            taken = claim('c')
+        self.assertEqual((taken.pk, taken.worker, taken.attempts), (second.pk, 'c', 2))
+        self.assertEqual(enqueue('test_sum', {'numbers': [2]}, unique=True).pk, second.pk)
+
+    def test_builtin_tasks(self):
+        """
+        Check that a bulk edit job counts the rows that match, and
+        that repairs are refused on another database.
+        """
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        record = ObjectRegister.objects.create(preferred_title=ObjectName.objects.create(title="Vaso", lang=ptbr), source="Field survey")
+        edit = enqueue('bulk_edit', {'model': 'objectregister', 'ids': [record.pk, record.pk + 1], 'changes': {'source': 'Inventory'}})
+        repair = enqueue('check_numbers', {'repair': True, 'database': 'reporting'})
+        work(once=True)
+        edit.refresh_from_db()
+        repair.refresh_from_db()
+        self.assertEqual(json.loads(edit.result), {'matched': 1, 'updated': 1})
+        self.assertEqual((repair.status, repair.error), ('failed', 'Repairs run on the default database only.'))
+
+    def test_status(self):
+        """
+        Check the status endpoint, which only shows the user's own
+        jobs, and cancelling.
+        """
+        owner = User.objects.create_user('owner', password='secret')
+        User.objects.create_user('other', password='secret')
+        job = enqueue('test_sum', {'numbers': [1]}, user=owner)
+        self.client.login(username='other', password='secret')
+        self.assertEqual(self.client.get('/jobs/%d/' % job.pk).status_code, 404)
+        self.client.login(username='owner', password='secret')
+        response = self.client.get('/jobs/%d/' % job.pk)
+        self.assertEqual((response.json()['status'], response.json()['progress']), ('queued', None))
+        self.assertEqual(self.client.post('/jobs/%d/cancel/' % job.pk).json()['status'], 'cancelled')
+        self.assertEqual(work(once=True), 0)
+
+    def test_label_job(self):
+        """
+        Check that label sheets asked for in the background are
+        queued, drawn by a worker and downloaded.
+        """
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        batch = Batch.objects.create(batch_year=2017, batch_number=3)
+        for n in range(1, 4):
+            record = ObjectRegister.objects.create(preferred_title=ObjectName.objects.create(title="Vaso %d" % n, lang=ptbr))
+            AccessionNumber.objects.create(work=record, batch=batch, object_number=n)
+        User.objects.create_user('curator', password='secret')
+        self.client.login(username='curator', password='secret')
+        response = self.client.get('/labels/batch/%d/?background=1' % batch.pk)
+        self.assertEqual(response.status_code, 202)
+        work(once=True)
+        state = self.client.get(response['Location']).json()
+        self.assertEqual((state['status'], state['result']), ('done', {'labels': 3}))
+        download = self.client.get(state['output'])
+        self.assertEqual(b''.join(download.streaming_content)[:5], b'%PDF-')
@@ -0,0 +1,9 @@
+from django.conf.urls import url
+from . import views
+
+urlpatterns = [
+    url(r'^$', views.job_list, name='job_list'),
+    url(r'^(?P<pk>[0-9]+)/$', views.job_status, name='job_status'),
+    url(r'^(?P<pk>[0-9]+)/cancel/$', views.job_cancel, name='job_cancel'),
+    url(r'^(?P<pk>[0-9]+)/output/$', views.job_output, name='job_output'),
+]
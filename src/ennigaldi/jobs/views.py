@@ -0,0 +1,86 @@
+import json
+import os
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from . import queue
+from .models import Job
+
+def state(job):
+    """
+    What the UI shows of a job while polling its status.
+    """
+    result = {
+        'id': job.pk,
+        'task': job.task,
+        'status': job.status,
+        'progress': job.fraction,
+        'done': job.done,
+        'total': job.total,
+        'message': job.message,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'created': job.created,
+        'started': job.started,
+        'finished': job.finished,
+        'result': json.loads(job.result) if job.result else None,
+        # The last line of a traceback; the admin shows all of it.
+        'error': job.error.strip().splitlines()[-1] if job.error.strip() else None,
+        'url': reverse('job_status', args=[job.pk]),
+        'output': reverse('job_output', args=[job.pk]) if job.output and job.status == 'done' else None,
+    }
+    return result
+
+def queued(job):
+    """
+    The answer of a view that queued job instead of doing the
+    work itself.
+    """
+    response = JsonResponse(state(job), status=202)
+    response['Location'] = reverse('job_status', args=[job.pk])
+    return response
+
+def visible_job(request, pk):
+    job = Job.objects.filter(pk=pk).first()
+    if job is None or not (request.user.is_staff or job.user_id == request.user.pk):
+        raise Http404('No job %s.' % pk)
+    return job
+
+@login_required
+def job_list(request):
+    """
+    The user's latest jobs, newest first.
+    """
+    jobs = Job.objects.filter(user=request.user).order_by('-pk')[:50]
+    return JsonResponse({'jobs': [state(job) for job in jobs]})
+
+@login_required
+def job_status(request, pk):
+    """
+    The status and progress of a job, for the UI to poll.
+    """
+    response = JsonResponse(state(visible_job(request, pk)))
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@login_required
+@require_POST
+def job_cancel(request, pk):
+    job = visible_job(request, pk)
+    queue.cancel(job)
+    job.refresh_from_db()
+    return JsonResponse(state(job))
+
+@login_required
+def job_output(request, pk):
+    """
+    Downloads the file a finished job wrote.
+    """
+    job = visible_job(request, pk)
+    path = os.path.join(queue.output_dir(job), job.output)
+    if job.status != 'done' or not job.output or not os.path.exists(path):
+        raise Http404('Job %s has no output.' % pk)
+    response = FileResponse(open(path, 'rb'), content_type='application/octet-stream')
+    response['Content-Disposition'] = 'attachment; filename="%s"' % job.output
+    return response
@@ -0,0 +1,117 @@
+import unicodedata
+
+try:
+    import qrcode
+except ImportError:
+    qrcode = None
+
+###########################################################
+# Barcodes
+# Each symbology turns a text into modules: (x, y, width,
+# height) rectangles to fill, in module units, which the sheet
+# renderers scale to the space of the label.
+
+# Code 128 symbols 0-106 as bar, space, bar... widths.
+CODE128 = (
+    '212222', '222122', '222221', '121223', '121322', '131222', '122213', '122312', '132212', '221213',
+    '221312', '231212', '112232', '122132', '122231', '113222', '123122', '123221', '223211', '221132',
+    '221231', '213212', '223112', '312131', '311222', '321122', '321221', '312212', '322112', '322211',
+    '212123', '212321', '232121', '111323', '131123', '131321', '112313', '132113', '132311', '211313',
+    '231113', '231311', '112133', '112331', '132131', '113123', '113321', '133121', '313121', '211331',
+    '231131', '213113', '213311', '213131', '311123', '311321', '331121', '312113', '312311', '332111',
+    '314111', '221411', '431111', '111224', '111422', '121124', '121421', '141122', '141221', '112214',
+    '112412', '122114', '122411', '142112', '142211', '241211', '221114', '413111', '241112', '134111',
+    '111242', '121142', '121241', '114212', '124112', '124211', '411212', '421112', '421211', '212141',
+    '214121', '412121', '111143', '111341', '131141', '114113', '114311', '411113', '411311', '113141',
+    '114131', '311141', '411131', '211412', '211214', '211232', '2331112',
+)
+START_B, START_C, CODE_B, CODE_C, STOP = 104, 105, 100, 99, 106
+
+def ascii_text(text):
+    """
+    Code 128 B only covers printable ASCII; accented letters lose
+    their accents and other characters become '?'.
+    """
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c if ' ' <= c <= '~' else '?' for c in text if not unicodedata.combining(c))
+
+def code128_values(text):
+    """
+    Returns the symbol values for text, check symbol and stop
+    included. Runs of four or more digits are packed in pairs
+    with code C, which keeps numbers short.
+    """
+    text = ascii_text(text)
+    values = []
+    current = None
+    i = 0
+    while i < len(text):
+        run = 0
+        while i + run < len(text) and text[i + run].isdigit():
+            run += 1
+        if run >= 4 or (run == len(text) - i and run >= 2 and run % 2 == 0):
+            pairs = run // 2 * 2
+            values.append(START_C if current is None else CODE_C)
+            current = 'C'
+            values.extend(int(text[j:j + 2]) for j in range(i, i + pairs, 2))
+            i += pairs
+            if i < len(text):
+                values.append(CODE_B)
+                current = 'B'
+            continue
+        if current is None:
+            values.append(START_B)
+            current = 'B'
+        values.append(ord(text[i]) - 32)
+        i += 1
+    if not values:
+        values.append(START_B)
+    check = (values[0] + sum(n * v for n, v in enumerate(values[1:], 1))) % 103
+    return values + [check, STOP]
+
+def code128(text):
+    """
+    Returns (modules, width, height) of the Code 128 symbol of
+    text, with a quiet zone of ten modules on each side; bars are
+    one unit high.
+    """
+    modules = []
+    x = 10
+    for value in code128_values(text):
+        for n, width in enumerate(CODE128[value]):
+            if n % 2 == 0:
+                modules.append((x, 0, int(width), 1))
+            x += int(width)
+    return modules, x + 10, 1
+
+def qr(text):
+    """
+    Returns (modules, width, height) of a QR code of text, with a
+    quiet zone of two modules. Needs the qrcode package.
+    """
+    if qrcode is None:
+        raise ImportError('QR codes need the qrcode package: pip install qrcode')
+    code = qrcode.QRCode(border=2, error_correction=qrcode.constants.ERROR_CORRECT_M)
+    code.add_data(text)
+    code.make(fit=True)
+    matrix = code.get_matrix()
+    modules = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if row[x]:
+                start = x
+                while x < len(row) and row[x]:
+                    x += 1
+                # A run of dark modules is one rectangle.
+                modules.append((start, y, x - start, 1))
+            else:
+                x += 1
+    return modules, len(matrix), len(matrix)
+
+SYMBOLOGIES = {
+    'code128': code128,
+    'qr': qr,
+}
+# /Barcodes
+###########################################################
@@ -0,0 +1,86 @@
+from objectinfo.models import ObjectRegister
+from storageunit.models import Unit
+
+###########################################################
+# Label data
+# Each kind of label is read with one query: the accession
+# number, title and work id of works, or the acronym and path of
+# units. Labels are plain tuples, so that pages can be drawn in
+# other processes.
+
+def accession(batch, object_number, part_number, part_count):
+    # As reorg.models.AccessionNumber.__str__, from columns.
+    if part_number:
+        return '%s.%d-%d/%s' % (batch, object_number, part_number, part_count)
+    return '%s.%d' % (batch, object_number)
+
+def batch_name(year, number, retrospective):
+    # As reorg.models.Batch.__str__.
+    return '%d%s%d' % (year, '.R.' if retrospective else '.', number)
+
+def work_labels(works):
+    """
+    Returns [(code, caption, title)] for the works in the
+    queryset works, in accession number order; works without an
+    accession number are labelled with their work id.
+    """
+    rows = (works.order_by('refid__batch__batch_year', 'refid__batch__batch_number', 'refid__object_number', 'refid__part_number', 'pk')
+            .values_list('pk', 'preferred_title__title', 'refid__batch__batch_year', 'refid__batch__batch_number',
+                         'refid__batch__retrospective', 'refid__object_number', 'refid__part_number', 'refid__part_count'))
+    labels = []
+    for pk, title, year, number, retrospective, object_number, part_number, part_count in rows.iterator():
+        if year is None:
+            code = 'w_%d' % pk
+        else:
+            code = accession(batch_name(year, number, retrospective), object_number, part_number, part_count)
+        labels.append((code, code, title or ''))
+    return labels
+
+def batch_labels(batch):
+    return work_labels(ObjectRegister.objects.filter(refid__batch=batch))
+
+def unit_work_labels(unit):
+    """
+    Labels for the works normally kept in unit or below it.
+    """
+    return work_labels(ObjectRegister.objects.filter(normal_unit__in=unit.subtree_ids()))
+
+def unit_labels(unit):
+    """
+    Returns [(code, acronym, path)] for unit and the units below
+    it, parents first. The code is the path of acronyms, e.g.
+    '2/A/3', which is unique and readable.
+    """
+    ids = unit.subtree_ids()
+    rows = dict((pk, (parent, acronym, name)) for pk, parent, acronym, name in
+                Unit.objects.filter(pk__in=ids).values_list('pk', 'parent_id', 'acronym', 'name'))
+    ancestors = []
+    parent = unit.parent
+    while parent is not None:
+        ancestors.insert(0, parent)
+        parent = parent.parent
+    codes = {unit.parent_id: '/'.join(a.acronym for a in ancestors)}
+    paths = {unit.parent_id: ' › '.join(('%s %s' % (a.acronym, a.name)).strip() for a in ancestors)}
+    labels = []
+    # subtree_ids lists the units level by level, so parents come
+    # before their children.
+    for pk in ids:
+        parent, acronym, name = rows[pk]
+        codes[pk] = codes[parent] + '/' + acronym if codes[parent] else acronym
+        own = ('%s %s' % (acronym, name)).strip()
+        paths[pk] = paths[parent] + ' › ' + own if paths[parent] else own
+        labels.append((codes[pk], acronym, paths[pk]))
+    return labels
+
+def sheet_labels(kind, target, works=False):
+    """
+    Returns (labels, file name) for a Batch or, with kind 'unit',
+    for a Unit's shelves or, with works, the works kept there.
+    """
+    if kind == 'batch':
+        return batch_labels(target), str(target)
+    if works:
+        return unit_work_labels(target), 'unit-%d-works' % target.pk
+    return unit_labels(target), 'unit-%d' % target.pk
+# /Label data
+###########################################################
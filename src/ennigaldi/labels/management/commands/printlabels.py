@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from labels import data, sheets
+from labels.barcodes import SYMBOLOGIES, qrcode
+from reorg.models import Batch
+from storageunit.models import Unit
+
+
+class Command(BaseCommand):
+    help = 'Writes label sheets for the works of a batch, or for a unit subtree (its shelves, or with --works the works kept there).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=('batch', 'unit'))
+        parser.add_argument('pk', type=int)
+        parser.add_argument('output', help='File to write; .pdf, or .svg (a .zip of pages when there are several).')
+        parser.add_argument('--works', action='store_true', help='For a unit, label the works kept in it instead of the units.')
+        parser.add_argument('--layout', choices=sorted(sheets.LAYOUTS), default='a4-21')
+        parser.add_argument('--code', choices=sorted(SYMBOLOGIES), default='code128',
+                            help='QR codes need the qrcode package.')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Pages drawn in parallel (default: LABEL_WORKERS or one per CPU).')
+
+    def handle(self, *args, **options):
+        if options['code'] == 'qr' and qrcode is None:
+            raise CommandError('QR codes need qrcode: pip install qrcode')
+        model = Batch if options['kind'] == 'batch' else Unit
+        try:
+            target = model.objects.get(pk=options['pk'])
+        except model.DoesNotExist:
+            raise CommandError('No %s %d.' % (options['kind'], options['pk']))
+        started = time.time()
+        if options['kind'] == 'batch':
+            labels = data.batch_labels(target)
+        elif options['works']:
+            labels = data.unit_work_labels(target)
+        else:
+            labels = data.unit_labels(target)
+        output = 'svg' if options['output'].endswith(('.svg', '.zip')) else 'pdf'
+        content, content_type, extension = sheets.render(labels, options['layout'], options['code'], output, options['processes'])
+        with open(options['output'], 'wb') as f:
+            f.write(content)
+        self.stdout.write('%d labels on %d pages in %.1fs.' % (
+            len(labels), max(1, -(-len(labels) // sheets.per_page(sheets.LAYOUTS[options['layout']]))), time.time() - started))
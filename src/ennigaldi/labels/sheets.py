@@ -0,0 +1,184 @@
+import io
+import os
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+from django.conf import settings
+from .barcodes import SYMBOLOGIES
+
+###########################################################
+# Sheets
+# Labels are laid out on sheets of stock labels (all sizes in
+# millimetres) and drawn as a list of shapes, ('bar', x, y, w, h)
+# and ('text', x, y, size, text, bold), which the SVG and PDF
+# writers turn into their own syntax. Pages are independent, so
+# they are drawn in a pool of processes and only put together in
+# order at the end; nothing here touches the database, so the
+# workers need no Django setup.
+LAYOUTS = {
+    # Avery L7160 and compatible: 21 labels of 63.5 x 38.1 mm.
+    'a4-21': {'page': (210, 297), 'label': (63.5, 38.1), 'columns': 3, 'rows': 7, 'margin': (7.2, 15.1), 'pitch': (66.0, 38.1)},
+    # Avery L7651: 65 labels of 38.1 x 21.2 mm.
+    'a4-65': {'page': (210, 297), 'label': (38.1, 21.2), 'columns': 5, 'rows': 13, 'margin': (4.7, 10.7), 'pitch': (40.6, 21.2)},
+    # Avery 5160 (US letter): 30 labels of 66.7 x 25.4 mm.
+    'letter-30': {'page': (215.9, 279.4), 'label': (66.7, 25.4), 'columns': 3, 'rows': 10, 'margin': (4.8, 12.7), 'pitch': (69.8, 25.4)},
+}
+PADDING = 2.0
+# Average width of a Helvetica character, in ems, to cut lines
+# that would not fit.
+EM = 0.55
+MM = 72 / 25.4
+
+def per_page(layout):
+    return layout['columns'] * layout['rows']
+
+def fit(text, width, size):
+    room = int(width / (size * EM))
+    return text if len(text) <= room else text[:max(0, room - 1)] + '…'
+
+def draw_label(shapes, x, y, width, height, label, symbology):
+    """
+    Draws one label with its top left corner at x, y: the
+    barcode, then the code in bold and one line of detail.
+    """
+    code, caption, detail = label
+    modules, columns, rows = SYMBOLOGIES[symbology](code)
+    inner_width, inner_height = width - 2 * PADDING, height - 2 * PADDING
+    caption_size = min(4.0, inner_height * 0.16)
+    detail_size = caption_size * 0.75
+    if symbology == 'qr':
+        # A square code on the left, text on the right.
+        side = min(inner_height, inner_width * 0.45)
+        unit = side / columns
+        bar_height = unit
+        text_x, text_width = x + PADDING + side + PADDING, inner_width - side - PADDING
+        text_y = y + PADDING + caption_size
+    else:
+        unit = inner_width / columns
+        bar_height = inner_height - caption_size - detail_size - 2
+        text_x, text_width = x + PADDING, inner_width
+        text_y = y + PADDING + bar_height + 1 + caption_size
+    for left, top, w, h in modules:
+        shapes.append(('bar', x + PADDING + left * unit, y + PADDING + top * bar_height, w * unit, h * bar_height))
+    shapes.append(('text', text_x, text_y, caption_size, fit(caption, text_width, caption_size), True))
+    if detail:
+        shapes.append(('text', text_x, text_y + detail_size + 0.5, detail_size, fit(detail, text_width, detail_size), False))
+
+def draw_page(layout, labels, symbology):
+    shapes = []
+    for i, label in enumerate(labels):
+        row, column = divmod(i, layout['columns'])
+        x = layout['margin'][0] + column * layout['pitch'][0]
+        y = layout['margin'][1] + row * layout['pitch'][1]
+        draw_label(shapes, x, y, layout['label'][0], layout['label'][1], label, symbology)
+    return shapes
+
+def svg_page(layout, labels, symbology):
+    """
+    Returns one page as an SVG document, in millimetres.
+    """
+    width, height = layout['page']
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+             '<svg xmlns="http://www.w3.org/2000/svg" width="%smm" height="%smm" viewBox="0 0 %s %s">'
+             '<rect width="100%%" height="100%%" fill="#fff"/><g fill="#000">' % (width, height, width, height)]
+    for shape in draw_page(layout, labels, symbology):
+        if shape[0] == 'bar':
+            parts.append('<rect x="%.3f" y="%.3f" width="%.3f" height="%.3f"/>' % shape[1:])
+        else:
+            x, y, size, text, bold = shape[1:]
+            parts.append('<text x="%.2f" y="%.2f" font-family="Helvetica, Arial, sans-serif" font-size="%.2f"%s>%s</text>'
+                         % (x, y, size, ' font-weight="bold"' if bold else '', escape(text)))
+    parts.append('</g></svg>')
+    return ''.join(parts).encode('utf-8')
+
+def pdf_string(text):
+    # The standard fonts use WinAnsiEncoding, close to cp1252.
+    data = text.encode('cp1252', 'replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+def pdf_page(layout, labels, symbology):
+    """
+    Returns the compressed content stream of one page.
+    """
+    height = layout['page'][1]
+    bars, texts = [], []
+    for shape in draw_page(layout, labels, symbology):
+        if shape[0] == 'bar':
+            x, y, w, h = shape[1:]
+            bars.append(b'%.2f %.2f %.2f %.2f re' % (x * MM, (height - y - h) * MM, w * MM, h * MM))
+        else:
+            x, y, size, text, bold = shape[1:]
+            texts.append(b'BT /%s %.2f Tf %.2f %.2f Td %s Tj ET' % (b'F2' if bold else b'F1', size * MM, x * MM, (height - y) * MM, pdf_string(text)))
+    # All bars are filled as one path.
+    if bars:
+        bars.append(b'f')
+    return zlib.compress(b'\n'.join(bars + texts))
+
+def pdf_document(layout, streams):
+    """
+    Puts the page streams of pdf_page together into a PDF file.
+    """
+    width, height = layout['page'][0] * MM, layout['page'][1] * MM
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+    ]
+    kids = []
+    for stream in streams:
+        objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Contents %d 0 R '
+                       b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>' % (width, height, len(objects)))
+        kids.append(b'%d 0 R' % len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), len(kids))
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for n, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n%s\nendobj\n' % (n, body))
+    xref = out.tell()
+    out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b'%010d 00000 n \n' % offset)
+    out.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return out.getvalue()
+
+PAGE_WRITERS = {
+    'svg': svg_page,
+    'pdf': pdf_page,
+}
+
+def workers():
+    return getattr(settings, 'LABEL_WORKERS', None) or os.cpu_count() or 1
+
+def render(labels, layout='a4-21', symbology='code128', output='pdf', processes=None):
+    """
+    Returns (content, content type, file extension) of the sheets
+    for labels: a PDF document, an SVG page, or a zip of SVG
+    pages when there are several.
+    """
+    layout = LAYOUTS[layout]
+    size = per_page(layout)
+    pages = [labels[i:i + size] for i in range(0, len(labels), size)] or [[]]
+    writer = PAGE_WRITERS[output]
+    processes = processes or workers()
+    args = ([layout] * len(pages), pages, [symbology] * len(pages))
+    if processes > 1 and len(pages) > 1:
+        with ProcessPoolExecutor(max_workers=min(processes, len(pages))) as pool:
+            drawn = list(pool.map(writer, *args, chunksize=max(1, len(pages) // (processes * 4))))
+    else:
+        drawn = list(map(writer, *args))
+    if output == 'pdf':
+        return pdf_document(layout, drawn), 'application/pdf', 'pdf'
+    if len(drawn) == 1:
+        return drawn[0], 'image/svg+xml', 'svg'
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as z:
+        for n, page in enumerate(drawn, 1):
+            z.writestr('page-%03d.svg' % n, page)
+    return archive.getvalue(), 'application/zip', 'zip'
+# /Sheets
+###########################################################
@@ -0,0 +1,59 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from objectinfo.models import ObjectRegister, ObjectName, IsoLanguage
+from reorg.models import Batch, AccessionNumber
+from storageunit.models import Unit
+from . import data, sheets
+from .barcodes import code128_values
+
+
+class LabelTest(TestCase):
+    def setUp(self):
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        self.room = Unit.objects.create(acronym="R01", name="Reserve")
+        self.shelf = Unit.objects.create(parent=self.room, acronym="A", name="Shelf")
+        self.batch = Batch.objects.create(batch_year=2017, batch_number=3)
+        for n in range(1, 31):
+            work = ObjectRegister.objects.create(preferred_title=ObjectName.objects.create(title="Vaso %d" % n, lang=ptbr), normal_unit=self.shelf)
+            AccessionNumber.objects.create(work=work, batch=self.batch, object_number=n)
+
+    def test_code128(self):
+        """
+        Check the check symbol, and that digit runs use code C.
+        """
+        self.assertEqual(code128_values('123456'), [105, 12, 34, 56, 44, 106])
+        self.assertEqual(code128_values('AB')[:3], [104, 33, 34])
+
+    def test_labels_in_one_query(self):
+        """
+        Check the label data of a batch and of a unit subtree.
+        """
+        with self.assertNumQueries(1):
+            labels = data.batch_labels(self.batch)
+        self.assertEqual(len(labels), 30)
+        self.assertEqual(labels[1], ('2017.3.2', '2017.3.2', 'Vaso 2'))
+        self.assertEqual(data.unit_labels(self.room), [('R01', 'R01', 'R01 Reserve'), ('R01/A', 'A', 'R01 Reserve › A Shelf')])
+        self.assertEqual(len(data.unit_work_labels(self.room)), 30)
+
+    def test_sheets(self):
+        """
+        Check that 30 labels fill two pages of 21, in PDF and SVG,
+        and that the view needs a login.
+        """
+        labels = data.batch_labels(self.batch)
+        pdf, content_type, extension = sheets.render(labels, processes=1)
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertIn(b'/Count 2', pdf)
+        svg, content_type, extension = sheets.render(labels[:21], output='svg', processes=1)
+        self.assertEqual(extension, 'svg')
+        self.assertEqual(svg.count(b'font-weight="bold"'), 21)
+        url = '/labels/batch/%d/' % self.batch.pk
+        self.assertEqual(self.client.get(url).status_code, 302)
+        User.objects.create_user('registrar', password='secret')
+        self.client.login(username='registrar', password='secret')
+        response = self.client.get(url, {'format': 'svg', 'layout': 'a4-65'})
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertEqual(self.client.get(url, {'layout': 'a0'}).status_code, 400)
+        # Longer sheets are left to a job.
+        with override_settings(LABEL_INLINE_PAGES=1):
+            self.assertEqual(self.client.get(url).status_code, 202)
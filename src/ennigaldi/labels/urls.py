@@ -0,0 +1,7 @@
+from django.conf.urls import url
+from . import views
+
+urlpatterns = [
+    url(r'^batch/(?P<pk>[0-9]+)/$', views.batch_labels, name='batch_labels'),
+    url(r'^unit/(?P<pk>[0-9]+)/$', views.unit_labels, name='unit_labels'),
+]
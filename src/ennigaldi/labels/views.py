@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.shortcuts import get_object_or_404
+from jobs.queue import enqueue
+from jobs.views import queued
+from reorg.models import Batch
+from storageunit.models import Unit
+from . import data, sheets
+from .barcodes import SYMBOLOGIES, qrcode
+
+def sheet_options(request):
+    """
+    Returns the (layout, code, format) asked by ?layout=, ?code=
+    (code128 or qr) and ?format= (pdf or svg), or raises
+    ValueError.
+    """
+    layout = request.GET.get('layout', 'a4-21')
+    symbology = request.GET.get('code', 'code128')
+    output = request.GET.get('format', 'pdf')
+    if layout not in sheets.LAYOUTS or symbology not in SYMBOLOGIES or output not in sheets.PAGE_WRITERS:
+        raise ValueError('layout: %s; code: %s; format: %s.' % (
+            ', '.join(sorted(sheets.LAYOUTS)), ', '.join(sorted(SYMBOLOGIES)), ', '.join(sorted(sheets.PAGE_WRITERS))))
+    if symbology == 'qr' and qrcode is None:
+        raise ValueError('QR codes need the qrcode package.')
+    return layout, symbology, output
+
+def sheet_response(request, kind, target, works=False):
+    """
+    Renders the labels of target, or with ?background=1, or when
+    they fill more than LABEL_INLINE_PAGES pages, queues a
+    print_labels job and answers with its status.
+    """
+    try:
+        layout, symbology, output = sheet_options(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    arguments = {'kind': kind, 'pk': target.pk, 'works': works, 'layout': layout, 'code': symbology, 'format': output}
+    if request.GET.get('background'):
+        return queued(enqueue('print_labels', arguments, user=request.user))
+    labels, name = data.sheet_labels(kind, target, works)
+    pages = -(-len(labels) // sheets.per_page(sheets.LAYOUTS[layout]))
+    if pages > getattr(settings, 'LABEL_INLINE_PAGES', 10):
+        return queued(enqueue('print_labels', arguments, user=request.user))
+    # Not in a pool of processes: forking a threaded server is
+    # unsafe, and the request would wait for the pool anyway.
+    content, content_type, extension = sheets.render(labels, layout, symbology, output, processes=1)
+    response = HttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="labels-%s.%s"' % (name, extension)
+    return response
+
+@login_required
+def batch_labels(request, pk):
+    """
+    Labels for every work numbered in a batch.
+    """
+    return sheet_response(request, 'batch', get_object_or_404(Batch, pk=pk))
+
+@login_required
+def unit_labels(request, pk):
+    """
+    Shelf labels for a unit and the units below it, or with
+    ?what=works labels for the works kept there.
+    """
+    return sheet_response(request, 'unit', get_object_or_404(Unit, pk=pk), request.GET.get('what') == 'works')
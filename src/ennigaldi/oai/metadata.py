@@ -0,0 +1,199 @@
+from xml.etree import ElementTree
+from django.conf import settings
+from django.core.cache import caches
+from objectinfo.bulk import chunks
+from objectinfo.models import ObjectRegister, AgentRole, MaterialType, ObjectPlaceType, Rights
+from reorg.models import AccessionNumber
+from storageunit.capacity import current_dimensions
+
+###########################################################
+# Metadata formats
+# Each work is serialised from a handful of queries run for a
+# whole page of works at once, and the XML of each record is
+# cached under the work's last_modified stamp, so that a record
+# is only built again after the work changes and repeated
+# harvests mostly read from the cache.
+FORMATS = {
+    'oai_dc': {
+        'schema': 'http://www.openarchives.org/OAI/2.0/oai_dc.xsd',
+        'namespace': 'http://www.openarchives.org/OAI/2.0/oai_dc/',
+    },
+    'vra': {
+        'schema': 'http://www.loc.gov/standards/vracore/vra-strict.xsd',
+        'namespace': 'http://www.vraweb.org/vracore4.htm',
+    },
+}
+DC = 'http://purl.org/dc/elements/1.1/'
+XSI = 'http://www.w3.org/2001/XMLSchema-instance'
+ElementTree.register_namespace('oai_dc', FORMATS['oai_dc']['namespace'])
+ElementTree.register_namespace('dc', DC)
+ElementTree.register_namespace('vra', FORMATS['vra']['namespace'])
+ElementTree.register_namespace('xsi', XSI)
+
+# Dimension types exported, with their unit.
+UNITS = {
+    'width': 'mm', 'length': 'mm', 'depth': 'mm', 'diameter': 'mm',
+    'height': 'mm', 'area': 'cm2', 'weight': 'g',
+}
+
+def cache():
+    return caches[getattr(settings, 'OAI_CACHE', None) or 'default']
+
+def cache_key(prefix, pk, stamp):
+    return 'oai:%s:%d:%s' % (prefix, pk, stamp.strftime('%Y%m%d%H%M%S%f'))
+
+class WorkData(object):
+    """
+    What the records say about one work, gathered for a page of
+    works by gather().
+    """
+    def __init__(self, work):
+        self.work = work
+        self.refid = ''
+        self.agents = []
+        self.materials = []
+        self.places = []
+        self.rights = []
+        self.dimensions = {}
+
+def gather(pks):
+    """
+    Returns {pk: WorkData} for the works in pks, in a fixed
+    number of queries.
+    """
+    data = {}
+    for part in chunks(pks):
+        for work in ObjectRegister.objects.filter(pk__in=part).select_related('preferred_title', 'production__date'):
+            data[work.pk] = WorkData(work)
+        for number in AccessionNumber.objects.filter(work__in=part).select_related('batch'):
+            data[number.work_id].refid = str(number)
+        for work, name, role in (AgentRole.objects.filter(work__objectregister__in=part).order_by('pk')
+                                 .values_list('work__objectregister', 'agent__display', 'agent_role')):
+            data[work].agents.append((name, role))
+        for work, name in (MaterialType.objects.filter(work__work__in=part).order_by('pk')
+                           .values_list('work__work', 'material__material_name')):
+            data[work].materials.append(name)
+        for work, name, kind in (ObjectPlaceType.objects.filter(work__objectregister__in=part).order_by('pk')
+                                 .values_list('work__objectregister', 'location__location_name', 'location_type')):
+            data[work].places.append((name, kind))
+        for work, text in Rights.objects.filter(work__in=part).order_by('pk').values_list('work', 'rights_display'):
+            data[work].rights.append(text)
+        for work, dims in current_dimensions(works=part).items():
+            data[work].dimensions = dims
+    return data
+
+def sub(parent, tag, text=None, **attrs):
+    element = ElementTree.SubElement(parent, tag, dict((k, str(v)) for k, v in attrs.items()))
+    if text is not None:
+        element.text = str(text)
+    return element
+
+def work_url(pk):
+    return '%s/work/%d/' % (getattr(settings, 'OAI_BASE_URL', '').rstrip('/'), pk)
+
+def oai_dc(data):
+    work = data.work
+    root = ElementTree.Element('{%s}dc' % FORMATS['oai_dc']['namespace'],
+                               {'{%s}schemaLocation' % XSI: '%s %s' % (FORMATS['oai_dc']['namespace'], FORMATS['oai_dc']['schema'])})
+    dc = lambda tag, text: sub(root, '{%s}%s' % (DC, tag), text)
+    dc('title', work.preferred_title.title)
+    for name, role in data.agents:
+        dc('creator', name)
+    if work.production_id and work.production.date_id:
+        dc('date', work.production.date.display)
+    dc('type', work.get_work_type_display())
+    if work.brief_description:
+        dc('description', work.brief_description)
+    for kind, value in sorted(data.dimensions.items()):
+        if kind in UNITS:
+            dc('format', '%s: %s %s' % (kind, value, UNITS[kind]))
+    for name in data.materials:
+        dc('format', name)
+    for name, kind in data.places:
+        dc('coverage', name)
+    if data.refid:
+        dc('identifier', data.refid)
+    dc('identifier', work_url(work.pk))
+    if work.preferred_title.lang_id:
+        dc('language', work.preferred_title.lang_id)
+    for text in data.rights:
+        dc('rights', text)
+    return root
+
+def vra(data):
+    work = data.work
+    ns = FORMATS['vra']['namespace']
+    tag = lambda name: '{%s}%s' % (ns, name)
+    root = ElementTree.Element(tag('vra'), {'{%s}schemaLocation' % XSI: '%s %s' % (ns, FORMATS['vra']['schema'])})
+    attrs = {'id': 'w_%d' % work.pk, 'source': work.source or ''}
+    if data.refid:
+        attrs['refid'] = data.refid
+    element = sub(root, tag('work'), **attrs)
+    if data.agents:
+        agents = sub(element, tag('agentSet'))
+        sub(agents, tag('display'), '; '.join(name for name, role in data.agents))
+        for name, role in data.agents:
+            agent = sub(agents, tag('agent'))
+            sub(agent, tag('name'), name, type='personal')
+            sub(agent, tag('role'), role)
+    if work.production_id and work.production.date_id:
+        date = work.production.date
+        dates = sub(element, tag('dateSet'))
+        sub(dates, tag('display'), date.display)
+        when = sub(dates, tag('date'), type='creation')
+        if date.earliest:
+            sub(when, tag('earliestDate'), date.earliest, circa='true' if date.earliest_accuracy else 'false')
+        if date.latest:
+            sub(when, tag('latestDate'), date.latest, circa='true' if date.latest_accuracy else 'false')
+    if work.brief_description:
+        sub(sub(element, tag('descriptionSet')), tag('description'), work.brief_description)
+    if data.places:
+        places = sub(element, tag('locationSet'))
+        for name, kind in data.places:
+            sub(sub(places, tag('location'), type=kind), tag('name'), name, type='geographic')
+    if data.materials:
+        materials = sub(element, tag('materialSet'))
+        sub(materials, tag('display'), ', '.join(data.materials))
+        for name in data.materials:
+            sub(materials, tag('material'), name)
+    measured = [(kind, value) for kind, value in sorted(data.dimensions.items()) if kind in UNITS]
+    if measured:
+        measurements = sub(element, tag('measurementsSet'))
+        sub(measurements, tag('display'), '; '.join('%s %s %s' % (kind, value, UNITS[kind]) for kind, value in measured))
+        for kind, value in measured:
+            sub(measurements, tag('measurements'), value, type=kind, unit=UNITS[kind])
+    if data.rights:
+        rights = sub(element, tag('rightsSet'))
+        for text in data.rights:
+            sub(sub(rights, tag('rights')), tag('text'), text)
+    titles = sub(element, tag('titleSet'))
+    sub(titles, tag('display'), work.preferred_title.title)
+    sub(titles, tag('title'), work.preferred_title.title, pref='true')
+    types = sub(element, tag('worktypeSet'))
+    sub(types, tag('worktype'), work.get_work_type_display())
+    return root
+
+SERIALISERS = {
+    'oai_dc': oai_dc,
+    'vra': vra,
+}
+
+def records(prefix, works):
+    """
+    Returns {pk: metadata XML} for the given ObjectRegister rows
+    (or (pk, last_modified) pairs), from the cache where possible.
+    """
+    stamps = dict((w.pk, w.last_modified) if hasattr(w, 'pk') else w for w in works)
+    keys = dict((cache_key(prefix, pk, stamp), pk) for pk, stamp in stamps.items())
+    found = cache().get_many(list(keys))
+    result = dict((keys[key], xml) for key, xml in found.items())
+    missing = [pk for pk in stamps if pk not in result]
+    if missing:
+        built = {}
+        for pk, data in gather(missing).items():
+            built[cache_key(prefix, pk, stamps[pk])] = ElementTree.tostring(SERIALISERS[prefix](data), encoding='unicode')
+        cache().set_many(built, getattr(settings, 'OAI_CACHE_SECONDS', 86400))
+        result.update((keys[key], xml) for key, xml in built.items())
+    return result
+# /Metadata formats
+###########################################################
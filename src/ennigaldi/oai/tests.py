@@ -0,0 +1,71 @@
+from xml.etree import ElementTree
+from django.test import TestCase, override_settings
+from objectinfo.models import ObjectRegister, ObjectName, IsoLanguage, Dimension
+
+OAI = '{http://www.openarchives.org/OAI/2.0/}'
+DC = '{http://purl.org/dc/elements/1.1/}'
+VRA = '{http://www.vraweb.org/vracore4.htm}'
+
+@override_settings(OAI_PAGE_SIZE=2)
+class TestOAI(TestCase):
+    def setUp(self):
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        self.works = [ObjectRegister.objects.create(preferred_title=ObjectName.objects.create(title="Ex-voto %d" % i, lang=ptbr), brief_description="Carved wood.")
+                      for i in range(5)]
+        Dimension.objects.create(work=self.works[0], dimension_type='height', dimension_value=250)
+
+    def get(self, **params):
+        response = self.client.get('/oai/', params)
+        self.assertEqual(response.status_code, 200)
+        return ElementTree.fromstring(response.content)
+
+    def test_harvest(self):
+        """
+        Check that ListIdentifiers pages through every work with
+        resumption tokens, ending with an empty one.
+        """
+        seen = []
+        root = self.get(verb='ListIdentifiers', metadataPrefix='oai_dc')
+        while True:
+            listing = root.find(OAI + 'ListIdentifiers')
+            seen.extend(h.find(OAI + 'identifier').text for h in listing.findall(OAI + 'header'))
+            token = listing.find(OAI + 'resumptionToken')
+            if token is None or not token.text:
+                break
+            root = self.get(verb='ListIdentifiers', resumptionToken=token.text)
+        self.assertEqual(seen, ['oai:ennigaldi:work/%d' % w.pk for w in self.works])
+        self.assertIsNotNone(token)
+
+    def test_records(self):
+        """
+        Check the Dublin Core and VRA Core records, and that a
+        change to the work rebuilds its cached record.
+        """
+        identifier = 'oai:ennigaldi:work/%d' % self.works[0].pk
+        dc = self.get(verb='GetRecord', metadataPrefix='oai_dc', identifier=identifier).find('.//' + OAI + 'metadata')
+        self.assertEqual(dc.find('.//' + DC + 'title').text, 'Ex-voto 0')
+        self.assertIn('height: 250 mm', [f.text for f in dc.iter(DC + 'format')])
+        vra = self.get(verb='ListRecords', metadataPrefix='vra').find('.//' + VRA + 'work')
+        self.assertEqual(vra.find(VRA + 'measurementsSet/' + VRA + 'measurements').get('unit'), 'mm')
+        name = self.works[0].preferred_title
+        name.title = 'Ex-voto (head)'
+        name.save()
+        dc = self.get(verb='GetRecord', metadataPrefix='oai_dc', identifier=identifier)
+        self.assertEqual(dc.find('.//' + DC + 'title').text, 'Ex-voto (head)')
+
+    def test_errors(self):
+        """
+        Check protocol errors.
+        """
+        codes = [
+            (dict(verb='Harvest'), 'badVerb'),
+            (dict(verb='ListRecords'), 'badArgument'),
+            (dict(verb='ListRecords', metadataPrefix='marc21'), 'cannotDisseminateFormat'),
+            (dict(verb='ListRecords', resumptionToken='garbage'), 'badResumptionToken'),
+            (dict(verb='ListRecords', metadataPrefix='oai_dc', **{'from': '2999-01-01'}), 'noRecordsMatch'),
+            (dict(verb='GetRecord', metadataPrefix='oai_dc', identifier='oai:ennigaldi:work/999'), 'idDoesNotExist'),
+            (dict(verb='ListSets'), 'noSetHierarchy'),
+        ]
+        for params, code in codes:
+            self.assertEqual(self.get(**params).find(OAI + 'error').get('code'), code)
+        self.assertIsNotNone(self.get(verb='Identify').find(OAI + 'Identify/' + OAI + 'earliestDatestamp'))
@@ -0,0 +1,215 @@
+import base64
+import datetime
+from xml.sax.saxutils import escape, quoteattr
+from django.conf import settings
+from django.db.models import Min
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from objectinfo.models import ObjectRegister
+from .metadata import FORMATS, records
+
+###########################################################
+# OAI-PMH 2.0 provider
+# Lists are paged by work_id: a resumption token carries the
+# last work_id sent, the request's from/until, and the time the
+# harvest started. Records changed after that time are left to
+# the next incremental harvest, so the list stays consistent and
+# each page is one indexed range query, whatever its position in
+# the collection.
+OAI = 'http://www.openarchives.org/OAI/2.0/'
+GRANULARITY = 'YYYY-MM-DDThh:mm:ssZ'
+
+VERBS = {
+    'Identify': (),
+    'ListMetadataFormats': ('identifier',),
+    'ListSets': ('resumptionToken',),
+    'GetRecord': ('identifier', 'metadataPrefix'),
+    'ListIdentifiers': ('metadataPrefix', 'from', 'until', 'set', 'resumptionToken'),
+    'ListRecords': ('metadataPrefix', 'from', 'until', 'set', 'resumptionToken'),
+}
+
+class OAIError(Exception):
+    def __init__(self, code, message):
+        super(OAIError, self).__init__(message)
+        self.code = code
+
+def page_size():
+    return getattr(settings, 'OAI_PAGE_SIZE', 100)
+
+def repository_id():
+    return getattr(settings, 'OAI_REPOSITORY_IDENTIFIER', 'ennigaldi')
+
+def identifier(pk):
+    return 'oai:%s:work/%d' % (repository_id(), pk)
+
+def work_pk(value):
+    prefix = 'oai:%s:work/' % repository_id()
+    if not value.startswith(prefix) or not value[len(prefix):].isdigit():
+        raise OAIError('idDoesNotExist', 'No such identifier: %s' % value)
+    return int(value[len(prefix):])
+
+def stamp(value):
+    return value.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def parse_date(value, end=False):
+    """
+    Reads a from/until argument, at day or second granularity.
+    """
+    for fmt, day in (('%Y-%m-%dT%H:%M:%SZ', False), ('%Y-%m-%d', True)):
+        try:
+            parsed = datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if day and end:
+            parsed += datetime.timedelta(days=1) - datetime.timedelta(microseconds=1)
+        elif not day and end:
+            parsed += datetime.timedelta(seconds=1) - datetime.timedelta(microseconds=1)
+        return parsed.replace(tzinfo=datetime.timezone.utc)
+    raise OAIError('badArgument', 'Dates must be YYYY-MM-DD or YYYY-MM-DDThh:mm:ssZ.')
+
+def encode_token(prefix, since, until, started, last):
+    value = '|'.join([prefix, since or '', until or '', started.strftime('%Y%m%d%H%M%S%f'), str(last)])
+    return base64.urlsafe_b64encode(value.encode('utf-8')).decode('ascii')
+
+def decode_token(token):
+    try:
+        prefix, since, until, started, last = base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8').split('|')
+        started = datetime.datetime.strptime(started, '%Y%m%d%H%M%S%f').replace(tzinfo=datetime.timezone.utc)
+        return prefix, since or None, until or None, started, int(last)
+    except (ValueError, TypeError, UnicodeError):
+        raise OAIError('badResumptionToken', 'The resumption token is not valid.')
+
+def arguments(request):
+    args = dict((key, values[-1]) for key, values in request.GET.lists())
+    if request.method == 'POST':
+        args.update((key, values[-1]) for key, values in request.POST.lists())
+    verb = args.pop('verb', None)
+    if verb not in VERBS:
+        raise OAIError('badVerb', 'Unknown or missing verb.')
+    unknown = set(args) - set(VERBS[verb])
+    if unknown:
+        raise OAIError('badArgument', 'Unknown arguments: %s.' % ', '.join(sorted(unknown)))
+    if 'resumptionToken' in args and len(args) > 1:
+        raise OAIError('badArgument', 'resumptionToken is an exclusive argument.')
+    return verb, args
+
+def check_prefix(prefix):
+    if not prefix:
+        raise OAIError('badArgument', 'metadataPrefix is required.')
+    if prefix not in FORMATS:
+        raise OAIError('cannotDisseminateFormat', 'Formats available: %s.' % ', '.join(sorted(FORMATS)))
+    return prefix
+
+def header(pk, modified):
+    return '<header><identifier>%s</identifier><datestamp>%s</datestamp></header>' % (escape(identifier(pk)), stamp(modified))
+
+def identify(args):
+    earliest = ObjectRegister.objects.aggregate(earliest=Min('last_modified'))['earliest'] or timezone.now()
+    emails = getattr(settings, 'OAI_ADMIN_EMAILS', None) or [email for name, email in getattr(settings, 'ADMINS', [])] or ['admin@localhost']
+    return ''.join([
+        '<Identify>',
+        '<repositoryName>%s</repositoryName>' % escape(getattr(settings, 'OAI_REPOSITORY_NAME', 'Ennigaldi collection')),
+        '<baseURL>%s</baseURL>' % escape(args['base_url']),
+        '<protocolVersion>2.0</protocolVersion>',
+        ''.join('<adminEmail>%s</adminEmail>' % escape(email) for email in emails),
+        '<earliestDatestamp>%s</earliestDatestamp>' % stamp(earliest),
+        '<deletedRecord>no</deletedRecord>',
+        '<granularity>%s</granularity>' % GRANULARITY,
+        '</Identify>',
+    ])
+
+def list_metadata_formats(args):
+    if 'identifier' in args and not ObjectRegister.objects.filter(pk=work_pk(args['identifier'])).exists():
+        raise OAIError('idDoesNotExist', 'No such identifier: %s' % args['identifier'])
+    return '<ListMetadataFormats>%s</ListMetadataFormats>' % ''.join(
+        '<metadataFormat><metadataPrefix>%s</metadataPrefix><schema>%s</schema><metadataNamespace>%s</metadataNamespace></metadataFormat>'
+        % (prefix, escape(f['schema']), escape(f['namespace'])) for prefix, f in sorted(FORMATS.items()))
+
+def list_sets(args):
+    raise OAIError('noSetHierarchy', 'This repository does not support sets.')
+
+def get_record(args):
+    prefix = check_prefix(args.get('metadataPrefix'))
+    if 'identifier' not in args:
+        raise OAIError('badArgument', 'identifier is required.')
+    pk = work_pk(args['identifier'])
+    work = ObjectRegister.objects.filter(pk=pk).values_list('pk', 'last_modified').first()
+    if work is None:
+        raise OAIError('idDoesNotExist', 'No such identifier: %s' % args['identifier'])
+    xml = records(prefix, [work])[pk]
+    return '<GetRecord><record>%s<metadata>%s</metadata></record></GetRecord>' % (header(*work), xml)
+
+def list_works(args, with_records):
+    verb = 'ListRecords' if with_records else 'ListIdentifiers'
+    if 'resumptionToken' in args:
+        prefix, since, until, started, last = decode_token(args['resumptionToken'])
+        if prefix not in FORMATS:
+            raise OAIError('badResumptionToken', 'The resumption token is not valid.')
+    else:
+        prefix, since, until, started, last = check_prefix(args.get('metadataPrefix')), args.get('from'), args.get('until'), timezone.now(), 0
+        if 'set' in args:
+            raise OAIError('noSetHierarchy', 'This repository does not support sets.')
+    works = ObjectRegister.objects.filter(pk__gt=last, last_modified__lte=started)
+    if since:
+        works = works.filter(last_modified__gte=parse_date(since))
+    if until:
+        works = works.filter(last_modified__lte=parse_date(until, end=True))
+    if since and until and len(since) != len(until):
+        raise OAIError('badArgument', 'from and until must have the same granularity.')
+    page = list(works.order_by('pk').values_list('pk', 'last_modified')[:page_size() + 1])
+    if not page:
+        raise OAIError('noRecordsMatch', 'No records match the request.')
+    more = len(page) > page_size()
+    page = page[:page_size()]
+    xml = records(prefix, page) if with_records else {}
+    if with_records:
+        items = ''.join('<record>%s<metadata>%s</metadata></record>' % (header(pk, modified), xml[pk]) for pk, modified in page)
+    else:
+        items = ''.join(header(pk, modified) for pk, modified in page)
+    if more:
+        items += '<resumptionToken>%s</resumptionToken>' % encode_token(prefix, since, until, started, page[-1][0])
+    elif last:
+        # The last page of a resumed list ends with an empty token.
+        items += '<resumptionToken/>'
+    return '<%s>%s</%s>' % (verb, items, verb)
+
+HANDLERS = {
+    'Identify': identify,
+    'ListMetadataFormats': list_metadata_formats,
+    'ListSets': list_sets,
+    'GetRecord': get_record,
+    'ListIdentifiers': lambda args: list_works(args, False),
+    'ListRecords': lambda args: list_works(args, True),
+}
+
+@csrf_exempt
+def oai(request):
+    """
+    OAI-PMH endpoint, serving works as Dublin Core (oai_dc) and
+    VRA Core 4 (vra) records.
+    """
+    base_url = request.build_absolute_uri(request.path)
+    attrs = ''
+    try:
+        verb, args = arguments(request)
+        attrs = ''.join(' %s=%s' % (key, quoteattr(value)) for key, value in sorted(args.items())) + ' verb="%s"' % verb
+        args['base_url'] = base_url
+        body = HANDLERS[verb](args)
+    except OAIError as error:
+        body = '<error code="%s">%s</error>' % (error.code, escape(str(error)))
+        if error.code in ('badVerb', 'badArgument'):
+            # Only valid arguments are echoed in the request element.
+            attrs = ''
+    xml = ''.join([
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<OAI-PMH xmlns="%s" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        'xsi:schemaLocation="%s http://www.openarchives.org/OAI/2.0/OAI-PMH.xsd">' % (OAI, OAI),
+        '<responseDate>%s</responseDate>' % stamp(timezone.now()),
+        '<request%s>%s</request>' % (attrs, escape(base_url)),
+        body,
+        '</OAI-PMH>',
+    ])
+    return HttpResponse(xml, content_type='text/xml; charset=utf-8')
+# /OAI-PMH 2.0 provider
+###########################################################
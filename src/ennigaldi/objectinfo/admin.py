@@ -1,30 +1,156 @@
 from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ChangeList
+from django.shortcuts import render
+from .bulk import bulk_update
+from .forms import BulkEditForm
+from storageunit.models import path_labels
 from .models import *
+from .paginator import EstimatedCountPaginator
+from .widgets import Autocomplete
 
-admin.site.register(ObjectRegister)
+class AutocompleteAdmin(admin.ModelAdmin):
+    """
+    Renders the foreign keys named in autocomplete_sources, as
+    {field name: source}, with the Autocomplete widget.
+    """
+    autocomplete_sources = {}
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.autocomplete_sources:
+            kwargs['widget'] = Autocomplete(self.autocomplete_sources[db_field.name])
+        return super(AutocompleteAdmin, self).formfield_for_foreignkey(db_field, request, **kwargs)
+
+def bulk_edit(modeladmin, request, queryset):
+    """
+    Sets source, normal unit, work type or description source
+    on all the selected works at once.
+    """
+    form = BulkEditForm(request.POST if 'apply' in request.POST else None)
+    if form.is_bound and form.is_valid():
+        count = bulk_update(queryset, form.changes(), user=request.user)
+        modeladmin.message_user(request, '%d works changed.' % count)
+        return None
+    return render(request, 'admin/objectinfo/bulk_edit.html', {
+        'form': form,
+        'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+        'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        'opts': modeladmin.model._meta,
+    })
+bulk_edit.short_description = 'Bulk edit selected works'
+
+def deprecate_dimensions(modeladmin, request, queryset):
+    count = bulk_update(queryset, {'dimension_deprecated': True}, user=request.user, comment='Deprecated dimensions')
+    modeladmin.message_user(request, '%d dimensions deprecated.' % count)
+deprecate_dimensions.short_description = 'Mark selected dimensions as deprecated'
+
+class ObjectRegisterAdmin(AutocompleteAdmin):
+    actions = [bulk_edit]
+    list_select_related = ['preferred_title']
+    autocomplete_sources = {'preferred_title': 'title', 'normal_unit': 'unit'}
+
+class ObjectNameAdmin(AutocompleteAdmin):
+    autocomplete_sources = {'lang': 'language'}
+
+class InscriptionAdmin(AutocompleteAdmin):
+    autocomplete_sources = {'inscription_author': 'agent', 'inscription_language': 'language'}
+
+class PlaceReferenceAdmin(AutocompleteAdmin):
+    autocomplete_sources = {'location': 'place', 'material_source': 'place', 'ownership_place': 'place',
+                            'textref_location': 'place', 'owner': 'agent'}
+
+class MaterialTypeAdmin(AutocompleteAdmin):
+    autocomplete_sources = {'material': 'material'}
+
+###########################################################
+# Changelists of the rows of a work's record
+# These tables grow with the collection, and their __str__
+# follows foreign keys to the work and its title, so each
+# admin joins what its list shows, searches indexed columns by
+# prefix, uses raw-id or autocomplete inputs instead of loading
+# every work into a <select>, and does not count whole tables.
+class RecordAdmin(AutocompleteAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+class DimensionAdmin(RecordAdmin):
+    list_display = ['__str__', 'dimension_type', 'dimension_value', 'dimension_deprecated']
+    list_filter = ['dimension_type', 'dimension_deprecated']
+    list_select_related = ['work__preferred_title']
+    raw_id_fields = ['work']
+    search_fields = ['^work__preferred_title__title', '^dimension_part']
+    actions = [deprecate_dimensions]
+
+class UnitPathChangeList(ChangeList):
+    # Unit.__str__ reads one parent per level and row; the paths
+    # of a whole page are read with one query per level instead.
+    def get_results(self, request):
+        super(UnitPathChangeList, self).get_results(request)
+        labels = path_labels([obj.unit for obj in self.result_list])
+        for obj in self.result_list:
+            obj.unit_path = labels[obj.unit_id]
+
+class ObjectUnitAdmin(RecordAdmin):
+    list_display = ['work', 'location', 'date']
+    list_select_related = ['work__preferred_title', 'unit']
+    raw_id_fields = ['work']
+    autocomplete_sources = {'unit': 'unit'}
+    search_fields = ['^work__preferred_title__title', '^unit__acronym', '^unit__name']
+    date_hierarchy = 'date'
+
+    def get_changelist(self, request, **kwargs):
+        return UnitPathChangeList
+
+    def location(self, obj):
+        return getattr(obj, 'unit_path', None) or str(obj.unit)
+
+class AgentRoleAdmin(RecordAdmin):
+    list_display = ['__str__', 'agent', 'agent_role', 'attributed', 'work_id']
+    list_select_related = ['agent']
+    raw_id_fields = ['work']
+    autocomplete_sources = {'agent': 'agent'}
+    search_fields = ['^agent__name', '^agent__display', '^agent_role']
+
+class HierarchyAdmin(RecordAdmin):
+    list_display = ['lesser', 'relation_type', 'greater']
+    list_filter = ['relation_type']
+    list_select_related = ['lesser__preferred_title', 'greater__preferred_title']
+    raw_id_fields = ['lesser', 'greater']
+    search_fields = ['^lesser__preferred_title__title', '^greater__preferred_title__title']
+
+class ArtifactDateTypeAdmin(RecordAdmin):
+    list_display = ['__str__', 'date_type', 'datation']
+    list_filter = ['date_type']
+    list_select_related = ['dated', 'datation']
+    raw_id_fields = ['dated', 'datation']
+    search_fields = ['^datation__display']
+# /Changelists of the rows of a work's record
+###########################################################
+
+admin.site.register(ObjectRegister, ObjectRegisterAdmin)
 admin.site.register(OtherNumber)
-admin.site.register(ObjectName)
+admin.site.register(ObjectName, ObjectNameAdmin)
 admin.site.register(Production)
-admin.site.register(AgentRole)
-admin.site.register(ObjectPlaceType)
-admin.site.register(ObjectUnit)
+admin.site.register(AgentRole, AgentRoleAdmin)
+admin.site.register(ObjectPlaceType, PlaceReferenceAdmin)
+admin.site.register(ObjectUnit, ObjectUnitAdmin)
 admin.site.register(Specimen)
 admin.site.register(Artifact)
 admin.site.register(WorkInstance)
-admin.site.register(Dimension)
-admin.site.register(Inscription)
+admin.site.register(Dimension, DimensionAdmin)
+admin.site.register(Inscription, InscriptionAdmin)
 admin.site.register(TechnicalAttribute)
 admin.site.register(Colour)
 admin.site.register(SpecimenDateType)
-admin.site.register(ArtifactDateType)
-admin.site.register(Material)
-admin.site.register(MaterialType)
+admin.site.register(ArtifactDateType, ArtifactDateTypeAdmin)
+admin.site.register(Material, PlaceReferenceAdmin)
+admin.site.register(MaterialType, MaterialTypeAdmin)
 admin.site.register(DescriptionContent)
 admin.site.register(ContentMeta)
 admin.site.register(Rights)
 admin.site.register(AssociatedObject)
-admin.site.register(Ownership)
-admin.site.register(Hierarchy)
+admin.site.register(Ownership, PlaceReferenceAdmin)
+admin.site.register(Hierarchy, HierarchyAdmin)
 admin.site.register(RelatedObject)
-admin.site.register(TextRef)
+admin.site.register(TextRef, PlaceReferenceAdmin)
 admin.site.register(IsoLanguage)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ObjectinfoConfig(AppConfig):
     name = 'objectinfo'
+
+    def ready(self):
+        from . import signals, vocabulary
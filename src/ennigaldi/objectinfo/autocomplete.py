@@ -0,0 +1,76 @@
+from django.db.models import Q
+from agent.models import Agent
+from ennigaldi.text import fold
+from place import gazetteer
+from storageunit.models import Unit, path_labels
+from .models import ObjectName, Material, IsoLanguage
+from .vocabulary import vocabulary
+
+###########################################################
+# Autocomplete sources
+# Entry forms and the admin used to render every title, unit,
+# agent, place, material and language as a <select> option.
+# Instead, the widgets in objectinfo.widgets render the selected
+# option only and ask /work/autocomplete/<source>/?q= for
+# matches as the user types.
+LIMIT = 20
+
+def prefix_filter(fields, q):
+    """
+    Matches rows where any of fields starts with q. SQLite only
+    uses an index for LIKE on NOCASE columns, so this looks up
+    index ranges for the usual capitalisations of q instead.
+    """
+    variants = set([q, q.lower(), q.upper(), q[:1].upper() + q[1:].lower()])
+    condition = Q()
+    for field in fields:
+        for v in variants:
+            condition |= Q(**{field + '__gte': v, field + '__lt': v + '\uffff'})
+    return condition
+
+def search_titles(q, limit):
+    titles = ObjectName.objects.filter(prefix_filter(['title'], q)).order_by('title')
+    return list(titles.values_list('pk', 'title')[:limit])
+
+def search_units(q, limit):
+    units = list(Unit.objects.filter(prefix_filter(['acronym', 'name'], q)).order_by('acronym', 'name')[:limit])
+    labels = path_labels(units)
+    return [(u.pk, labels[u.pk]) for u in units]
+
+def search_agents(q, limit):
+    # name_key also finds names typed without their accents.
+    agents = Agent.objects.filter(prefix_filter(['name', 'display'], q) | prefix_filter(['name_key'], fold(q))).order_by('display')
+    return list(agents.values_list('pk', 'display')[:limit])
+
+# Materials and languages are served from the in-memory
+# vocabularies of objectinfo.vocabulary.
+def search_vocabulary(model):
+    def search(q, limit):
+        q = q.lower()
+        found = [(pk, label) for pk, label in vocabulary(model).choices() if label.lower().startswith(q) or str(pk).lower().startswith(q)]
+        return found[:limit]
+    return search
+
+def search_places(q, limit):
+    return [(place.pk, str(place)) for place, score, how in gazetteer.matches(q, limit=limit)]
+
+SOURCES = {
+    'title': search_titles,
+    'unit': search_units,
+    'agent': search_agents,
+    'place': search_places,
+    'material': search_vocabulary(Material),
+    'language': search_vocabulary(IsoLanguage),
+}
+
+def search(source, q, limit=LIMIT):
+    """
+    Returns up to limit (pk, label) pairs of source whose label
+    starts with q.
+    """
+    q = q.strip()
+    if not q:
+        return []
+    return SOURCES[source](q, min(limit, LIMIT))
+# /Autocomplete sources
+###########################################################
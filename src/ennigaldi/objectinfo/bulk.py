@@ -0,0 +1,135 @@
+import json
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from changefeed.models import change, record_many
+from ennigaldi.writes import serialized
+from history.revisions import dumps, label, plain, save_revision
+from history.models import Delta
+from reorg.models import AccessionNumber
+from .models import ObjectRegister, Dimension, AgentRole, Inscription, Ownership
+from .signals import WORK_PATHS
+
+# Fields that may be changed in bulk, by model.
+BULK_FIELDS = {
+    ObjectRegister: ('source', 'normal_unit', 'work_type', 'description_source'),
+    Dimension: ('dimension_part', 'dimension_value_qualifier', 'dimension_deprecated'),
+    # Renumbered by the repairs of reorg.integrity.
+    AccessionNumber: ('object_number', 'part_number', 'part_count'),
+    # Repointed when agents are merged, by agent.authority.
+    AgentRole: ('agent',),
+    Inscription: ('inscription_author',),
+    Ownership: ('owner',),
+}
+
+# Models the bulk edit endpoint and job accept, by name.
+BULK_MODELS = {
+    'objectregister': ObjectRegister,
+    'dimension': Dimension,
+}
+
+# Keeps pk__in lists under SQLite's limit on query parameters.
+CHUNK = 900
+
+def chunks(values):
+    values = list(values)
+    for i in range(0, len(values), CHUNK):
+        yield values[i:i + CHUNK]
+
+def clean_changes(model, changes):
+    """
+    Validates {field name: value} against the model's fields and
+    returns it keyed by column attname, e.g. normal_unit_id.
+    """
+    allowed = BULK_FIELDS.get(model, ())
+    cleaned = {}
+    for name, value in changes.items():
+        if name not in allowed:
+            raise ValidationError('%s cannot be edited in bulk.' % name)
+        field = model._meta.get_field(name)
+        if hasattr(value, 'pk'):
+            value = value.pk
+        if value in ('', None) and field.null:
+            value = None
+        else:
+            value = field.clean(value, None)
+        cleaned[field.attname] = value
+    return cleaned
+
+@serialized
+def bulk_update(queryset, changes, user=None, comment='Bulk edit'):
+    """
+    Applies changes ({field name: value}) to the rows of queryset
+    whose values actually change, with an UPDATE per CHUNK rows.
+    Each gets one change-feed entry and one history delta, all in
+    a single revision, and their works are re-stamped.
+    Returns the number of rows changed.
+    """
+    model = queryset.model
+    columns = clean_changes(model, changes)
+    # Rows that belong to no work, e.g. Ownership, have no path.
+    path = WORK_PATHS.get(model, ('pk',))
+    attnames = list(columns)
+    # The row's own pk is already selected, so it is not asked
+    # for twice when it is also the link to the work.
+    link_attrs = [a for a in path[1:] if a != 'pk']
+    rows = list(queryset.values_list('pk', *(attnames + link_attrs)))
+
+    changed = []
+    for row in rows:
+        pk, old, links = row[0], row[1:len(attnames) + 1], row[len(attnames) + 1:]
+        if 'pk' in path[1:]:
+            links = (pk,) + links
+        diff = dict((a, [plain(o), plain(columns[a])]) for a, o in zip(attnames, old) if plain(o) != plain(columns[a]))
+        if diff:
+            changed.append((pk, diff, [l for l in links if l is not None]))
+    if not changed:
+        return 0
+
+    now = timezone.now()
+    update = dict(columns)
+    if model is ObjectRegister:
+        update['last_modified'] = now
+    # Only the changed rows, so that the others keep their stamp.
+    for part in chunks(pk for pk, diff, links in changed):
+        model.objects.filter(pk__in=part).update(**update)
+
+    # Work ids of every changed row: read off the row itself, or
+    # looked up with one query for indirect paths.
+    if path[0] == 'pk':
+        works = dict((pk, links) for pk, diff, links in changed)
+    else:
+        values = set(l for pk, diff, links in changed for l in links)
+        found = {}
+        for part in chunks(values):
+            for value, work in ObjectRegister.objects.filter(**{path[0] + '__in': part}).values_list(path[0], 'pk'):
+                found.setdefault(value, []).append(work)
+        works = dict((pk, [w for l in links for w in found.get(l, [])]) for pk, diff, links in changed)
+    if model is not ObjectRegister:
+        for part in chunks(set(w for ids in works.values() for w in ids)):
+            ObjectRegister.objects.filter(pk__in=part).update(last_modified=now)
+
+    record_many([
+        change(model, pk, 'update', json.dumps(dict((a, v[1]) for a, v in diff.items())), works[pk])
+        for pk, diff, links in changed
+    ])
+    if user is not None and not user.is_authenticated:
+        user = None
+    save_revision([
+        Delta(model=label(model), object_pk=str(pk), work=works[pk][0] if works[pk] else None, action='update', changes=dumps(diff))
+        for pk, diff, links in changed
+    ], user, comment)
+    return len(changed)
+
+@serialized
+def bulk_update_pks(model, pks, changes, user=None, comment='Bulk edit'):
+    """
+    As bulk_update, for the rows of model with the given pks,
+    CHUNK at a time in one transaction (a revision per chunk).
+    Returns (rows matched, rows changed).
+    """
+    matched = changed = 0
+    for part in chunks(set(pks)):
+        queryset = model.objects.filter(pk__in=part)
+        matched += queryset.count()
+        changed += bulk_update(queryset, changes, user, comment)
+    return matched, changed
@@ -0,0 +1,246 @@
+import csv
+import os
+from historicdate.models import date_key
+from reorg.models import AccessionNumber
+from storageunit.models import Unit
+from .models import *
+from .vocabulary import vocabulary
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+###########################################################
+# Columnar export
+# Flat tables of the collection for analysis outside the
+# application, one row per record and only scalar columns, with
+# the pk of the work in every table that belongs to one. Rows
+# are read in keyset-paginated chunks (pk > last pk read), since
+# SQLite reads a whole result into memory even through
+# iterator(), and written out chunk by chunk, so memory use does
+# not grow with the collection.
+CHUNK = 2000
+
+class Table(object):
+    """
+    An exported table. columns is a list of (name, source, type),
+    where source is a lookup on model, or a function of the dict
+    of {lookup: value} read for the row, and type one of 'int',
+    'float', 'str', 'bool', 'date' or 'datetime'.
+    """
+    def __init__(self, name, model, columns):
+        self.name = name
+        self.model = model
+        self.columns = columns
+        self.lookups = [source for name, source, kind in columns if not callable(source)]
+
+    def needs(self, *lookups):
+        # Lookups only read to compute other columns.
+        self.lookups.extend(l for l in lookups if l not in self.lookups)
+        return self
+
+    def convert(self, values):
+        row = dict(zip(self.lookups, values))
+        return [source(row) if callable(source) else row[source] for name, source, kind in self.columns]
+
+    def chunks(self, size=CHUNK, using=None):
+        queryset = self.model._base_manager.using(using).order_by('pk')
+        lookups = list(self.lookups)
+        pk = self.model._meta.pk.attname
+        if pk not in lookups:
+            lookups.append(pk)
+        index = lookups.index(pk)
+        last = None
+        while True:
+            page = queryset if last is None else queryset.filter(pk__gt=last)
+            rows = list(page.values_list(*lookups)[:size])
+            if not rows:
+                return
+            last = rows[-1][index]
+            yield [self.convert(row) for row in rows]
+
+def language(lookup):
+    def label(row):
+        return vocabulary(IsoLanguage).label(row[lookup]) if row[lookup] is not None else None
+    return label
+
+def key(lookup, end=False):
+    def convert(row):
+        return date_key(row[lookup], end)
+    return convert
+
+def date_columns(prefix):
+    return [
+        ('date_id', prefix + 'id', 'int'),
+        ('display', prefix + 'display', 'str'),
+        ('earliest', prefix + 'earliest', 'str'),
+        ('earliest_circa', prefix + 'earliest_accuracy', 'bool'),
+        ('earliest_key', key(prefix + 'earliest'), 'int'),
+        ('latest', prefix + 'latest', 'str'),
+        ('latest_circa', prefix + 'latest_accuracy', 'bool'),
+        ('latest_key', key(prefix + 'latest', end=True), 'int'),
+    ]
+
+TABLES = [
+    Table('works', ObjectRegister, [
+        ('work_id', 'work_id', 'int'),
+        ('title', 'preferred_title__title', 'str'),
+        ('work_type', 'work_type', 'str'),
+        ('normal_unit_id', 'normal_unit_id', 'int'),
+        ('production_id', 'production_id', 'int'),
+        ('source', 'source', 'str'),
+        ('data_date', 'data_date', 'date'),
+        ('last_modified', 'last_modified', 'datetime'),
+    ]),
+    Table('names', ObjectName, [
+        ('name_id', 'id', 'int'),
+        ('work_id', 'objectregister__work_id', 'int'),
+        ('title', 'title', 'str'),
+        ('title_type', 'title_type', 'str'),
+        ('lang', 'lang_id', 'str'),
+        ('language', language('lang_id'), 'str'),
+        ('translation', 'translation', 'str'),
+        ('currency', 'currency', 'date'),
+    ]),
+    Table('dimensions', Dimension, [
+        ('dimension_id', 'id', 'int'),
+        ('work_id', 'work_id', 'int'),
+        ('part', 'dimension_part', 'str'),
+        ('type', 'dimension_type', 'str'),
+        ('value', 'dimension_value', 'int'),
+        ('approximate', 'dimension_value_qualifier', 'bool'),
+        ('deprecated', 'dimension_deprecated', 'bool'),
+        ('value_date', 'dimension_value_date', 'date'),
+    ]),
+    Table('inscriptions', Inscription, [
+        ('inscription_id', 'id', 'int'),
+        ('work_id', 'work_id', 'int'),
+        ('type', 'inscription_type', 'str'),
+        ('position', 'inscription_position', 'str'),
+        ('language', language('inscription_language_id'), 'str'),
+        ('script', 'inscription_script', 'str'),
+        ('method', 'inscription_method', 'str'),
+        ('author_id', 'inscription_author_id', 'int'),
+        ('text', 'inscription_text', 'str'),
+    ]).needs('inscription_language_id'),
+    Table('units', Unit, [
+        ('unit_id', 'id', 'int'),
+        ('parent_id', 'parent_id', 'int'),
+        ('acronym', 'acronym', 'str'),
+        ('name', 'name', 'str'),
+        ('unit_type', 'unit_type', 'str'),
+    ]),
+    Table('locations', ObjectUnit, [
+        ('location_id', 'id', 'int'),
+        ('work_id', 'work_id', 'int'),
+        ('unit_id', 'unit_id', 'int'),
+        ('date', 'date', 'datetime'),
+    ]),
+    Table('accessions', AccessionNumber, [
+        ('work_id', 'work_id', 'int'),
+        ('batch_id', 'batch_id', 'int'),
+        ('batch_year', 'batch__batch_year', 'int'),
+        ('batch_number', 'batch__batch_number', 'int'),
+        ('retrospective', 'batch__retrospective', 'bool'),
+        ('batch_date', 'batch__batch_datadate', 'date'),
+        ('object_number', 'object_number', 'int'),
+        ('part_number', 'part_number', 'int'),
+        ('part_count', 'part_count', 'int'),
+    ]),
+    Table('production_dates', Production, [
+        ('production_id', 'id', 'int'),
+        ('work_id', 'objectregister__work_id', 'int'),
+    ] + date_columns('date__')),
+    Table('artifact_dates', ArtifactDateType, [
+        ('id', 'id', 'int'),
+        ('work_id', 'dated__work_id', 'int'),
+        ('date_type', 'date_type', 'str'),
+    ] + date_columns('datation__')),
+    Table('specimen_dates', SpecimenDateType, [
+        ('id', 'id', 'int'),
+        ('work_id', 'dated__work_id', 'int'),
+        ('date_type', 'date_type', 'str'),
+    ] + date_columns('datation__')),
+]
+
+def get_table(name):
+    for table in TABLES:
+        if table.name == name:
+            return table
+    raise KeyError(name)
+
+
+class CSVWriter(object):
+    extension = 'csv'
+
+    def __init__(self, path, table):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([name for name, source, kind in table.columns])
+
+    def cell(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    def write(self, rows):
+        self.writer.writerows([self.cell(v) for v in row] for row in rows)
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter(object):
+    """
+    Writes each chunk as a row group of a Parquet file. Needs the
+    optional pyarrow package.
+    """
+    extension = 'parquet'
+
+    def __init__(self, path, table):
+        types = {
+            'int': pyarrow.int64(),
+            'float': pyarrow.float64(),
+            'str': pyarrow.string(),
+            'bool': pyarrow.bool_(),
+            'date': pyarrow.date32(),
+            'datetime': pyarrow.timestamp('us', tz='UTC'),
+        }
+        self.schema = pyarrow.schema([(name, types[kind]) for name, source, kind in table.columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        columns = [pyarrow.array(list(values), type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        self.writer.write_table(pyarrow.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+WRITERS = {
+    'csv': CSVWriter,
+    'parquet': ParquetWriter,
+}
+
+def export(table, directory, fmt='csv', chunk=CHUNK, using=None):
+    """
+    Writes table to directory/<name>.<format> and returns the
+    number of rows written.
+    """
+    writer_class = WRITERS[fmt]
+    path = os.path.join(directory, '%s.%s' % (table.name, writer_class.extension))
+    writer = writer_class(path, table)
+    count = 0
+    try:
+        for rows in table.chunks(chunk, using):
+            writer.write(rows)
+            count += len(rows)
+    finally:
+        writer.close()
+    return count
+# /Columnar export
+###########################################################
@@ -2,7 +2,9 @@ from django import forms
 from django.forms import ModelForm, inlineformset_factory
 from django.shortcuts import get_object_or_404
 from historicdate.models import HistoricDate
+from storageunit.models import Unit
 from .models import *
+from .widgets import Autocomplete
 
 # The TitleForm form populates the preferred_title OneToOneField
 # in the ObjectRegister. It needs to be a separate form,
@@ -12,23 +14,34 @@ class TitleForm(ModelForm):
     class Meta:
         model = ObjectName
         fields = ['title', 'title_type', 'lang', 'translation', 'currency', 'level', 'note', 'source']
+        widgets = {
+            'lang': Autocomplete('language'),
+        }
 
 class ObjectEntry(ModelForm):
     def __init__(self, *args, **kwargs):
         objectname_id = kwargs.pop('objectname_id', None)
         super(ObjectEntry, self).__init__(*args, **kwargs)
 
-        self.fields['preferred_title'].initial = get_object_or_404(ObjectName, pk=int(objectname_id))
+        if objectname_id is not None:
+            self.fields['preferred_title'].initial = get_object_or_404(ObjectName, pk=int(objectname_id))
 
     class Meta:
         model = ObjectRegister
         fields = ['preferred_title', 'snapshot', 'work_type', 'source', 'brief_description', 'description_source', 'comments', 'distinguishing_features', 'normal_unit']
+        widgets = {
+            'preferred_title': Autocomplete('title'),
+            'normal_unit': Autocomplete('unit'),
+        }
 
 
 class InscriptionForm(ModelForm):
     class Meta:
         model = Inscription
         fields = ['inscription_type', 'inscription_position', 'inscription_text', 'inscription_language', 'inscription_script', 'inscription_notes', 'inscription_method']
+        widgets = {
+            'inscription_language': Autocomplete('language'),
+        }
 
 inscription_formset = inlineformset_factory(ObjectRegister, Inscription, form=InscriptionForm, extra=3)
 
@@ -66,6 +79,17 @@ class DimensionForm(ModelForm):
 
 dimension_formset = inlineformset_factory(ObjectRegister, Dimension, form=DimensionForm, extra=4)
 
+# Used by the admin bulk edit action. Fields left blank
+# are not changed.
+class BulkEditForm(forms.Form):
+    source = forms.CharField(max_length=255, required=False)
+    normal_unit = forms.ModelChoiceField(queryset=Unit.objects.all(), required=False, widget=Autocomplete('unit'))
+    work_type = forms.ChoiceField(choices=(('', '---------'),) + ObjectRegister.work_types, required=False)
+    description_source = forms.CharField(max_length=255, required=False)
+
+    def changes(self):
+        return dict((k, v) for k, v in self.cleaned_data.items() if v not in ('', None))
+
 
 ###########################################################
 # The following is part of Description---commented here
@@ -0,0 +1,184 @@
+import calendar
+import json
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from historicdate.models import date_key
+from reorg.models import AccessionNumber
+from .bulk import chunks
+from .models import ObjectRegister, AgentRole, ObjectPlaceType, Dimension, Inscription, Hierarchy
+
+###########################################################
+# Linked Art
+# JSON-LD documents of works following the Linked Art profile
+# of CIDOC-CRM (https://linked.art/model/object/). A page of
+# works is gathered in a fixed number of queries, and each
+# document is cached under the work's last_modified stamp, which
+# every change to the work's record moves (see
+# objectinfo.signals), so a cached document is never served
+# stale and a dump only rebuilds the works changed since the
+# last one.
+CONTEXT = 'https://linked.art/ns/v1/linked-art.json'
+AAT = 'http://vocab.getty.edu/aat/'
+PAGE = 500
+
+def aat(number, label, kind='Type'):
+    return {'id': AAT + number, 'type': kind, '_label': label}
+
+PRIMARY_NAME = aat('300404670', 'primary name')
+TRANSLATED_NAME = aat('300417194', 'translated title')
+ACCESSION_NUMBER = aat('300312355', 'accession number')
+DESCRIPTION = aat('300435416', 'description')
+INSCRIPTION = aat('300028702', 'inscription')
+BRIEF_TEXT = aat('300418049', 'brief text')
+# Dimension type: (AAT type, unit)
+DIMENSIONS = {
+    'height': (aat('300055644', 'height'), aat('300379097', 'millimetres', 'MeasurementUnit')),
+    'width': (aat('300055647', 'width'), aat('300379097', 'millimetres', 'MeasurementUnit')),
+    'depth': (aat('300072633', 'depth'), aat('300379097', 'millimetres', 'MeasurementUnit')),
+    'length': (aat('300055645', 'length'), aat('300379097', 'millimetres', 'MeasurementUnit')),
+    'diameter': (aat('300055624', 'diameter'), aat('300379097', 'millimetres', 'MeasurementUnit')),
+    'weight': (aat('300056240', 'weight'), aat('300379225', 'grams', 'MeasurementUnit')),
+}
+
+def cache():
+    return caches[getattr(settings, 'LINKED_ART_CACHE', None) or 'default']
+
+def cache_key(pk, stamp):
+    return 'linkedart:%d:%s' % (pk, stamp.strftime('%Y%m%d%H%M%S%f'))
+
+def work_id(pk):
+    return '%s/work/%d/jsonld/' % (getattr(settings, 'LINKED_ART_BASE_URL', '').rstrip('/'), pk)
+
+def bound(value, end=False):
+    """
+    Turns an earliest or latest value into an xsd:dateTime, or
+    None.
+    """
+    key = date_key(value, end)
+    if key is None:
+        return None
+    day = key % 100
+    month = key // 100 % 100
+    year = (key - month * 100 - day) // 10000
+    if not 1 <= month <= 12 or day < 1:
+        return None
+    # Not calendar.monthrange, which stops at year 9999.
+    day = min(day, 29 if month == 2 and calendar.isleap(abs(year)) else calendar.mdays[month])
+    time = 'T23:59:59Z' if end else 'T00:00:00Z'
+    return '%s%04d-%02d-%02d%s' % ('-' if year < 0 else '', abs(year), month, day, time)
+
+def gather(pks, using=None):
+    """
+    Returns {pk: document} for the works in pks, in a fixed number
+    of queries.
+    """
+    docs = {}
+    for part in chunks(pks):
+        for work in ObjectRegister.objects.using(using).filter(pk__in=part).select_related('preferred_title', 'production__date'):
+            title = work.preferred_title
+            names = [{'type': 'Name', 'content': title.title, 'classified_as': [PRIMARY_NAME]}]
+            if title.lang_id:
+                names[0]['language'] = [{'type': 'Language', '_label': title.lang_id}]
+            if title.translation:
+                names.append({'type': 'Name', 'content': title.translation, 'classified_as': [TRANSLATED_NAME]})
+            doc = {
+                '@context': CONTEXT,
+                'id': work_id(work.pk),
+                'type': 'HumanMadeObject',
+                '_label': title.title,
+                'classified_as': [{'type': 'Type', '_label': work.get_work_type_display()}],
+                'identified_by': names,
+            }
+            if work.brief_description:
+                doc['referred_to_by'] = [{'type': 'LinguisticObject', 'content': work.brief_description, 'classified_as': [DESCRIPTION, BRIEF_TEXT]}]
+            if work.production_id:
+                production = {'type': 'Production'}
+                date = work.production.date
+                if date.display or date.earliest or date.latest:
+                    timespan = {'type': 'TimeSpan', 'identified_by': [{'type': 'Name', 'content': date.display}]}
+                    for name, value, end in (('begin_of_the_begin', date.earliest, False), ('end_of_the_end', date.latest, True)):
+                        if bound(value, end):
+                            timespan[name] = bound(value, end)
+                    production['timespan'] = timespan
+                doc['produced_by'] = production
+            docs[work.pk] = doc
+
+        for number in AccessionNumber.objects.using(using).filter(work__in=part).select_related('batch'):
+            docs[number.work_id]['identified_by'].append({'type': 'Identifier', 'content': str(number), 'classified_as': [ACCESSION_NUMBER]})
+        for work, name, kind, role in (AgentRole.objects.using(using).filter(work__objectregister__in=part).order_by('pk')
+                                       .values_list('work__objectregister', 'agent__display', 'agent__name_type', 'agent_role')):
+            docs[work]['produced_by'].setdefault('part', []).append({
+                'type': 'Production',
+                'classified_as': [{'type': 'Type', '_label': role}],
+                'carried_out_by': [{'type': 'Person' if kind == 'personal' else 'Group', '_label': name}],
+            })
+        for work, name, lat, lon in (ObjectPlaceType.objects.using(using).filter(work__objectregister__in=part).order_by('pk')
+                                     .values_list('work__objectregister', 'location__location_name', 'location__latitude', 'location__longitude')):
+            place = {'type': 'Place', '_label': name}
+            if lat is not None:
+                place['defined_by'] = 'POINT(%s %s)' % (lon, lat)
+            docs[work]['produced_by'].setdefault('took_place_at', []).append(place)
+        for work, kind, value, part_name in (Dimension.objects.using(using).filter(work__in=part, dimension_deprecated=False).order_by('pk')
+                                             .values_list('work', 'dimension_type', 'dimension_value', 'dimension_part')):
+            if kind not in DIMENSIONS:
+                continue
+            classified, unit = DIMENSIONS[kind]
+            dimension = {'type': 'Dimension', 'value': value, 'unit': unit, 'classified_as': [classified]}
+            if part_name and part_name.strip().lower() not in ('', 'total'):
+                dimension['_label'] = part_name
+            docs[work].setdefault('dimension', []).append(dimension)
+        for work, text, kind, language in (Inscription.objects.using(using).filter(work__in=part).order_by('pk')
+                                           .values_list('work', 'inscription_display', 'inscription_type', 'inscription_language')):
+            inscription = {'type': 'LinguisticObject', 'classified_as': [INSCRIPTION, {'type': 'Type', '_label': kind}]}
+            if text:
+                inscription['content'] = text
+            if language:
+                inscription['language'] = [{'type': 'Language', '_label': language}]
+            docs[work].setdefault('carries', []).append(inscription)
+        for lesser, greater, title in (Hierarchy.objects.using(using).filter(lesser__in=part, relation_type='partOf')
+                                       .order_by('pk').values_list('lesser', 'greater', 'greater__preferred_title__title')):
+            if lesser != greater:
+                docs[lesser].setdefault('part_of', []).append({'id': work_id(greater), 'type': 'HumanMadeObject', '_label': title})
+    return docs
+
+def documents(works, using=None):
+    """
+    Returns {pk: JSON text} for the given (pk, last_modified)
+    pairs, from the cache where possible.
+    """
+    stamps = dict(works)
+    keys = dict((cache_key(pk, stamp), pk) for pk, stamp in stamps.items())
+    result = dict((keys[key], text) for key, text in cache().get_many(list(keys)).items())
+    missing = [pk for pk in stamps if pk not in result]
+    if missing:
+        built = dict((cache_key(pk, stamps[pk]), json.dumps(doc, cls=DjangoJSONEncoder, ensure_ascii=False))
+                     for pk, doc in gather(missing, using).items())
+        cache().set_many(built, getattr(settings, 'LINKED_ART_CACHE_SECONDS', 86400))
+        result.update((keys[key], text) for key, text in built.items())
+    return result
+
+def document(pk):
+    """
+    Returns the JSON text of one work, or None.
+    """
+    work = ObjectRegister.objects.filter(pk=pk).values_list('pk', 'last_modified').first()
+    return documents([work])[pk] if work else None
+
+def dump(page=PAGE, using=None):
+    """
+    Yields one line of NDJSON per work, in work_id order, reading
+    the works a page at a time.
+    """
+    last = 0
+    queryset = ObjectRegister.objects.using(using).order_by('pk').values_list('pk', 'last_modified')
+    while True:
+        works = list(queryset.filter(pk__gt=last)[:page])
+        if not works:
+            return
+        texts = documents(works, using)
+        for pk, stamp in works:
+            yield texts[pk] + '\n'
+        last = works[-1][0]
+# /Linked Art
+###########################################################
@@ -0,0 +1,31 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from objectinfo import export
+
+
+class Command(BaseCommand):
+    help = 'Writes flat tables of works, names, dimensions, inscriptions, locations, accession numbers and dates as CSV or Parquet files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory to write the files to.')
+        parser.add_argument('--format', choices=sorted(export.WRITERS), default='csv',
+                            help='Parquet needs the pyarrow package.')
+        parser.add_argument('--tables', default=','.join(t.name for t in export.TABLES),
+                            help='Comma-separated tables to export (default: all).')
+        parser.add_argument('--chunk', type=int, default=export.CHUNK,
+                            help='Rows read and written at a time.')
+        parser.add_argument('--database', default='default',
+                            help='Database alias to read from, e.g. reporting.')
+
+    def handle(self, *args, **options):
+        if options['format'] == 'parquet' and export.pyarrow is None:
+            raise CommandError('Parquet export needs pyarrow: pip install pyarrow')
+        try:
+            tables = [export.get_table(name.strip()) for name in options['tables'].split(',') if name.strip()]
+        except KeyError as e:
+            raise CommandError('Unknown table %s.' % e)
+        if not os.path.isdir(options['directory']):
+            os.makedirs(options['directory'])
+        for table in tables:
+            count = export.export(table, options['directory'], options['format'], options['chunk'], options['database'])
+            self.stdout.write('%s: %d rows' % (table.name, count))
@@ -0,0 +1,27 @@
+import sys
+from django.core.management.base import BaseCommand
+from objectinfo import linkedart
+
+
+class Command(BaseCommand):
+    help = 'Writes the Linked Art JSON-LD document of every work as NDJSON, one work per line. Unchanged works are read from the cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='File to write to (default: standard output).')
+        parser.add_argument('--page', type=int, default=linkedart.PAGE,
+                            help='Works read at a time.')
+        parser.add_argument('--database', default='default',
+                            help='Database alias to read from, e.g. reporting.')
+
+    def handle(self, *args, **options):
+        out = open(options['path'], 'w', encoding='utf-8') if options['path'] else sys.stdout
+        count = 0
+        try:
+            for line in linkedart.dump(options['page'], options['database']):
+                out.write(line)
+                count += 1
+        finally:
+            if options['path']:
+                out.close()
+        if options['path']:
+            self.stdout.write('%d works' % count)
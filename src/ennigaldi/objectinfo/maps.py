@@ -0,0 +1,74 @@
+from place import spatial
+from place.models import Place
+from .bulk import chunks
+from .models import ObjectPlaceType, MaterialType, TextRef, ObjectRegister
+
+###########################################################
+# Works on a map
+# The places a work is tied to, by kind: where it was produced,
+# where its materials came from, and where the texts citing it
+# were found. Each kind is one query joining the places found
+# by place.spatial to the works, so a map of thousands of works
+# takes a handful of queries.
+
+# kind: (model, lookup of the place, lookup of the work's pk)
+KINDS = {
+    'production': (ObjectPlaceType, 'location', 'work__objectregister'),
+    'material': (MaterialType, 'material__material_source', 'work__work'),
+    'textref': (TextRef, 'textref_location', 'work'),
+}
+LIMIT = 5000
+
+def works_at(places, kinds=None, limit=LIMIT):
+    """
+    Returns [(work pk, place pk, kind)] for the places in the
+    queryset places, at most limit rows per kind.
+    """
+    rows = []
+    for kind in sorted(kinds or KINDS):
+        model, place, work = KINDS[kind]
+        found = (model.objects.using(places.db).filter(**{place + '__in': places.values('pk'), work + '__isnull': False})
+                 .order_by(work, place).values_list(work, place).distinct()[:limit])
+        rows.extend((w, p, kind) for w, p in found)
+    return rows
+
+def features(rows, using=None):
+    """
+    Returns a GeoJSON FeatureCollection with one point per row of
+    works_at.
+    """
+    places = {}
+    for part in chunks(set(p for w, p, kind in rows)):
+        for pk, name, lat, lon in Place.objects.using(using).filter(pk__in=part).values_list('pk', 'location_name', 'latitude', 'longitude'):
+            places[pk] = (name, lat, lon)
+    titles = {}
+    for part in chunks(set(w for w, p, kind in rows)):
+        titles.update(ObjectRegister.objects.using(using).filter(pk__in=part).values_list('pk', 'preferred_title__title'))
+    result = []
+    for work, place, kind in rows:
+        name, lat, lon = places[place]
+        if lat is None:
+            continue
+        result.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+            'properties': {'work': work, 'title': titles.get(work, ''), 'place': place, 'place_name': name, 'kind': kind},
+        })
+    return {'type': 'FeatureCollection', 'features': result}
+
+def works_in_bbox(west, south, east, north, kinds=None, limit=LIMIT, using=None):
+    return works_at(spatial.in_bbox(west, south, east, north, using), kinds, limit)
+
+def works_within(latitude, longitude, km, kinds=None, limit=LIMIT, using=None):
+    """
+    As works_in_bbox, for the places within km of a point,
+    nearest first.
+    """
+    found = spatial.within(latitude, longitude, km, using)
+    order = dict((pk, i) for i, (pk, d) in enumerate(found))
+    rows = []
+    for part in chunks(order):
+        rows.extend(works_at(Place.objects.using(using).filter(pk__in=part), kinds, limit))
+    return sorted(rows, key=lambda r: (order[r[1]], r[0], r[2]))
+# /Works on a map
+###########################################################
@@ -74,6 +74,11 @@ class ObjectRegister(models.Model):
     normal_unit = models.ForeignKey('storageunit.Unit', models.PROTECT, null=True, help_text='Normal storage location. When recording the object, the current storage unit will default to the normal unit set here.')
     data_date = models.DateField(default=timezone.now)
     data_user = models.ForeignKey(User, blank=True, null=True)
+    # Last change to the work or to any row of its record
+    # (names, dimensions, inscriptions, production, locations...),
+    # kept up to date by the receivers in objectinfo.signals.
+    # Used for conditional GET on the detail pages.
+    last_modified = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ["work_id"]
@@ -159,7 +164,7 @@ class ObjectName(models.Model):
     )
     # work = models.ForeignKey('ObjectRegister', models.CASCADE)
     # The name itself:
-    title = models.CharField(max_length=255)
+    title = models.CharField(max_length=255, db_index=True)
     # Spectrum 4.0 Object name currency (i.e., as of when is it current?)
     # No equivalent in other standards
     currency = models.DateField(default=timezone.now, blank=True, help_text='Date as of which the name is or was in use.')
@@ -250,7 +255,7 @@ class AgentRole(models.Model):
     work = models.ForeignKey('Production', models.PROTECT, related_name='agent_of_work')
     # VRA Core 4 agent > role
     # Use controlled vocab
-    agent_role = models.CharField(max_length=31)
+    agent_role = models.CharField(max_length=31, db_index=True)
     # 'False' means the work is securely known, e.g. from a
     # signature, while 'True' means it is attributed.
     attributed = models.BooleanField(default=False)
@@ -261,7 +266,7 @@ class AgentRole(models.Model):
     agent_role_display = models.CharField(max_length=255)
 
     def __str__(self):
-        return agent_role_display
+        return self.agent_role_display
 
 class ObjectPlaceType(PlaceType):
     work = models.ForeignKey('Production', models.PROTECT)
@@ -284,8 +289,8 @@ class TechniqueType(models.Model):
     # Use controlled vocab
     tecnique_type = models.CharField(max_length=255, blank=True)
 
-    def __str__():
-        return technique + ': ' + technique_type
+    def __str__(self):
+        return self.technique + ': ' + self.tecnique_type
 # /Spectrum 4.0 Object production information
 ###########################################################
 
@@ -506,7 +511,7 @@ class Dimension(models.Model):
     # Spectrum 4.0 Dimension measured part
     # VRA Core 4   measurements > extent
     # Use controlled vocab
-    dimension_part = models.CharField(max_length=32, help_text='Describe part measured using controlled vocabulary, or "Total" for the whole object', blank=True, null=True)
+    dimension_part = models.CharField(max_length=32, db_index=True, help_text='Describe part measured using controlled vocabulary, or "Total" for the whole object', blank=True, null=True)
     # VRA Core 4   measurements > type
     # Other standards mix up 'part' and 'type',
     # the latter of which is properly height, length,
@@ -668,7 +673,7 @@ class Colour(models.Model):
     # Use controlled vocab
     colour = models.CharField(max_length=255, unique=True)
     def __str__(self):
-        return colour
+        return self.colour
 
 class SpecimenDateType(DateType):
     dated = models.ForeignKey('Specimen', models.CASCADE, related_name='dated_specimen')
@@ -692,7 +697,7 @@ class Material(models.Model):
     # Common name for apparent material, based on visual
     # inspection. This is the only required field in this class.
     # Use controlled vocab.
-    material_name = models.CharField(max_length=255)
+    material_name = models.CharField(max_length=255, db_index=True)
     # Spectrum 4.0 Material source
     # No equivalent in other standards
     # Geographic origin of material, if known.
@@ -759,6 +764,9 @@ class DescriptionContent(models.Model):
     content_name = models.CharField(max_length=255)
     content_type = models.CharField(max_length=31, choices=content_types)
 
+    def __str__(self):
+        return self.content_name
+
 # The content itself is distinguished from its metadata
 # because a piece of content is a keyword that can occur in
 # several works, but the metadata is how that content is
@@ -990,7 +998,7 @@ class Hierarchy(models.Model):
     relation_type = models.CharField(max_length=31, default='partOf', choices=relation_types)
 
     def __str__(self):
-        return self.lesser.__str__() + ' ' + self.get_relation_type_display + ' ' + self.greater.__str__()
+        return self.lesser.__str__() + ' ' + self.get_relation_type_display() + ' ' + self.greater.__str__()
 
     class Meta:
         unique_together = ('lesser', 'relation_type')
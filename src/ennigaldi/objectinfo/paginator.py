@@ -0,0 +1,48 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+def estimate_rows(model, using='default'):
+    """
+    Returns an estimate of the number of rows in model's table
+    without scanning it, or None if the database keeps none.
+    SQLite only keeps one once ANALYZE has been run; failing
+    that, the largest integer pk is used, which is read off the
+    index and never undercounts.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] > 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0])
+    if model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+        return model._base_manager.using(using).order_by('-pk').values_list('pk', flat=True).first() or 0
+    return None
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator for admin changelists that does not COUNT(*) the
+    whole table. Unfiltered lists of more than `threshold` rows
+    are paginated on an estimate; filtered lists and small tables
+    are counted exactly.
+    """
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query') or queryset.query.where:
+            return super(EstimatedCountPaginator, self).count
+        estimate = estimate_rows(queryset.model, queryset.db)
+        if estimate is None or estimate < self.threshold:
+            return super(EstimatedCountPaginator, self).count
+        return estimate
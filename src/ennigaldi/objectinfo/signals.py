@@ -0,0 +1,134 @@
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+from agent.models import Agent
+from historicdate.models import HistoricDate
+from place.models import Place
+from storageunit.models import Unit
+from .models import *
+
+###########################################################
+# Rows that belong to a work's record.
+# Each model maps to the lookup on ObjectRegister that finds
+# its work(s), followed by the attribute(s) of the row holding
+# the value(s) to look up. A 'pk' lookup means the attribute
+# already is the work_id, so no query is needed to know it.
+WORK_PATHS = {
+    ObjectRegister: ('pk', 'pk'),
+    ObjectName: ('preferred_title', 'pk'),
+    OtherNumber: ('pk', 'work_id'),
+    Production: ('production', 'pk'),
+    AgentRole: ('production', 'work_id'),
+    ObjectPlaceType: ('production', 'work_id'),
+    ObjectUnit: ('pk', 'work_id'),
+    Specimen: ('pk', 'work_id'),
+    Artifact: ('pk', 'work_id'),
+    WorkInstance: ('pk', 'work_id'),
+    SpecimenDateType: ('specimen', 'dated_id'),
+    ArtifactDateType: ('artifact', 'dated_id'),
+    MaterialType: ('artifact', 'work_id'),
+    ContentMeta: ('artifact', 'work_id'),
+    Dimension: ('pk', 'work_id'),
+    Inscription: ('pk', 'work_id'),
+    TechnicalAttribute: ('pk', 'work_id'),
+    Rights: ('pk', 'work_id'),
+    AssociatedObject: ('pk', 'work_id'),
+    Hierarchy: ('pk', 'lesser_id', 'greater_id'),
+    RelatedObject: ('pk', 'work1_id', 'work2_id'),
+    TextRef: ('pk', 'work_id'),
+}
+
+def register_dependent(model, lookup, *attrs):
+    """
+    Adds a model from another application to the record of a
+    work, e.g. reorg.AccessionNumber.
+    """
+    WORK_PATHS[model] = (lookup,) + attrs
+    connect(model)
+
+def work_filter(instance):
+    """
+    Returns a Q selecting the works instance belongs to, or
+    None if the model is not part of a work's record.
+    """
+    path = WORK_PATHS.get(type(instance))
+    if path is None:
+        return None
+    values = [getattr(instance, attr) for attr in path[1:]]
+    values = [value for value in values if value is not None]
+    return Q(**{path[0] + '__in': values})
+
+def work_ids(instance):
+    """
+    Returns the pks of the works instance belongs to.
+    """
+    path = WORK_PATHS.get(type(instance))
+    if path is None:
+        return []
+    if path[0] == 'pk':
+        return [getattr(instance, attr) for attr in path[1:] if getattr(instance, attr) is not None]
+    return list(ObjectRegister.objects.filter(work_filter(instance)).values_list('pk', flat=True))
+
+def touch_works(sender, instance, **kwargs):
+    """
+    Bumps ObjectRegister.last_modified for the works a saved
+    or deleted row belongs to, with a single UPDATE.
+    """
+    if kwargs.get('raw') or sender is ObjectRegister:
+        # ObjectRegister stamps itself through auto_now.
+        return
+    q = work_filter(instance)
+    if q is not None:
+        ObjectRegister.objects.filter(q).update(last_modified=timezone.now())
+
+def touch_unit_works(sender, instance, **kwargs):
+    """
+    Unit paths are printed on the M305 sheet, so renaming a unit
+    changes the sheets of the works kept in it or below it.
+    """
+    if kwargs.get('raw'):
+        return
+    ids = instance.subtree_ids()
+    ObjectRegister.objects.filter(Q(normal_unit__in=ids) | Q(objects_in_location__unit__in=ids)).update(last_modified=timezone.now())
+
+def touch_agent_works(sender, instance, **kwargs):
+    """
+    Exports name the agents of a work's production and the
+    authors of its inscriptions, so renaming an agent changes
+    the exported records of those works.
+    """
+    if kwargs.get('raw'):
+        return
+    ObjectRegister.objects.filter(Q(production__agent_of_work__agent=instance) | Q(inscription__inscription_author=instance)).update(last_modified=timezone.now())
+
+def touch_place_works(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    ObjectRegister.objects.filter(production__location=instance).update(last_modified=timezone.now())
+
+def touch_date_works(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    ObjectRegister.objects.filter(production__date=instance).update(last_modified=timezone.now())
+
+def touch_location_unit(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    Unit.objects.filter(pk=instance.unit_id).update(last_modified=timezone.now())
+
+def connect(model):
+    uid = 'touch_works_%s_%s' % (model._meta.app_label, model._meta.model_name)
+    post_save.connect(touch_works, sender=model, dispatch_uid=uid)
+    post_delete.connect(touch_works, sender=model, dispatch_uid=uid)
+
+for model in list(WORK_PATHS):
+    connect(model)
+
+post_save.connect(touch_unit_works, sender=Unit, dispatch_uid='touch_unit_works')
+post_save.connect(touch_agent_works, sender=Agent, dispatch_uid='touch_agent_works')
+post_save.connect(touch_place_works, sender=Place, dispatch_uid='touch_place_works')
+post_save.connect(touch_date_works, sender=HistoricDate, dispatch_uid='touch_date_works')
+post_save.connect(touch_location_unit, sender=ObjectUnit, dispatch_uid='touch_location_unit')
+post_delete.connect(touch_location_unit, sender=ObjectUnit, dispatch_uid='touch_location_unit')
+# /Rows that belong to a work's record
+###########################################################
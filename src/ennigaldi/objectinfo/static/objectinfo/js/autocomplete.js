@@ -0,0 +1,52 @@
+// Adds a search box before every <select data-autocomplete>
+// and replaces the options of the select with the matches
+// returned by the autocomplete endpoint.
+(function() {
+  'use strict';
+
+  function attach(select) {
+    var input = document.createElement('input');
+    var timer = null;
+    input.type = 'search';
+    input.placeholder = 'Type to search';
+    select.parentNode.insertBefore(input, select);
+
+    input.addEventListener('input', function() {
+      clearTimeout(timer);
+      timer = setTimeout(function() {
+        var q = input.value.trim();
+        if (!q) {
+          return;
+        }
+        var request = new XMLHttpRequest();
+        request.open('GET', select.getAttribute('data-autocomplete') + '?q=' + encodeURIComponent(q));
+        request.onload = function() {
+          if (request.status !== 200) {
+            return;
+          }
+          var results = JSON.parse(request.responseText).results;
+          var current = select.value;
+          while (select.options.length > 1) {
+            select.remove(1);
+          }
+          results.forEach(function(result) {
+            var option = new Option(result.text, result.id);
+            option.selected = String(result.id) === current;
+            select.add(option);
+          });
+          if (results.length && !select.value) {
+            select.selectedIndex = 1;
+          }
+        };
+        request.send();
+      }, 250);
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function() {
+    var selects = document.querySelectorAll('select[data-autocomplete]');
+    for (var i = 0; i < selects.length; i++) {
+      attach(selects[i]);
+    }
+  });
+})();
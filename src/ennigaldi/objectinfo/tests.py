@@ -1,9 +1,28 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.urls import resolve
+from ennigaldi.routers import ReportingRouter, ReportingMiddleware
 from django.core.files.uploadedfile import SimpleUploadedFile
-from .models import ObjectRegister, ObjectName, ObjectUnit, Hierarchy, Production, Dimension, AgentRole, TechniqueType, ObjectPlaceType, IsoLanguage
+from . import linkedart
+from .bulk import bulk_update, bulk_update_pks
+from .export import export, get_table
+from .forms import BulkEditForm
+from .models import ObjectRegister, ObjectName, ObjectUnit, Hierarchy, Production, Dimension, AgentRole, TechniqueType, ObjectPlaceType, IsoLanguage, Artifact, ArtifactDateType
+from .paginator import EstimatedCountPaginator
+from .vocabulary import vocabulary
 from storageunit.models import Unit
 from historicdate.models import HistoricDate, DateType
 from agent.models import Agent, AgentDateType, AgentAffiliation
+from changefeed.models import Change
+from history.models import Delta
+from place.models import Place
 # from django.urls import resolve
 # from objectinfo.views import index
 
@@ -100,3 +119,388 @@ class TestObjectRegister(TestCase):
         dim2.save()
         measurements = o2.measurements()
         self.assertEqual(measurements['height'].dimension_value, 770)
+
+
+@override_settings(REPORTING_DATABASE='reporting')
+class TestReportingRouter(TestCase):
+    def route(self, method, path, cookies=None):
+        """
+        Returns the alias chosen for a read made by the view.
+        """
+        router = ReportingRouter()
+        chosen = []
+        def view(request):
+            chosen.append(router.db_for_read(ObjectRegister))
+            return HttpResponse('ok')
+        def handler(request):
+            # As the request handler does, inside the middleware call.
+            middleware.process_view(request, view, (), {})
+            return view(request)
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(path)
+        middleware = ReportingMiddleware(handler)
+        response = middleware(request)
+        return chosen[0], response
+
+    def test_read_views_use_reporting(self):
+        """
+        Check that read-only pages go to the reporting alias and
+        entry forms stay on the primary.
+        """
+        self.assertEqual(self.route('get', '/work/sicg/1/')[0], 'reporting')
+        self.assertEqual(self.route('get', '/work/add/')[0], None)
+
+    def test_read_your_writes(self):
+        """
+        Check that a save makes the curator's next reads stick
+        to the primary.
+        """
+        alias, response = self.route('post', '/work/add/')
+        self.assertTrue(ReportingMiddleware.cookie in response.cookies)
+        alias, response = self.route('get', '/work/sicg/1/', {ReportingMiddleware.cookie: '1'})
+        self.assertEqual(alias, None)
+
+class TestConditionalGet(TestCase):
+    def setUp(self):
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        t1 = ObjectName.objects.create(title="Ex-voto", lang=ptbr)
+        self.work = ObjectRegister.objects.create(preferred_title=t1, source="Field survey")
+
+    def test_dependent_rows_bump_stamp(self):
+        """
+        Check that saving a dimension or the title changes the
+        work's last_modified stamp.
+        """
+        first = ObjectRegister.objects.get(pk=self.work.pk).last_modified
+        Dimension.objects.create(work=self.work, dimension_type='height', dimension_value=120)
+        second = ObjectRegister.objects.get(pk=self.work.pk).last_modified
+        self.assertTrue(second > first)
+        title = self.work.preferred_title
+        title.title = "Ex-voto in wax"
+        title.save()
+        self.assertTrue(ObjectRegister.objects.get(pk=self.work.pk).last_modified > second)
+
+    def test_not_modified(self):
+        """
+        Check that an unchanged M305 sheet is answered with 304
+        and a changed one is rendered again.
+        """
+        url = '/work/%d/' % self.work.pk
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Dimension.objects.create(work=self.work, dimension_type='width', dimension_value=80)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+class TestBulkEdit(TestCase):
+    def setUp(self):
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        self.works = []
+        for i in range(3):
+            title = ObjectName.objects.create(title="Ex-voto %d" % i, lang=ptbr)
+            self.works.append(ObjectRegister.objects.create(preferred_title=title, source="Field survey"))
+        self.works[0].source = "Inventory"
+        self.works[0].save()
+
+    def test_single_update(self):
+        """
+        Check that a bulk edit changes every row with one UPDATE
+        and records a feed entry and a delta per changed row only.
+        """
+        seq = Change.objects.order_by('-seq').values_list('seq', flat=True).first()
+        stamp = ObjectRegister.objects.get(pk=self.works[0].pk).last_modified
+        with CaptureQueriesContext(connection) as queries:
+            count = bulk_update(ObjectRegister.objects.filter(pk__in=[w.pk for w in self.works]), {'source': 'Inventory'})
+        self.assertEqual(count, 2)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "objectinfo_objectregister"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(ObjectRegister.objects.filter(source='Inventory').count(), 3)
+        # The work already right is not re-stamped.
+        self.assertEqual(ObjectRegister.objects.get(pk=self.works[0].pk).last_modified, stamp)
+        changes = Change.objects.filter(seq__gt=seq, action='update')
+        self.assertEqual(sorted(int(c.object_pk) for c in changes), [self.works[1].pk, self.works[2].pk])
+        deltas = Delta.objects.filter(revision__comment='Bulk edit')
+        self.assertEqual(deltas.count(), 2)
+        self.assertEqual(deltas.first().get_changes(), {'source': ['Field survey', 'Inventory']})
+
+    def test_large_selection(self):
+        """
+        Check that a selection over SQLite's parameter limit is
+        edited in chunks and only matching rows are counted.
+        """
+        pks = [w.pk for w in self.works] + list(range(self.works[-1].pk + 1, self.works[-1].pk + 2000))
+        self.assertEqual(bulk_update_pks(ObjectRegister, pks, {'source': 'Inventory'}), (3, 2))
+
+    def test_dimensions_and_endpoint(self):
+        """
+        Check that the endpoint deprecates dimensions, stamps their
+        works and refuses fields outside the bulk list.
+        """
+        dims = [Dimension.objects.create(work=w, dimension_type='height', dimension_value=10) for w in self.works[:2]]
+        before = ObjectRegister.objects.get(pk=self.works[0].pk).last_modified
+        User.objects.create_superuser('editor', 'editor@example.com', 'pw')
+        self.client.login(username='editor', password='pw')
+        # An id that matches nothing is not counted.
+        body = {'model': 'dimension', 'ids': [d.pk for d in dims] + [dims[-1].pk + 100], 'changes': {'dimension_deprecated': True}}
+        response = self.client.post('/work/bulk/', json.dumps(body), content_type='application/json')
+        self.assertEqual(json.loads(response.content.decode('utf-8')), {'matched': 2, 'updated': 2})
+        self.assertEqual(Dimension.objects.filter(dimension_deprecated=True).count(), 2)
+        self.assertTrue(ObjectRegister.objects.get(pk=self.works[0].pk).last_modified > before)
+        body['changes'] = {'dimension_value': 3}
+        response = self.client.post('/work/bulk/', json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+class TestAutocomplete(TestCase):
+    def setUp(self):
+        User.objects.create_user('editor', 'editor@example.com', 'pw')
+        self.client.login(username='editor', password='pw')
+        room = Unit.objects.create(acronym='R1', name='Reserve')
+        for i in range(30):
+            Unit.objects.create(parent=room, acronym='S%02d' % i, name='Shelf')
+        IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+
+    def results(self, source, q, **params):
+        params['q'] = q
+        response = self.client.get('/work/autocomplete/%s/' % source, params)
+        return json.loads(response.content.decode('utf-8'))['results']
+
+    def test_prefix_search(self):
+        """
+        Check that units are matched by prefix in any case, capped
+        to the limit and labelled with their full path.
+        """
+        results = self.results('unit', 's0')
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[0]['text'], 'R1 Reserve › S00 Shelf')
+        self.assertEqual(len(self.results('unit', 'shelf')), 20)
+        self.assertEqual(self.results('unit', ''), [])
+        self.assertEqual(len(self.results('unit', 's0', limit=-1)), 1)
+
+    def test_vocabulary_invalidated(self):
+        """
+        Check that the cached language list is re-read after a
+        language is added.
+        """
+        self.assertEqual([r['id'] for r in self.results('language', 'port')], ['pt_BR'])
+        IsoLanguage.objects.create(iso="pt_PT", language="Portuguese (Portugal)")
+        self.assertEqual([r['id'] for r in self.results('language', 'port')], ['pt_BR', 'pt_PT'])
+
+    def test_widget_renders_selected_only(self):
+        """
+        Check that the unit select of the entry form only holds
+        the empty and the selected options.
+        """
+        unit = Unit.objects.get(acronym='S05')
+        html = str(BulkEditForm(initial={'normal_unit': unit.pk})['normal_unit'])
+        self.assertEqual(html.count('<option'), 2)
+        self.assertIn('data-autocomplete="/work/autocomplete/unit/"', html)
+
+class TestAdminChangelists(TestCase):
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.login(username='admin', password='pw')
+        self.ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        self.agent = Agent.objects.create(name="Jane Doe", display="Jane Doe")
+        self.room = Unit.objects.create(acronym='R1', name='Reserve')
+        self.shelf = Unit.objects.create(parent=Unit.objects.create(parent=self.room, acronym='F1', name='Cabinet'), acronym='A', name='Shelf')
+        self.count = 0
+
+    def add_rows(self, n):
+        for i in range(n):
+            self.count += 1
+            title = ObjectName.objects.create(title="Object %d" % self.count, lang=self.ptbr)
+            date = HistoricDate.objects.create(display="1890s")
+            production = Production.objects.create(date=date)
+            work = ObjectRegister.objects.create(preferred_title=title, production=production)
+            artifact = Artifact.objects.create(work=work)
+            Dimension.objects.create(work=work, dimension_type='height', dimension_value=10)
+            ObjectUnit.objects.create(work=work, unit=self.shelf)
+            AgentRole.objects.create(agent=self.agent, work=production, agent_role='maker', agent_role_display='Made by')
+            Hierarchy.objects.create(lesser=work, greater=work, relation_type='partOf')
+            ArtifactDateType.objects.create(dated=artifact, datation=date, date_type='creation')
+
+    def queries(self, model):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/admin/objectinfo/%s/' % model)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_query_counts_do_not_grow(self):
+        """
+        Check that the changelists run as many queries for ten
+        rows as for one.
+        """
+        models = ['dimension', 'objectunit', 'agentrole', 'hierarchy', 'artifactdatetype']
+        self.add_rows(1)
+        one = dict((m, self.queries(m)) for m in models)
+        self.add_rows(9)
+        ten = dict((m, self.queries(m)) for m in models)
+        self.assertEqual(one, ten)
+
+    def test_unit_paths(self):
+        """
+        Check that locations are listed with their full path.
+        """
+        self.add_rows(1)
+        response = self.client.get('/admin/objectinfo/objectunit/')
+        self.assertContains(response, 'R1 Reserve › F1 Cabinet › A Shelf')
+
+    def test_estimated_count(self):
+        """
+        Check that large unfiltered lists are paginated on the
+        largest pk and filtered ones on an exact count.
+        """
+        self.add_rows(3)
+        Dimension.objects.filter(pk__lt=Dimension.objects.order_by('-pk')[0].pk).delete()
+        paginator = EstimatedCountPaginator(Dimension.objects.order_by('pk'), 25)
+        paginator.threshold = 1
+        self.assertEqual(paginator.count, Dimension.objects.order_by('-pk')[0].pk)
+        paginator = EstimatedCountPaginator(Dimension.objects.filter(dimension_type='height'), 25)
+        paginator.threshold = 1
+        self.assertEqual(paginator.count, 1)
+
+class TestVocabulary(TestCase):
+    def setUp(self):
+        IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        IsoLanguage.objects.create(iso="en", language="English")
+
+    def test_lookups_without_queries(self):
+        """
+        Check that a loaded vocabulary serves pk and label lookups
+        without querying, and reloads after a write.
+        """
+        languages = vocabulary(IsoLanguage)
+        languages.fresh()
+        with self.assertNumQueries(0):
+            self.assertEqual(languages.label('en'), 'English')
+            self.assertEqual(languages.lookup('portuguese (brazil)'), 'pt_BR')
+            self.assertEqual(languages.get('xx'), None)
+        IsoLanguage.objects.filter(iso='en').update(language='Inglês')
+        self.assertEqual(languages.label('en'), 'English')
+        IsoLanguage.objects.get(iso='en').save()
+        self.assertEqual(languages.label('en'), 'Inglês')
+
+    def test_shared_version(self):
+        """
+        Check that a write recorded in the shared cache by another
+        process is picked up once the check interval has passed.
+        """
+        languages = vocabulary(IsoLanguage)
+        cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=cache, VOCABULARY_CACHE='default', VOCABULARY_CHECK_SECONDS=0):
+            from django.core.cache import caches
+            languages.fresh()
+            IsoLanguage.objects.filter(iso='en').update(language='Inglês')
+            caches['default'].set(languages.key, languages.version + 1)
+            self.assertEqual(languages.label('en'), 'Inglês')
+
+class TestColumnarExport(TestCase):
+    def setUp(self):
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        for i in range(3):
+            title = ObjectName.objects.create(title="Ex-voto %d" % i, lang=ptbr)
+            date = HistoricDate.objects.create(display="1890s", earliest="1890", latest="1899")
+            work = ObjectRegister.objects.create(preferred_title=title, production=Production.objects.create(date=date))
+            Dimension.objects.create(work=work, dimension_type='height', dimension_value=10 + i)
+
+    def read(self, table, chunk):
+        directory = tempfile.mkdtemp()
+        count = export(get_table(table), directory, chunk=chunk)
+        with open(os.path.join(directory, '%s.csv' % table), encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(count, len(rows))
+        return rows
+
+    def test_chunks(self):
+        """
+        Check that every row is exported once whatever the chunk
+        size, with vocabulary labels and numeric date keys.
+        """
+        rows = self.read('dimensions', 2)
+        self.assertEqual([r['value'] for r in rows], ['10', '11', '12'])
+        self.assertEqual(rows[0]['deprecated'], 'false')
+        names = self.read('names', 1)
+        self.assertEqual(len(names), 3)
+        self.assertEqual(names[0]['language'], 'Portuguese (Brazil)')
+        dates = self.read('production_dates', 1000)
+        self.assertEqual((dates[0]['earliest_key'], dates[0]['latest_key']), ('18900101', '18991231'))
+        self.assertEqual(dates[0]['work_id'], str(ObjectRegister.objects.order_by('pk')[0].pk))
+
+class TestWorkMap(TestCase):
+    def setUp(self):
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        self.rio = Place.objects.create(location_name="Rio de Janeiro", latitude=-22.9068, longitude=-43.1729)
+        self.lisbon = Place.objects.create(location_name="Lisboa", latitude=38.7223, longitude=-9.1393)
+        self.works = []
+        for place in (self.rio, self.lisbon):
+            production = Production.objects.create(date=HistoricDate.objects.create(display="1800s"))
+            work = ObjectRegister.objects.create(preferred_title=ObjectName.objects.create(title="Made in %s" % place.location_name, lang=ptbr), production=production)
+            ObjectPlaceType.objects.create(location=place, work=production)
+            self.works.append(work)
+
+    def test_bbox(self):
+        """
+        Check that the map endpoint returns the works produced in
+        the box as GeoJSON points.
+        """
+        response = self.client.get('/work/map/', {'bbox': '-45,-24,-41,-21'})
+        features = response.json()['features']
+        self.assertEqual([f['properties']['work'] for f in features], [self.works[0].pk])
+        self.assertEqual(features[0]['geometry']['coordinates'], [-43.1729, -22.9068])
+        self.assertEqual(features[0]['properties']['kind'], 'production')
+
+    def test_radius(self):
+        """
+        Check radius queries and parameter errors.
+        """
+        response = self.client.get('/work/map/', {'lat': 38.7, 'lon': -9.1, 'km': 20, 'kind': 'production'})
+        self.assertEqual([f['properties']['work'] for f in response.json()['features']], [self.works[1].pk])
+        self.assertEqual(self.client.get('/work/map/', {'bbox': 'nowhere'}).status_code, 400)
+
+class TestLinkedArt(TestCase):
+    def setUp(self):
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        self.agent = Agent.objects.create(name="Candido Portinari", name_type="personal", display="Candido Portinari")
+        production = Production.objects.create(date=HistoricDate.objects.create(display="1944", earliest="1944", latest="1944"))
+        AgentRole.objects.create(agent=self.agent, work=production, agent_role="painter")
+        ObjectPlaceType.objects.create(location=Place.objects.create(location_name="Brodowski", latitude=-20.98, longitude=-47.66), work=production)
+        self.set = ObjectRegister.objects.create(preferred_title=ObjectName.objects.create(title="Retirantes series", lang=ptbr))
+        self.work = ObjectRegister.objects.create(preferred_title=ObjectName.objects.create(title="Retirantes", lang=ptbr), production=production)
+        Dimension.objects.create(work=self.work, dimension_type="height", dimension_value=1800, dimension_part="Total")
+        Hierarchy.objects.create(lesser=self.work, greater=self.set)
+
+    def test_document(self):
+        """
+        Check the JSON-LD of a work: names, production, dimensions
+        and hierarchy.
+        """
+        response = self.client.get('/work/%d/jsonld/' % self.work.pk)
+        self.assertEqual(response['Content-Type'], 'application/ld+json; charset=utf-8')
+        doc = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(doc['type'], 'HumanMadeObject')
+        self.assertEqual(doc['identified_by'][0]['content'], 'Retirantes')
+        production = doc['produced_by']
+        self.assertEqual(production['timespan']['begin_of_the_begin'], '1944-01-01T00:00:00Z')
+        self.assertEqual(production['timespan']['end_of_the_end'], '1944-12-31T23:59:59Z')
+        self.assertEqual(production['part'][0]['carried_out_by'][0]['_label'], 'Candido Portinari')
+        self.assertEqual(production['took_place_at'][0]['_label'], 'Brodowski')
+        self.assertEqual(doc['dimension'][0]['value'], 1800)
+        self.assertEqual(doc['part_of'][0]['id'], '/work/%d/jsonld/' % self.set.pk)
+        self.assertEqual(self.client.get('/work/999999/jsonld/').status_code, 404)
+
+    def test_cache_and_dump(self):
+        """
+        Check that the dump reuses cached documents, and that editing
+        an agent invalidates the documents of its works.
+        """
+        lines = list(linkedart.dump())
+        self.assertEqual([json.loads(line)['_label'] for line in lines], ['Retirantes series', 'Retirantes'])
+        # One query for the page of stamps and one for the empty page after it.
+        with self.assertNumQueries(2):
+            self.assertEqual(list(linkedart.dump()), lines)
+        self.agent.display = "Portinari, Candido"
+        self.agent.save()
+        doc = json.loads(linkedart.document(self.work.pk))
+        self.assertEqual(doc['produced_by']['part'][0]['carried_out_by'][0]['_label'], 'Portinari, Candido')
+        response = self.client.get('/work/jsonld/')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
@@ -15,6 +15,11 @@ urlpatterns = [
     url(r'^sicg/(?P<pk>[0-9]+)/', views.ObjectDetail.as_view(template_name="objectinfo/sicg_m305.html"), name='sicg_m305'),
     url(r'^xml/(?P<pk>[0-9]+)/', views.xml, name='vra_core_xml'),
     url(r'^yaml/(?P<pk>[0-9]+)/', views.yaml, name='yaml'),
+    url(r'^autocomplete/(?P<source>[a-z]+)/$', views.autocomplete, name='autocomplete'),
+    url(r'^bulk/$', views.bulk_edit, name='bulk_edit'),
+    url(r'^map/$', views.work_map, name='work_map'),
+    url(r'^(?P<pk>[0-9]+)/jsonld/$', views.linked_art, name='linked_art'),
+    url(r'^jsonld/$', views.linked_art_dump, name='linked_art_dump'),
     url(r'^', views.ObjectList.as_view(), name='object_list'),
 ]
 
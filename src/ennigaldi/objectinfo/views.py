@@ -2,18 +2,28 @@ from django import forms
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.http import HttpResponse, HttpResponseRedirect
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, render_to_response, get_object_or_404
 from django.urls import reverse_lazy, reverse
 from django.utils.decorators import method_decorator
 from django.views import View
+from django.views.decorators.http import condition, require_POST
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.views.generic.list import ListView
+from ennigaldi.writes import serialized
+from history.revisions import revision
+from jobs.queue import enqueue
+from jobs.views import queued
 from reorg.models import AccessionNumber
+from . import autocomplete as sources
+from . import linkedart, maps
+from .bulk import BULK_MODELS, bulk_update_pks
 from .models import ObjectRegister
 from .forms import *
 from PIL import Image
+import json
 
 def index(request):
     return HttpResponse('Nothing here yet.')
@@ -23,6 +33,21 @@ class ObjectList(ListView):
     paginate_by = 25
     queryset = ObjectRegister.objects.all() # default
 
+# The detail and M305 pages only change when the work's
+# last_modified stamp does, so both are served with an ETag and
+# Last-Modified from that single column, and unchanged pages
+# are answered with 304 before any of the detail queries run.
+def work_modified(request, pk, **kwargs):
+    if not hasattr(request, '_work_modified'):
+        request._work_modified = ObjectRegister.objects.filter(pk=pk).values_list('last_modified', flat=True).first()
+    return request._work_modified
+
+def work_etag(request, pk, **kwargs):
+    modified = work_modified(request, pk)
+    if modified:
+        return 'w%s-%d' % (pk, int(modified.timestamp() * 1000000))
+
+@method_decorator(condition(etag_func=work_etag, last_modified_func=work_modified), name='dispatch')
 class ObjectDetail(DetailView):
     model = ObjectRegister
     # query_pk_and_slug = True
@@ -33,8 +58,7 @@ class ObjectDetail(DetailView):
 @method_decorator(login_required, name='dispatch')
 class TitleEntry(CreateView):
     model = ObjectName
-    form = TitleForm
-    fields = ['title', 'title_type', 'lang', 'translation', 'currency', 'level', 'note', 'source']
+    form_class = TitleForm
 
     def get_success_url(self, **kwargs):
         return reverse('createregister_form', kwargs={ 'objectname_id' : self.object.pk})
@@ -44,8 +68,7 @@ class TitleEntry(CreateView):
 @method_decorator(login_required, name='dispatch')
 class CreateRegister(CreateView):
     model = ObjectRegister
-    form = ObjectEntry
-    fields = ['preferred_title', 'snapshot', 'work_type', 'source', 'brief_description', 'description_source', 'comments', 'distinguishing_features', 'normal_unit']
+    form_class = ObjectEntry
 
     def dispatch(self, request, *args, **kwargs):
         self.pref_title_id = kwargs.get('objectname_id', None)
@@ -71,12 +94,23 @@ class CreateRegister(CreateView):
         return data
 
     def form_valid(self, form):
+        self.save_register(form)
+        return super(CreateRegister, self).form_valid(form)
+
+    # Object creation and numbering go through the write queue,
+    # which may run this again if the database was locked. The
+    # formsets are therefore rebuilt from the POST data and the
+    # work_id cleared on every attempt.
+    # All rows saved here are recorded as a single revision.
+    @serialized
+    def save_register(self, form):
         context = self.get_context_data()
         dimension = context['dimensions']
         inscription = context['inscriptions']
         other_number = context['other_numbers']
 
-        with transaction.atomic():
+        with revision(user=self.request.user, comment='Registered'):
+            form.instance.work_id = None
             self.object = form.save(commit=False)
             self.object.data_user = self.request.user
             self.object.save()
@@ -95,8 +129,6 @@ class CreateRegister(CreateView):
                 other_number.instance = self.object
                 other_number.save()
 
-        return super(CreateRegister, self).form_valid(form)
-
     def get_success_url(self):
         return reverse('object_list')
         # In a field survey it does not make sense to fill out
@@ -180,3 +212,82 @@ def xml(request):
 
 def yaml(request):
     return HttpResponse('For a human-readable rendering in YAML of w_%s.' % work_id)
+
+@login_required
+@require_POST
+def bulk_edit(request):
+    """
+    Applies one set of changes to many works or dimensions. The
+    request body is JSON: {"model": "objectregister" or
+    "dimension", "ids": [...], "changes": {field: value}}. With
+    "background": true the edit is queued as a bulk_edit job and
+    the answer is the job's status.
+    """
+    try:
+        body = json.loads(request.body.decode('utf-8'))
+        model = BULK_MODELS[body['model']]
+        ids = [int(pk) for pk in body['ids']]
+        changes = dict(body['changes'])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected model, ids and changes.'}, status=400)
+    if not request.user.has_perm('objectinfo.change_%s' % model._meta.model_name):
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+    if body.get('background'):
+        return queued(enqueue('bulk_edit', {'model': body['model'], 'ids': ids, 'changes': changes}, user=request.user))
+    try:
+        matched, count = bulk_update_pks(model, ids, changes, user=request.user)
+    except ValidationError as e:
+        return JsonResponse({'error': e.messages}, status=400)
+    return JsonResponse({'matched': matched, 'updated': count})
+
+@login_required
+def autocomplete(request, source):
+    """
+    Returns {"results": [{"id": pk, "text": label}]} for the rows
+    of source (title, unit, agent, place, material or language) starting with
+    the 'q' parameter.
+    """
+    if source not in sources.SOURCES:
+        raise Http404('No autocomplete source %s.' % source)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', sources.LIMIT)), sources.LIMIT))
+    except ValueError:
+        limit = sources.LIMIT
+    results = sources.search(source, request.GET.get('q', ''), limit)
+    return JsonResponse({'results': [{'id': pk, 'text': label} for pk, label in results]})
+
+def work_map(request):
+    """
+    Returns a GeoJSON FeatureCollection of the works tied to the
+    places in ?bbox=west,south,east,north, or within ?km of
+    ?lat=&lon=, optionally only for some ?kind= (production,
+    material, textref).
+    """
+    kinds = [k for k in request.GET.getlist('kind') if k in maps.KINDS] or None
+    try:
+        if 'bbox' in request.GET:
+            west, south, east, north = [float(v) for v in request.GET['bbox'].split(',')]
+            rows = maps.works_in_bbox(west, south, east, north, kinds)
+        else:
+            rows = maps.works_within(float(request.GET['lat']), float(request.GET['lon']), float(request.GET.get('km', 10)), kinds)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Give bbox=west,south,east,north, or lat, lon and km.'}, status=400)
+    return JsonResponse(maps.features(rows))
+
+def linked_art(request, pk):
+    """
+    Returns the Linked Art JSON-LD document of a work.
+    """
+    text = linkedart.document(int(pk))
+    if text is None:
+        raise Http404('No work %s.' % pk)
+    return HttpResponse(text, content_type='application/ld+json; charset=utf-8')
+
+def linked_art_dump(request):
+    """
+    Streams the Linked Art documents of every work, one per line
+    (NDJSON).
+    """
+    response = StreamingHttpResponse(linkedart.dump(), content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="works.ndjson"'
+    return response
@@ -0,0 +1,124 @@
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal
+from .models import IsoLanguage, Colour, TechniqueType, Material, DescriptionContent
+
+###########################################################
+# Controlled vocabularies
+# Languages, colours, techniques, materials and content terms
+# are short lists that hardly ever change, yet forms and exports
+# used to query them once per field or per row. Each is loaded
+# here once per process, as {pk: row}, and served by pk or by
+# label from memory.
+#
+# A write to one of the tables bumps its version. Within one
+# process this happens through the model signals. With several
+# processes, set VOCABULARY_CACHE to the alias of a shared cache
+# backend (e.g. memcached): the version is then also kept there,
+# and each process re-checks it at most every
+# VOCABULARY_CHECK_SECONDS.
+
+# Sent after a vocabulary has been invalidated, with the model
+# as sender, for code that keeps anything derived from it.
+vocabulary_changed = Signal(providing_args=['version'])
+
+def shared_cache():
+    alias = getattr(settings, 'VOCABULARY_CACHE', None)
+    return caches[alias] if alias else None
+
+class Vocabulary(object):
+    def __init__(self, model):
+        self.model = model
+        self.key = 'vocabulary:%s.%s' % (model._meta.app_label, model._meta.model_name)
+        self.version = 0
+        self.loaded = None
+        self.checked = 0
+        self.lock = threading.Lock()
+        self.rows = {}
+        # str(pk) -> pk, since form values arrive as strings
+        self.keys = {}
+        # lower-case label -> pk
+        self.pks = {}
+
+    def shared_version(self):
+        cache = shared_cache()
+        if cache is None:
+            return self.version
+        return cache.get(self.key, 0)
+
+    def fresh(self):
+        """
+        Returns the rows, reloading them first if the table was
+        written to since they were read.
+        """
+        now = time.time()
+        if self.loaded is not None and now - self.checked < getattr(settings, 'VOCABULARY_CHECK_SECONDS', 5):
+            if self.loaded == self.version:
+                return self.rows
+        with self.lock:
+            version = max(self.version, self.shared_version())
+            self.checked = now
+            if self.loaded != version:
+                rows = dict((obj.pk, obj) for obj in self.model._default_manager.all())
+                self.keys = dict((str(pk), pk) for pk in rows)
+                self.pks = dict((str(obj).lower(), pk) for pk, obj in rows.items())
+                self.rows = rows
+                self.version = self.loaded = version
+        return self.rows
+
+    def invalidate(self):
+        self.version += 1
+        cache = shared_cache()
+        if cache is not None:
+            cache.add(self.key, 0, None)
+            try:
+                self.version = max(self.version, cache.incr(self.key))
+            except ValueError:
+                pass
+        vocabulary_changed.send(sender=self.model, version=self.version)
+
+    def get(self, pk):
+        rows = self.fresh()
+        return rows.get(self.keys.get(str(pk)))
+
+    def label(self, pk):
+        obj = self.get(pk)
+        return str(obj) if obj is not None else ''
+
+    def lookup(self, label):
+        """
+        Returns the pk of the row whose label is label, ignoring
+        case, or None.
+        """
+        self.fresh()
+        return self.pks.get(label.lower())
+
+    def choices(self):
+        return sorted(((pk, str(obj)) for pk, obj in self.fresh().items()), key=lambda item: item[1])
+
+_registry = {}
+
+def register(model):
+    vocab = _registry[model] = Vocabulary(model)
+    uid = 'vocabulary_%s' % model._meta.model_name
+    post_save.connect(invalidate, sender=model, dispatch_uid=uid)
+    post_delete.connect(invalidate, sender=model, dispatch_uid=uid)
+    return vocab
+
+def invalidate(sender, **kwargs):
+    _registry[sender].invalidate()
+
+def vocabulary(model):
+    """
+    Returns the Vocabulary of model, or None if model is not a
+    registered vocabulary.
+    """
+    return _registry.get(model)
+
+for model in (IsoLanguage, Colour, TechniqueType, Material, DescriptionContent):
+    register(model)
+# /Controlled vocabularies
+###########################################################
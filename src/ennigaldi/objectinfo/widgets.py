@@ -0,0 +1,40 @@
+from django import forms
+from django.urls import reverse
+from .vocabulary import vocabulary
+
+class Autocomplete(forms.Select):
+    """
+    A select that only renders the empty option and the selected
+    one, instead of every row of the related table. Other options
+    are fetched by objectinfo/js/autocomplete.js from the
+    autocomplete endpoint of the given source.
+    """
+    def __init__(self, source, attrs=None):
+        super(Autocomplete, self).__init__(attrs)
+        self.source = source
+
+    class Media:
+        js = ('objectinfo/js/autocomplete.js',)
+
+    def get_context(self, name, value, attrs):
+        context = super(Autocomplete, self).get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete'] = reverse('autocomplete', kwargs={'source': self.source})
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        choices = self.choices
+        selected = [v for v in value if v not in ('', None)]
+        options = []
+        if getattr(choices, 'field', None) is not None:
+            if choices.field.empty_label is not None:
+                options.append(('', choices.field.empty_label))
+            vocab = vocabulary(choices.queryset.model)
+            if selected and vocab is not None:
+                options.extend((pk, vocab.label(pk)) for pk in selected if vocab.get(pk) is not None)
+            elif selected:
+                options.extend(choices.choice(obj) for obj in choices.queryset.filter(pk__in=selected))
+        self.choices = options
+        try:
+            return super(Autocomplete, self).optgroups(name, value, attrs)
+        finally:
+            self.choices = choices
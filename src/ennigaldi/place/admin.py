@@ -1,4 +1,15 @@
 from django.contrib import admin
-from .models import Place
+from .models import Place, PlaceName
 
-admin.site.register(Place)
+class PlaceNameInline(admin.TabularInline):
+    model = PlaceName
+    fields = ('name',)
+    extra = 0
+
+class PlaceAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'country_code', 'latitude', 'longitude', 'geonames_id')
+    list_filter = ('location_name_type',)
+    search_fields = ('location_name', '=name_key', '=geonames_id')
+    inlines = [PlaceNameInline]
+
+admin.site.register(Place, PlaceAdmin)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PlaceConfig(AppConfig):
     name = 'place'
+
+    def ready(self):
+        from . import spatial
+        spatial.connect(self)
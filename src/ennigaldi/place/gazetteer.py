@@ -0,0 +1,232 @@
+import io
+import zipfile
+from django.db.models import Q
+from ennigaldi.text import fold, trigrams, similarity
+from ennigaldi.writes import serialized
+from objectinfo.bulk import chunks
+from . import spatial
+from .models import Place, PlaceName
+
+###########################################################
+# GeoNames loader
+# Reads a GeoNames dump (allCountries.txt, or a country file such
+# as BR.txt, plain or zipped) line by line and inserts its places
+# in batches, so that places can be picked from a gazetteer
+# instead of typed in again for every work. Entries already
+# loaded, found by geonames_id, are updated in place, so a newer
+# dump can be loaded over an older one.
+BATCH = 2000
+
+# Feature classes loaded by default: administrative areas and
+# populated places.
+CLASSES = ('A', 'P')
+FEATURE_CLASSES = {
+    'A': 'administrative area',
+    'H': 'water body',
+    'L': 'area',
+    'P': 'populated place',
+    'R': 'road',
+    'S': 'spot',
+    'T': 'relief',
+    'U': 'undersea',
+    'V': 'vegetation',
+}
+
+def lines(path):
+    """
+    Yields the text lines of a dump, or of every .txt file in a
+    zipped dump.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                if name.endswith('.txt') and not name.startswith('readme'):
+                    with archive.open(name) as raw:
+                        for line in io.TextIOWrapper(raw, encoding='utf-8'):
+                            yield line
+    else:
+        with open(path, encoding='utf-8') as dump:
+            for line in dump:
+                yield line
+
+def entries(path, classes=CLASSES, countries=None, min_population=0):
+    """
+    Yields (geonames id, name, alternate names, latitude,
+    longitude, feature class, country code, population) for the
+    entries of a dump matching the filters.
+    """
+    for line in lines(path):
+        columns = line.rstrip('\n').split('\t')
+        if len(columns) < 15:
+            continue
+        if classes and columns[6] not in classes:
+            continue
+        if countries and columns[8] not in countries:
+            continue
+        population = int(columns[14] or 0)
+        if population < min_population:
+            continue
+        alternates = [n for n in columns[3].split(',') if n and n != columns[1]]
+        yield (int(columns[0]), columns[1], alternates, float(columns[4]), float(columns[5]), columns[6], columns[8], population)
+
+def place_fields(entry):
+    geonames_id, name, alternates, latitude, longitude, kind, country, population = entry
+    return {
+        'location_name': name[:63],
+        'location_name_type': 'geographic',
+        'location_extent': ('%s, %s' % (FEATURE_CLASSES.get(kind, 'place'), country))[:63],
+        'country': country,
+        'country_code': country,
+        'name_key': fold(name)[:63],
+        'latitude': latitude,
+        'longitude': longitude,
+        'west': longitude,
+        'east': longitude,
+        'south': latitude,
+        'north': latitude,
+        'geonames_id': geonames_id,
+        'population': population,
+    }
+
+def alternate_names(place_id, entry):
+    seen = set()
+    names = []
+    for name in entry[2]:
+        key = fold(name)[:255]
+        if key and key not in seen:
+            seen.add(key)
+            names.append(PlaceName(place_id=place_id, name=name[:255], name_key=key))
+    return names
+
+@serialized
+def load_batch(batch):
+    """
+    Inserts or updates one batch of entries. Returns (created,
+    updated).
+    """
+    existing = {}
+    for part in chunks(entry[0] for entry in batch):
+        existing.update(Place.objects.filter(geonames_id__in=part).values_list('geonames_id', 'pk'))
+    new = [entry for entry in batch if entry[0] not in existing]
+    Place.objects.bulk_create([Place(**place_fields(entry)) for entry in new])
+    # bulk_create does not return pks on every database.
+    for part in chunks(entry[0] for entry in new):
+        existing.update(Place.objects.filter(geonames_id__in=part).values_list('geonames_id', 'pk'))
+    new_ids = set(entry[0] for entry in new)
+    for entry in batch:
+        if entry[0] not in new_ids:
+            fields = place_fields(entry)
+            del fields['geonames_id']
+            Place.objects.filter(pk=existing[entry[0]]).update(**fields)
+    for part in chunks(existing.values()):
+        PlaceName.objects.filter(place__in=part).delete()
+    PlaceName.objects.bulk_create([name for entry in batch for name in alternate_names(existing[entry[0]], entry)])
+    return len(new), len(batch) - len(new)
+
+def load(path, classes=CLASSES, countries=None, min_population=0, batch=BATCH):
+    """
+    Loads a GeoNames dump. Returns (created, updated).
+    """
+    created = updated = 0
+    pending = []
+    for entry in entries(path, classes, countries, min_population):
+        pending.append(entry)
+        if len(pending) >= batch:
+            c, u = load_batch(pending)
+            created, updated, pending = created + c, updated + u, []
+    if pending:
+        c, u = load_batch(pending)
+        created, updated = created + c, updated + u
+    # bulk_create skips the signals that keep the R-tree.
+    spatial.create_index()
+    return created, updated
+# /GeoNames loader
+###########################################################
+
+
+###########################################################
+# Resolving names to places
+# Imports and forms look a name up here before creating a Place.
+# Matches are tried from the cheapest up: the folded name or an
+# alternate name equal to it, then names starting with it, both
+# through the name_key indexes; only if neither finds anything
+# are names sharing the first letters compared by trigram
+# similarity. Among equally good matches, hand-entered places
+# (already in use) come first, then the most populous. Prefix and
+# fuzzy matches are only suggestions, e.g. for autocomplete:
+# "Rio" starts "Rio de Janeiro" and "Santa Marta" is close to
+# "Santa Maria", so Resolver only reuses exact ones.
+LIMIT = 10
+FUZZY_PREFIX = 3
+FUZZY_SCAN = 2000
+FUZZY_THRESHOLD = 0.5
+
+def starts_with(field, key):
+    # An index range rather than LIKE, which SQLite only runs
+    # through an index on case-insensitive columns.
+    return Q(**{field + '__gte': key, field + '__lt': key + '\uffff'})
+
+def best(places, limit):
+    hand = list(places.filter(geonames_id__isnull=True).order_by('pk')[:limit])
+    return hand + list(places.filter(geonames_id__isnull=False).order_by('-population', 'pk')[:limit - len(hand)])
+
+def matches(name, country='', limit=LIMIT, fuzzy=True):
+    """
+    Returns [(place, score, how)] for name, best first, where how
+    is 'exact', 'prefix' or 'fuzzy'.
+    """
+    key = fold(name)
+    if not key:
+        return []
+    places = Place.objects.all()
+    if country:
+        places = places.filter(country_code=country.upper())
+    exact = places.filter(Q(name_key=key[:63]) | Q(pk__in=PlaceName.objects.filter(name_key=key).values('place')))
+    found = [(p, 1.0, 'exact') for p in best(exact, limit)]
+    if found:
+        return found
+    prefix = places.filter(starts_with('name_key', key) | Q(pk__in=PlaceName.objects.filter(starts_with('name_key', key)).values('place')))
+    found = [(p, min(1.0, len(key) / float(len(p.name_key) or 1)), 'prefix') for p in best(prefix, limit)]
+    if found or not fuzzy or len(key) < FUZZY_PREFIX:
+        return found
+    grams = trigrams(key)
+    scored = []
+    for p in places.filter(starts_with('name_key', key[:FUZZY_PREFIX]))[:FUZZY_SCAN]:
+        score = similarity(grams, trigrams(p.name_key))
+        if score >= FUZZY_THRESHOLD:
+            scored.append((p, score, 'fuzzy'))
+    scored.sort(key=lambda m: (-m[1], m[0].geonames_id is not None, -m[0].population, m[0].pk))
+    return scored[:limit]
+
+class Resolver(object):
+    """
+    Resolves names to places, remembering each answer, for
+    imports that meet the same few names over and over.
+    """
+    def __init__(self):
+        self.known = {}
+
+    def resolve(self, name, country=''):
+        """
+        Returns the best existing Place named name, or with name
+        as an alternate name, or None.
+        """
+        key = (fold(name), country.upper())
+        if key not in self.known:
+            found = matches(name, country, 1, fuzzy=False)
+            self.known[key] = found[0][0] if found and found[0][2] == 'exact' else None
+        return self.known[key]
+
+    def get_or_create(self, name, country='', **fields):
+        """
+        Returns (place, created), reusing the best existing Place
+        of that name if there is one.
+        """
+        place = self.resolve(name, country)
+        if place is not None:
+            return place, False
+        place = Place.objects.create(location_name=name[:63], country_code=country, **fields)
+        self.known[(fold(name), country.upper())] = place
+        return place, True
+# /Resolving names to places
+###########################################################
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from place.gazetteer import BATCH, CLASSES, load
+
+
+class Command(BaseCommand):
+    help = 'Loads or updates places from a GeoNames dump (e.g. BR.txt or allCountries.zip).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='GeoNames dump, plain or zipped.')
+        parser.add_argument('--classes', default=','.join(CLASSES),
+                            help='Comma-separated feature classes to load (default %s).' % ','.join(CLASSES))
+        parser.add_argument('--countries', default='', help='Comma-separated country codes to load (default all).')
+        parser.add_argument('--min-population', type=int, default=0, help='Skip places with fewer inhabitants.')
+        parser.add_argument('--batch', type=int, default=BATCH, help='Places written per transaction.')
+
+    def handle(self, *args, **options):
+        classes = [c.strip().upper() for c in options['classes'].split(',') if c.strip()]
+        countries = [c.strip().upper() for c in options['countries'].split(',') if c.strip()] or None
+        try:
+            created, updated = load(options['path'], classes, countries, options['min_population'], options['batch'])
+        except (IOError, OSError) as error:
+            raise CommandError(str(error))
+        self.stderr.write('%d places created, %d updated.' % (created, updated))
@@ -1,4 +1,7 @@
+import json
+from django.core.exceptions import ValidationError
 from django.db import models
+from ennigaldi.text import fold
 
 ###########################################################
 # General location information for use in several models
@@ -37,11 +40,98 @@ class Place(models.Model):
     state_province = models.CharField(max_length=35, blank=True)
     zip_code = models.CharField(max_length=35, blank=True)
     country = models.CharField(max_length=35, blank=True)
+    # WGS 84 decimal degrees. For places with an extent, the
+    # centre of their geometry, unless given.
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # Optional GeoJSON geometry, e.g. the outline of a site.
+    geometry = models.TextField(blank=True, help_text='GeoJSON geometry, for places with an extent.')
+    # Bounding box of the geometry or point, set on save and
+    # indexed by place.spatial.
+    west = models.FloatField(null=True, editable=False)
+    south = models.FloatField(null=True, editable=False)
+    east = models.FloatField(null=True, editable=False)
+    north = models.FloatField(null=True, editable=False)
+    # ISO 3166-1 alpha-2 code, e.g. 'BR'.
+    country_code = models.CharField(max_length=2, blank=True)
+    # Folded location_name, set on save; see place.gazetteer.
+    name_key = models.CharField(max_length=63, blank=True, editable=False)
+    # Places loaded from a GeoNames dump keep its id and
+    # population, used to rank places with the same name.
+    geonames_id = models.PositiveIntegerField(null=True, blank=True, unique=True)
+    population = models.BigIntegerField(default=0)
+
+    class Meta:
+        index_together = (('south', 'north'), ('west', 'east'), ('name_key', 'country_code'))
+
+    def clean(self):
+        if self.geometry:
+            try:
+                geometry_bounds(self.geometry)
+            except (ValueError, TypeError, KeyError):
+                raise ValidationError({'geometry': 'Enter a GeoJSON geometry.'})
+        if (self.latitude is None) != (self.longitude is None):
+            raise ValidationError('Enter both latitude and longitude, or neither.')
+
+    def save(self, *args, **kwargs):
+        self.name_key = fold(self.location_name)[:63]
+        self.country_code = self.country_code.upper()
+        bounds = geometry_bounds(self.geometry) if self.geometry else None
+        if bounds:
+            self.west, self.south, self.east, self.north = bounds
+            if self.latitude is None:
+                self.longitude = (self.west + self.east) / 2
+                self.latitude = (self.south + self.north) / 2
+        elif self.latitude is not None and self.longitude is not None:
+            self.west = self.east = self.longitude
+            self.south = self.north = self.latitude
+        else:
+            self.west = self.south = self.east = self.north = None
+        super(Place, self).save(*args, **kwargs)
 
     def __str__(self):
         comp = self.location_extent if self.location_extent else self.city
         return self.location_name + ' (' + comp + ')'
 
+# Other names of a place, e.g. the alternate names of a
+# gazetteer entry, so that any of them finds the place.
+class PlaceName(models.Model):
+    place = models.ForeignKey(Place, models.CASCADE, related_name='names')
+    name = models.CharField(max_length=255)
+    name_key = models.CharField(max_length=255, db_index=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.name_key = fold(self.name)[:255]
+        super(PlaceName, self).save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+def geometry_bounds(geometry):
+    """
+    Returns (west, south, east, north) of a GeoJSON geometry,
+    given as a string or dict, or None if it has no coordinates.
+    """
+    if not isinstance(geometry, dict):
+        geometry = json.loads(geometry)
+    if geometry['type'] == 'GeometryCollection':
+        parts = [geometry_bounds(g) for g in geometry['geometries']]
+        parts = [p for p in parts if p]
+        if not parts:
+            return None
+        return (min(p[0] for p in parts), min(p[1] for p in parts), max(p[2] for p in parts), max(p[3] for p in parts))
+    points = []
+    def walk(coordinates):
+        if coordinates and isinstance(coordinates[0], (int, float)):
+            points.append((float(coordinates[0]), float(coordinates[1])))
+        else:
+            for c in coordinates:
+                walk(c)
+    walk(geometry['coordinates'])
+    if not points:
+        return None
+    return (min(p[0] for p in points), min(p[1] for p in points), max(p[0] for p in points), max(p[1] for p in points))
+
 class PlaceType(models.Model):
     location_types = (
         ('creation', 'Creation'),
@@ -0,0 +1,135 @@
+import math
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save, post_delete, post_migrate
+from .models import Place
+
+###########################################################
+# Spatial index
+# Until places move to PostGIS, their bounding boxes are kept in
+# an SQLite R-tree virtual table, which answers "which boxes
+# overlap this one" in logarithmic time. It is created after
+# migrate and kept in step by the Place signals. On databases
+# without the R-tree module, or other than SQLite, queries fall
+# back to the B-tree indexes on the bounding box columns.
+RTREE = 'place_rtree'
+EARTH_RADIUS = 6371.0088
+
+_available = {}
+
+def has_index(using=DEFAULT_DB_ALIAS):
+    if using not in _available:
+        connection = connections[using]
+        found = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [RTREE])
+                found = cursor.fetchone() is not None
+        _available[using] = found
+    return _available[using]
+
+def create_index(using=DEFAULT_DB_ALIAS):
+    """
+    Creates the R-tree if the database supports it and fills it
+    from the places. Returns whether the index is in use.
+    """
+    connection = connections[using]
+    _available.pop(using, None)
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE IF NOT EXISTS %s USING rtree(id, west, east, south, north)' % RTREE)
+        except OperationalError:
+            # SQLite built without the R-tree module.
+            return False
+        cursor.execute('DELETE FROM %s' % RTREE)
+        cursor.execute('INSERT INTO %s SELECT id, west, east, south, north FROM %s WHERE west IS NOT NULL' % (RTREE, Place._meta.db_table))
+    return has_index(using)
+
+def index_place(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    if not has_index(using):
+        return
+    with connections[using].cursor() as cursor:
+        if instance.west is None:
+            cursor.execute('DELETE FROM %s WHERE id = %%s' % RTREE, [instance.pk])
+        else:
+            cursor.execute('INSERT OR REPLACE INTO %s VALUES (%%s, %%s, %%s, %%s, %%s)' % RTREE,
+                           [instance.pk, instance.west, instance.east, instance.south, instance.north])
+
+def unindex_place(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    if has_index(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute('DELETE FROM %s WHERE id = %%s' % RTREE, [instance.pk])
+
+def create_after_migrate(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    create_index(using)
+
+def connect(app_config):
+    post_save.connect(index_place, sender=Place, dispatch_uid='place_rtree')
+    post_delete.connect(unindex_place, sender=Place, dispatch_uid='place_rtree')
+    post_migrate.connect(create_after_migrate, sender=app_config, dispatch_uid='place_rtree')
+# /Spatial index
+###########################################################
+
+
+###########################################################
+# Spatial queries
+class RawSubquery(RawSQL):
+    # The IN lookup puts its own parentheses around RawSQL's, and
+    # SQLite reads "IN ((SELECT ...))" as a scalar subquery,
+    # keeping only its first row.
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+def in_bbox(west, south, east, north, using=None):
+    """
+    Returns the places whose extent overlaps the box, in decimal
+    degrees. A box with west > east crosses the antimeridian.
+    """
+    if west > east:
+        return in_bbox(west, south, 180.0, north, using) | in_bbox(-180.0, south, east, north, using)
+    alias = using or DEFAULT_DB_ALIAS
+    places = Place.objects.using(using).filter(west__lte=east, east__gte=west, south__lte=north, north__gte=south)
+    if has_index(alias):
+        # The R-tree stores 32-bit floats rounded outwards, so it
+        # narrows the search and the filter above makes it exact.
+        matches = RawSubquery('SELECT id FROM %s WHERE west <= %%s AND east >= %%s AND south <= %%s AND north >= %%s' % RTREE,
+                              [east, west, north, south])
+        places = places.filter(pk__in=matches)
+    return places
+
+def distance(lat1, lon1, lat2, lon2):
+    """
+    Returns the great-circle distance in km between two points.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+def radius_bbox(latitude, longitude, km):
+    dlat = math.degrees(km / EARTH_RADIUS)
+    south, north = max(-90.0, latitude - dlat), min(90.0, latitude + dlat)
+    if south <= -90.0 or north >= 90.0:
+        return -180.0, south, 180.0, north
+    dlon = math.degrees(km / (EARTH_RADIUS * math.cos(math.radians(latitude))))
+    if dlon >= 180.0:
+        return -180.0, south, 180.0, north
+    west = (longitude - dlon + 540.0) % 360.0 - 180.0
+    east = (longitude + dlon + 540.0) % 360.0 - 180.0
+    return west, south, east, north
+
+def within(latitude, longitude, km, using=None):
+    """
+    Returns [(place pk, distance in km)] of the places whose point
+    lies within km of the given one, nearest first.
+    """
+    places = in_bbox(*radius_bbox(latitude, longitude, km), using=using)
+    found = []
+    for pk, lat, lon in places.filter(latitude__isnull=False).values_list('pk', 'latitude', 'longitude'):
+        d = distance(latitude, longitude, lat, lon)
+        if d <= km:
+            found.append((pk, d))
+    return sorted(found, key=lambda f: (f[1], f[0]))
+# /Spatial queries
+###########################################################
@@ -1,5 +1,9 @@
+import os
+import tempfile
 from django.test import TestCase
+from .gazetteer import load, matches, Resolver
 from .models import Place
+from .spatial import in_bbox, within
 
 class PlaceTest(TestCase):
     def setUp(self):
@@ -13,3 +17,90 @@ class PlaceTest(TestCase):
         self.assertEqual(u.city, "Amaurot")
         self.assertEqual(r.__str__(), "Rome (Ancient city of Rome)")
         self.assertEqual(u.__str__(), "Utopia National Museum (Amaurot)")
+
+class SpatialTest(TestCase):
+    def setUp(self):
+        self.rio = Place.objects.create(location_name="Rio de Janeiro", latitude=-22.9068, longitude=-43.1729)
+        self.sao_paulo = Place.objects.create(location_name="São Paulo", latitude=-23.5505, longitude=-46.6333)
+        self.site = Place.objects.create(location_name="Sítio Itacoatiara", geometry='{"type": "Polygon", "coordinates": [[[-43.05, -22.98], [-43.03, -22.98], [-43.03, -22.96], [-43.05, -22.96], [-43.05, -22.98]]]}')
+        self.fiji = Place.objects.create(location_name="Taveuni", latitude=-16.85, longitude=179.95)
+        self.unknown = Place.objects.create(location_name="Somewhere")
+
+    def test_bounds(self):
+        """
+        Check that geometries give their bounding box and centre.
+        """
+        self.assertEqual((self.site.west, self.site.south, self.site.east, self.site.north), (-43.05, -22.98, -43.03, -22.96))
+        self.assertAlmostEqual(self.site.latitude, -22.97)
+        self.assertIsNone(self.unknown.west)
+
+    def test_bbox(self):
+        """
+        Check box queries, including one across the antimeridian,
+        and that moving a place updates the index.
+        """
+        rio_state = in_bbox(-45, -24, -41, -21)
+        self.assertEqual(set(rio_state), set([self.rio, self.site]))
+        self.assertEqual(list(in_bbox(179, -18, -179, -16)), [self.fiji])
+        self.rio.latitude, self.rio.longitude = -30.03, -51.23
+        self.rio.save()
+        self.assertEqual(list(in_bbox(-45, -24, -41, -21)), [self.site])
+
+    def test_within(self):
+        """
+        Check that radius queries measure great-circle distances.
+        """
+        found = within(-22.9068, -43.1729, 50)
+        self.assertEqual([pk for pk, d in found], [self.rio.pk, self.site.pk])
+        self.assertLess(found[1][1], 20)
+        self.assertEqual(len(within(-22.9068, -43.1729, 400)), 3)
+
+class GazetteerTest(TestCase):
+    dump = '\n'.join('\t'.join(columns) for columns in [
+        ['3451190', 'Rio de Janeiro', 'Rio de Janeiro', 'Rio,Rio de Janeiro,São Sebastião do Rio de Janeiro', '-22.90278', '-43.2075', 'P', 'PPLA', 'BR', '', '21', '', '', '', '6023699', '', '2', 'America/Sao_Paulo', '2020-01-01'],
+        ['3448439', 'São Paulo', 'Sao Paulo', 'Sampa', '-23.5475', '-46.63611', 'P', 'PPLA', 'BR', '', '27', '', '', '', '10021295', '', '760', 'America/Sao_Paulo', '2020-01-01'],
+        ['3448433', 'São Paulo', 'Sao Paulo', '', '-22.0', '-49.0', 'A', 'ADM1', 'BR', '', '27', '', '', '', '41262199', '', '', 'America/Sao_Paulo', '2020-01-01'],
+        ['3469034', 'Pico da Neblina', 'Pico da Neblina', '', '0.8', '-66.0', 'T', 'PK', 'BR', '', '04', '', '', '', '0', '2994', '', 'America/Manaus', '2020-01-01'],
+        ['2267057', 'Lisboa', 'Lisboa', 'Lisbon,Lisbonne', '38.71667', '-9.13333', 'P', 'PPLC', 'PT', '', '14', '', '', '', '517802', '', '', 'Europe/Lisbon', '2020-01-01'],
+    ]) + '\n'
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(handle, 'w', encoding='utf-8') as f:
+            f.write(self.dump)
+        self.addCleanup(os.remove, self.path)
+
+    def test_load(self):
+        """
+        Check that populated places and areas are loaded once,
+        reloading only updates them, and the R-tree sees them.
+        """
+        self.assertEqual(load(self.path, batch=2), (4, 0))
+        self.assertEqual(load(self.path, countries=['BR']), (0, 3))
+        self.assertEqual(Place.objects.count(), 4)
+        rio = Place.objects.get(geonames_id=3451190)
+        self.assertEqual((rio.name_key, rio.country_code), ('rio de janeiro', 'BR'))
+        self.assertEqual(str(rio), 'Rio de Janeiro (populated place, BR)')
+        self.assertEqual(list(in_bbox(-44, -24, -42, -22)), [rio])
+
+    def test_resolve(self):
+        """
+        Check exact, alternate-name, prefix and fuzzy matches, and
+        that hand-entered places are reused first.
+        """
+        load(self.path)
+        self.assertEqual([(p.geonames_id, how) for p, score, how in matches('SAO PAULO')], [(3448433, 'exact'), (3448439, 'exact')])
+        self.assertEqual(matches('Lisbon')[0][0].geonames_id, 2267057)
+        self.assertEqual(matches('lisbon', country='BR'), [])
+        self.assertEqual([(p.geonames_id, how) for p, score, how in matches('Rio de Jan')], [(3451190, 'prefix')])
+        self.assertEqual([(p.geonames_id, how) for p, score, how in matches('Rio de Janiero')], [(3451190, 'fuzzy')])
+        resolver = Resolver()
+        own = Place.objects.create(location_name="Lisboa", city="Lisboa", country_code="pt")
+        self.assertEqual(resolver.get_or_create('Lisboa', 'PT'), (own, False))
+        place, created = resolver.get_or_create('Aldeia Nova', 'PT')
+        self.assertTrue(created)
+        self.assertEqual(resolver.resolve('aldeia nova', 'pt'), place)
+        # Prefix and fuzzy matches are not taken for the same place.
+        self.assertEqual(resolver.resolve('Rio de Jan', 'BR'), None)
+        self.assertTrue(resolver.get_or_create('Rio de Janiero', 'BR')[1])
+        self.assertEqual(resolver.resolve('Lisbon', 'PT').geonames_id, 2267057)
@@ -0,0 +1,82 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from django.core.management.base import BaseCommand
+from ennigaldi.backends.sqlite3.base import DEFAULT_PRAGMAS, apply_pragmas
+from ennigaldi.writes import WriteQueue, is_lock_error
+
+# Each transaction mimics AccessionNumber.generate: read the last
+# number, then insert the next one. Under the default rollback
+# journal two such transactions deadlock on the read-to-write
+# upgrade and one of them fails with "database is locked".
+SCHEMA = 'CREATE TABLE bench (id INTEGER PRIMARY KEY, object_number INTEGER UNIQUE, payload TEXT)'
+
+def numbering_transaction(conn):
+    conn.execute('BEGIN')
+    try:
+        last = conn.execute('SELECT COALESCE(MAX(object_number), 0) FROM bench').fetchone()[0]
+        conn.execute('INSERT INTO bench (object_number, payload) VALUES (?, ?)', (last + 1, 'x' * 256))
+        conn.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+
+def run(path, tuned, writers, transactions, timeout):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute(SCHEMA)
+    conn.close()
+
+    queue = WriteQueue(lock_path=path + '.lock') if tuned else None
+    counts = {'committed': 0, 'locked': 0, 'failed': 0}
+    counts_lock = threading.Lock()
+
+    def writer():
+        conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        if tuned:
+            apply_pragmas(conn, DEFAULT_PRAGMAS)
+        for i in range(transactions):
+            try:
+                if tuned:
+                    queue.run(numbering_transaction, conn)
+                else:
+                    numbering_transaction(conn)
+                outcome = 'committed'
+            except Exception as e:
+                outcome = 'locked' if is_lock_error(e) else 'failed'
+            with counts_lock:
+                counts[outcome] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=writer) for i in range(writers)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counts['seconds'] = time.time() - start
+    return counts
+
+
+class Command(BaseCommand):
+    help = 'Compares concurrent SQLite writers with the default settings and with the production profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent writer threads.')
+        parser.add_argument('--transactions', type=int, default=200, help='Transactions per writer.')
+        parser.add_argument('--timeout', type=float, default=5.0, help='SQLite busy timeout in seconds.')
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='benchwrites')
+        try:
+            self.stdout.write('%-10s %10s %8s %8s %9s %12s' % ('profile', 'committed', 'locked', 'failed', 'seconds', 'commits/s'))
+            for label, tuned in (('default', False), ('tuned', True)):
+                counts = run(os.path.join(workdir, label + '.db'), tuned, options['writers'], options['transactions'], options['timeout'])
+                self.stdout.write('%-10s %10d %8d %8d %9.2f %12.1f' % (
+                    label, counts['committed'], counts['locked'], counts['failed'],
+                    counts['seconds'], counts['committed'] / max(counts['seconds'], 1e-6)))
+        finally:
+            shutil.rmtree(workdir)
@@ -0,0 +1,96 @@
+import json
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SORT_KEYS = ('queries', 'sql_ms', 'render_ms', 'total_ms', 'duplicates')
+
+def read_records(lines):
+    """
+    Yields the profiler records found in a log, ignoring
+    whatever prefix the log formatter puts before the JSON.
+    """
+    for line in lines:
+        start = line.find('{')
+        if start < 0:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and 'view' in record and 'queries' in record:
+            yield record
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = int(round(fraction * (len(values) - 1)))
+    return values[index]
+
+def aggregate(records):
+    views = defaultdict(lambda: defaultdict(list))
+    fingerprints = {}
+    for record in records:
+        view = views[record['view']]
+        view['queries'].append(record['queries'])
+        view['sql_ms'].append(record['sql_ms'])
+        view['render_ms'].append(record['render_ms'])
+        view['total_ms'].append(record['total_ms'])
+        view['duplicates'].append(sum(d['count'] - 1 for d in record['duplicates']))
+        for dup in record['duplicates']:
+            entry = fingerprints.setdefault(dup['fingerprint'], {'sql': dup['sql'], 'views': set(), 'extra': 0})
+            entry['views'].add(record['view'])
+            entry['extra'] += dup['count'] - 1
+
+    summary = []
+    for name, series in views.items():
+        row = {'view': name, 'hits': len(series['queries'])}
+        for key in SORT_KEYS:
+            row[key] = sum(series[key]) / float(len(series[key]))
+        row['p95_queries'] = percentile(series['queries'], 0.95)
+        row['max_queries'] = max(series['queries'])
+        summary.append(row)
+    return summary, fingerprints
+
+
+class Command(BaseCommand):
+    help = 'Aggregates QueryProfileMiddleware logs into a report of the slowest views.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('logfile', nargs='*', help='Log files to read; defaults to PROFILER_LOG.')
+        parser.add_argument('--top', type=int, default=10, help='Number of views and fingerprints to list.')
+        parser.add_argument('--sort', choices=SORT_KEYS, default='queries', help='Average to rank views by.')
+
+    def handle(self, *args, **options):
+        paths = options['logfile'] or [getattr(settings, 'PROFILER_LOG', None)]
+        if not all(paths):
+            raise CommandError('No log file given and PROFILER_LOG is not set.')
+
+        records = []
+        for path in paths:
+            try:
+                with open(path, encoding='utf-8') as log:
+                    records.extend(read_records(log))
+            except IOError as e:
+                raise CommandError('Cannot read %s: %s' % (path, e))
+        if not records:
+            self.stdout.write('No profiler records found.')
+            return
+
+        top = options['top']
+        summary, fingerprints = aggregate(records)
+        summary.sort(key=lambda row: row[options['sort']], reverse=True)
+
+        self.stdout.write('%d requests, %d views. Averages per request, sorted by %s:' % (len(records), len(summary), options['sort']))
+        self.stdout.write('%-28s %6s %8s %8s %8s %10s %10s %10s' % ('view', 'hits', 'queries', 'p95', 'dupes', 'sql ms', 'render ms', 'total ms'))
+        for row in summary[:top]:
+            self.stdout.write('%-28s %6d %8.1f %8d %8.1f %10.1f %10.1f %10.1f' % (
+                row['view'][:28], row['hits'], row['queries'], row['p95_queries'],
+                row['duplicates'], row['sql_ms'], row['render_ms'], row['total_ms']))
+
+        if fingerprints:
+            self.stdout.write('')
+            self.stdout.write('Most repeated query shapes (extra executions across all requests):')
+            ranked = sorted(fingerprints.items(), key=lambda item: item[1]['extra'], reverse=True)
+            for key, entry in ranked[:top]:
+                self.stdout.write('%8d  %s  [%s]' % (entry['extra'], key, ', '.join(sorted(entry['views']))))
+                self.stdout.write('          %s' % entry['sql'][:200])
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('profiler')
+
+# Literals are stripped from the SQL so that the same query
+# issued for different rows (the typical N+1 pattern, e.g. one
+# Dimension lookup per type in ObjectRegister.measurements())
+# collapses into a single fingerprint.
+_strings = re.compile(r"'(?:[^']|'')*'")
+_numbers = re.compile(r'\b\d+(?:\.\d+)?\b')
+_in_lists = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_spaces = re.compile(r'\s+')
+
+def fingerprint(sql):
+    """
+    Reduces a SQL statement to its shape, without literals.
+    """
+    sql = _strings.sub('?', sql)
+    sql = _numbers.sub('?', sql)
+    sql = _in_lists.sub('(...)', sql)
+    return _spaces.sub(' ', sql).strip()
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return request.path
+    return match.url_name or match.view_name or request.path
+
+
+# Opt-in per-request SQL instrumentation. Enable it by setting
+# PROFILER_ENABLED = True; otherwise Django drops the middleware
+# at startup and it costs nothing. Each profiled request is
+# logged as one JSON line on the 'profiler' logger, which the
+# `sqlreport` management command aggregates.
+class QueryProfileMiddleware(object):
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILER_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.views = getattr(settings, 'PROFILER_VIEWS', None)
+
+    def __call__(self, request):
+        state = []
+        for connection in connections.all():
+            state.append((connection, connection.force_debug_cursor, len(connection.queries_log)))
+            connection.force_debug_cursor = True
+        request._profiler_render = [None, 0.0]
+        start = time.time()
+        try:
+            response = self.get_response(request)
+        finally:
+            total = time.time() - start
+            queries = []
+            for connection, forced, offset in state:
+                connection.force_debug_cursor = forced
+                queries.extend(list(connection.queries_log)[offset:])
+
+        name = view_name(request)
+        if self.views is None or name in self.views:
+            logger.info(json.dumps(self.record(request, response, name, queries, total)))
+        return response
+
+    def process_template_response(self, request, response):
+        # TemplateResponse objects are rendered by the handler after
+        # this hook, so the render time is taken from here up to the
+        # post-render callback.
+        timer = request._profiler_render
+        timer[0] = time.time()
+
+        def rendered(response):
+            timer[1] = time.time() - timer[0]
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def record(self, request, response, name, queries, total):
+        shapes = Counter()
+        samples = {}
+        sql_time = 0.0
+        for query in queries:
+            sql_time += float(query.get('time') or 0)
+            shape = fingerprint(query['sql'])
+            key = hashlib.md5(shape.encode('utf-8')).hexdigest()[:12]
+            shapes[key] += 1
+            samples.setdefault(key, shape)
+        duplicates = [
+            {'fingerprint': key, 'count': count, 'sql': samples[key][:500]}
+            for key, count in shapes.most_common() if count > 1
+        ]
+        return {
+            'view': name,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': len(queries),
+            'sql_ms': round(sql_time * 1000, 2),
+            'render_ms': round(request._profiler_render[1] * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'duplicates': duplicates,
+        }
@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.db import OperationalError
+from ennigaldi.writes import WriteQueue
+from .management.commands.benchwrites import run as run_benchmark
+from .middleware import QueryProfileMiddleware, fingerprint
+
+class TestQueryProfile(TestCase):
+    def setUp(self):
+        User.objects.create(username='curator')
+        User.objects.create(username='registrar')
+
+    def test_fingerprint(self):
+        """
+        Check that queries differing only in literals share
+        a fingerprint.
+        """
+        a = fingerprint("SELECT * FROM unit WHERE id = 1 AND name = 'A'")
+        b = fingerprint("SELECT * FROM unit WHERE id = 22 AND name = 'B'")
+        c = fingerprint("SELECT * FROM unit WHERE id IN (1, 2, 3)")
+        self.assertEqual(a, b)
+        self.assertTrue(c.endswith('IN (...)'))
+
+    @override_settings(PROFILER_ENABLED=True, PROFILER_VIEWS=None)
+    def test_middleware_records_duplicates(self):
+        """
+        Check that a view issuing the same query per row is
+        logged with its query count and duplicate fingerprint.
+        """
+        def view(request):
+            for user in User.objects.all():
+                User.objects.filter(pk=user.pk).exists()
+            return HttpResponse('ok')
+
+        middleware = QueryProfileMiddleware(view)
+        request = RequestFactory().get('/unit/all/')
+        with self.assertLogs('profiler', level='INFO') as logs:
+            middleware(request)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['queries'], 3)
+        self.assertEqual(record['duplicates'][0]['count'], 2)
+
+    def test_report(self):
+        """
+        Check that the report ranks views from a log file.
+        """
+        lines = [
+            '2017-05-01 10:00:00 ' + json.dumps({'view': 'sicg_m305', 'queries': 40, 'sql_ms': 12.0, 'render_ms': 30.0, 'total_ms': 50.0, 'duplicates': [{'fingerprint': 'abc', 'count': 9, 'sql': 'SELECT ?'}]}),
+            '2017-05-01 10:00:01 ' + json.dumps({'view': 'object_list', 'queries': 5, 'sql_ms': 2.0, 'render_ms': 8.0, 'total_ms': 12.0, 'duplicates': []}),
+        ]
+        handle, path = tempfile.mkstemp()
+        with os.fdopen(handle, 'w') as log:
+            log.write('\n'.join(lines))
+        out = StringIO()
+        call_command('sqlreport', path, stdout=out)
+        os.remove(path)
+        report = out.getvalue()
+        self.assertTrue(report.index('sicg_m305') < report.index('object_list'))
+        self.assertTrue('abc' in report)
+
+
+class TestWriteQueue(TestCase):
+    def test_retry_on_lock(self):
+        """
+        Check that a locked write is retried and then succeeds.
+        """
+        attempts = []
+        def write():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise OperationalError('database is locked')
+            return 'saved'
+        queue = WriteQueue(backoff=0.001)
+        self.assertEqual(queue.run(write), 'saved')
+        self.assertEqual(len(attempts), 3)
+
+    def test_concurrent_writers(self):
+        """
+        Check that concurrent numbering transactions all commit
+        with the production profile.
+        """
+        workdir = tempfile.mkdtemp()
+        counts = run_benchmark(os.path.join(workdir, 'bench.db'), True, 4, 25, 5.0)
+        self.assertEqual(counts['committed'], 100)
+        self.assertEqual(counts['locked'], 0)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ReorgConfig(AppConfig):
     name = 'reorg'
+
+    def ready(self):
+        from . import signals
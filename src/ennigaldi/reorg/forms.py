@@ -0,0 +1,5 @@
+from django import forms
+
+class BatchForm(forms.Form):
+    batch_note = forms.CharField(widget=forms.Textarea, required=False)
+    retrospective = forms.BooleanField(required=False, help_text='For objects already in the collection before the batch system was adopted.')
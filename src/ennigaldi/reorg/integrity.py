@@ -0,0 +1,203 @@
+from itertools import groupby
+from django.db.models import Max, OuterRef, Q, Subquery
+from ennigaldi.writes import serialized
+from objectinfo.bulk import bulk_update
+from objectinfo.models import Hierarchy
+from .models import AccessionNumber
+from .stats import invalidate_batches
+
+###########################################################
+# Accession number integrity
+# Checks the whole numbering space in one pass over the numbers
+# sorted by (object number, batch), read in keyset-paginated
+# chunks so that memory does not grow with the register; only
+# the last number seen in each batch is kept between chunks.
+#
+# A work and its parts share a batch and object number: the
+# whole has no part number, and its parts are numbered from 1,
+# each with part_count set to the number of parts. Issues are
+# (kind, batch pk, object number, detail) tuples, where kind is
+# one of:
+#   duplicate   two wholes, or two parts, with the same number
+#   gap         object numbers never given out in a batch
+#   part_count  parts whose part_count is not the number of parts
+#   no_whole    parts whose object number has no whole
+#   orphan      parts with no partOf relation to their whole
+CHUNK = 5000
+
+def numbers(chunk=CHUNK, using=None):
+    """
+    Yields (object_number, batch_id, work_id, part_number,
+    part_count, greater) for every accession number, where greater
+    is the work the numbered work is partOf, if any.
+    """
+    greater = Hierarchy.objects.filter(lesser=OuterRef('work'), relation_type='partOf').order_by('pk').values('greater')[:1]
+    queryset = (AccessionNumber.objects.using(using).annotate(greater=Subquery(greater))
+                # Raw columns, since ordering by 'batch' would follow
+                # Batch.Meta.ordering and disagree with the keyset.
+                .order_by('object_number', 'batch_id', 'work_id')
+                .values_list('object_number', 'batch_id', 'work_id', 'part_number', 'part_count', 'greater'))
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            number, batch, work = last
+            page = queryset.filter(Q(object_number__gt=number) |
+                                   Q(object_number=number, batch_id__gt=batch) |
+                                   Q(object_number=number, batch_id=batch, work_id__gt=work))
+        rows = list(page[:chunk])
+        if not rows:
+            return
+        for row in rows:
+            yield row
+        last = rows[-1][:3]
+
+def check_group(batch, number, rows):
+    """
+    Returns the issues of the numbers sharing a batch and object
+    number.
+    """
+    issues = []
+    wholes = [r for r in rows if r[3] is None]
+    parts = [r for r in rows if r[3] is not None]
+    if len(wholes) > 1:
+        issues.append(('duplicate', batch, number, 'works %s share this number' % ', '.join(str(r[2]) for r in wholes)))
+    seen = {}
+    for r in parts:
+        seen.setdefault(r[3], []).append(r[2])
+    for part, works in sorted(seen.items()):
+        if len(works) > 1:
+            issues.append(('duplicate', batch, number, 'works %s share part %d' % (', '.join(str(w) for w in works), part)))
+    if parts:
+        wrong = [r[2] for r in parts if r[4] != len(parts)]
+        if wrong:
+            issues.append(('part_count', batch, number, '%d parts, but works %s say otherwise' % (len(parts), ', '.join(str(w) for w in wrong))))
+        if not wholes:
+            issues.append(('no_whole', batch, number, 'parts %s have no whole' % ', '.join(str(r[2]) for r in parts)))
+        else:
+            orphans = [r[2] for r in parts if r[5] != wholes[0][2]]
+            if orphans:
+                issues.append(('orphan', batch, number, 'works %s are not partOf work %d' % (', '.join(str(w) for w in orphans), wholes[0][2])))
+    return issues
+
+def scan(chunk=CHUNK, using=None):
+    """
+    Yields every issue found in the numbering space, followed by
+    the gaps of each batch.
+    """
+    last = {}
+    gaps = {}
+    rows = numbers(chunk, using)
+    for (number, batch), group in groupby(rows, key=lambda r: (r[0], r[1])):
+        group = list(group)
+        for issue in check_group(batch, number, group):
+            yield issue
+        previous = last.get(batch, 0)
+        if number > previous + 1:
+            gaps.setdefault(batch, []).append((previous + 1, number - 1))
+        last[batch] = number
+    for batch in sorted(gaps):
+        for first, end in gaps[batch]:
+            yield ('gap', batch, first, '%d-%d' % (first, end) if end > first else str(first))
+# /Accession number integrity
+###########################################################
+
+
+###########################################################
+# Accession number repairs
+# Gaps are left alone, since the numbers already marked on the
+# objects must not change; everything else is fixed by rewriting
+# numbers through objectinfo.bulk.bulk_update, so the change feed
+# and history record the repairs, in transactions of REPAIR_BATCH
+# groups each. bulk_update sends no signals, so the batch
+# statistics of the renumbered batches are dropped here.
+REPAIR_BATCH = 500
+
+def renumber(batch, number, rows, next_number):
+    """
+    Gives the extra wholes of a duplicated number new numbers at
+    the end of the batch and the extra parts new part numbers
+    after the last part, keeping the first work with each number
+    as it is, then sets the part_count of all the parts. Returns
+    the number of rows changed.
+    """
+    changed = 0
+    comment = 'Accession number repair'
+    wholes = sorted(r[2] for r in rows if r[3] is None)
+    for work in wholes[1:]:
+        changed += bulk_update(AccessionNumber.objects.filter(pk=work), {'object_number': next_number(batch)}, comment=comment)
+    parts = sorted((r[3], r[2]) for r in rows if r[3] is not None)
+    if not parts:
+        return changed
+    used = set()
+    extra = []
+    for part, work in parts:
+        if part in used:
+            extra.append(work)
+        used.add(part)
+    top = max(used)
+    for work in extra:
+        top += 1
+        changed += bulk_update(AccessionNumber.objects.filter(pk=work), {'part_number': top}, comment=comment)
+    siblings = AccessionNumber.objects.filter(batch_id=batch, object_number=number, part_number__isnull=False)
+    changed += bulk_update(siblings, {'part_count': len(parts)}, comment=comment)
+    return changed
+
+def link_orphans(rows):
+    """
+    Adds the missing partOf relation of parts that have none to
+    the whole sharing their number.
+    """
+    wholes = [r[2] for r in rows if r[3] is None]
+    created = 0
+    if len(wholes) != 1:
+        return created
+    for r in rows:
+        if r[3] is not None and r[5] is None:
+            Hierarchy.objects.create(lesser_id=r[2], greater_id=wholes[0], relation_type='partOf')
+            created += 1
+    return created
+
+@serialized
+def repair_groups(groups, next_number):
+    changed = 0
+    renumbered = set()
+    for batch, number, rows, kinds in groups:
+        if 'duplicate' in kinds or 'part_count' in kinds:
+            changed += renumber(batch, number, rows, next_number)
+            renumbered.add(batch)
+        if 'orphan' in kinds:
+            changed += link_orphans(rows)
+    invalidate_batches(renumbered)
+    return changed
+
+def repair(chunk=CHUNK, using=None):
+    """
+    Scans the numbering space and fixes duplicates, part counts
+    and missing partOf relations. Returns (issues found, rows
+    changed); gaps and parts with no whole are only reported.
+    """
+    last_numbers = dict(AccessionNumber.objects.order_by().values('batch').annotate(last=Max('object_number')).values_list('batch', 'last'))
+
+    def next_number(batch):
+        last_numbers[batch] = last_numbers.get(batch, 0) + 1
+        return last_numbers[batch]
+
+    found = 0
+    changed = 0
+    pending = []
+    for (number, batch), group in groupby(numbers(chunk, using), key=lambda r: (r[0], r[1])):
+        group = list(group)
+        issues = check_group(batch, number, group)
+        if not issues:
+            continue
+        found += len(issues)
+        pending.append((batch, number, group, set(i[0] for i in issues)))
+        if len(pending) >= REPAIR_BATCH:
+            changed += repair_groups(pending, next_number)
+            pending = []
+    if pending:
+        changed += repair_groups(pending, next_number)
+    return found, changed
+# /Accession number repairs
+###########################################################
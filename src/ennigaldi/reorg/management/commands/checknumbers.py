@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from reorg.integrity import CHUNK, repair, scan
+
+
+class Command(BaseCommand):
+    help = 'Checks accession numbers for duplicates, gaps, wrong part counts and parts with no whole, and optionally repairs them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true',
+                            help='Fix duplicates, part counts and missing partOf relations. Gaps are only reported.')
+        parser.add_argument('--chunk', type=int, default=CHUNK, help='Numbers read at a time.')
+        parser.add_argument('--database', default='default', help='Database alias to scan, e.g. reporting.')
+
+    def handle(self, *args, **options):
+        if options['repair']:
+            # Repairs read what they rewrite, so only on the primary.
+            if options['database'] != 'default':
+                raise CommandError('Repairs run on the default database only.')
+            found, changed = repair(options['chunk'])
+            self.stdout.write('%d issues found, %d rows changed.' % (found, changed))
+            return
+        counts = {}
+        for kind, batch, number, detail in scan(options['chunk'], options['database']):
+            counts[kind] = counts.get(kind, 0) + 1
+            self.stdout.write('%s\tbatch %d\tnumber %d\t%s' % (kind, batch, number, detail))
+        summary = ', '.join('%d %s' % (count, kind) for kind, count in sorted(counts.items()))
+        self.stderr.write(summary or 'No issues found.')
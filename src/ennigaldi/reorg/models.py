@@ -4,6 +4,7 @@ from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models.base import ObjectDoesNotExist
 from datetime import datetime as dt
+from ennigaldi.writes import serialized
 
 class Batch(models.Model):
     batch_datadate = models.DateField(auto_now_add=True)
@@ -13,6 +14,7 @@ class Batch(models.Model):
     batch_note = models.TextField(blank=True)
     retrospective = models.BooleanField(default=False)
 
+    @serialized
     def start_batch(batch_note, retrospective=False):
         Batch.objects.all().update(active=False)
         b = Batch()
@@ -23,6 +25,7 @@ class Batch(models.Model):
             b.batch_number = last_batch_num + 1
         else:
             b.batch_number = 1
+        b.batch_note = batch_note
         b.retrospective=True if retrospective else False
         b.active = True
         b.save()
@@ -50,6 +53,7 @@ class AccessionNumber(models.Model):
         else:
             return self.batch.__str__() + '.' + str(self.object_number)
 
+    @serialized
     def generate(work_id):
         """
         Generates an AccessionNumber based on active batch,
@@ -76,7 +80,9 @@ class AccessionNumber(models.Model):
         if hasgreater:
             generated.batch = greaternum.batch
             generated.object_number = greaternum.object_number
-            p = AccessionNumber.objects.filter(object_number=greaternum.object_number, part_number__gt=0)
+            # Object numbers restart in every batch, so the parts
+            # are those of the same number in the same batch.
+            p = AccessionNumber.objects.filter(batch=greaternum.batch, object_number=greaternum.object_number, part_number__gt=0)
             if p:
                 n = p.last().part_number
             else:
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from objectinfo.signals import register_dependent
+from .models import AccessionNumber
+from .stats import invalidate, remember_batch
+
+# The accession number is printed on the work's pages.
+register_dependent(AccessionNumber, 'pk', 'work_id')
+
+# And counted on the batch dashboard.
+post_init.connect(remember_batch, sender=AccessionNumber, dispatch_uid='batch_stats')
+post_save.connect(invalidate, sender=AccessionNumber, dispatch_uid='batch_stats')
+post_delete.connect(invalidate, sender=AccessionNumber, dispatch_uid='batch_stats')
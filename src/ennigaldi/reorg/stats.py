@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Max, Min, Sum, When
+from .models import AccessionNumber
+
+###########################################################
+# Batch statistics
+# Counts of works, parts and numbering gaps and the range of
+# registration dates of each batch, for the batch dashboard.
+# All batches missing from the cache are computed together with
+# one grouped query over AccessionNumber, and each batch stays
+# cached until one of its numbers is saved or deleted; writes
+# that send no signals, e.g. objectinfo.bulk.bulk_update, call
+# invalidate_batches themselves. Unless BATCH_STATS_CACHE names a
+# cache shared by all server processes, a save only clears the
+# copy of its own process, so entries also expire after
+# BATCH_STATS_SECONDS.
+KEY = 'reorg:batch_stats:%d'
+
+def cache():
+    return caches[getattr(settings, 'BATCH_STATS_CACHE', None) or 'default']
+
+def compute(batch_ids=None):
+    """
+    Returns {batch pk: stats} for the given batches (or all),
+    with a single GROUP BY query.
+    """
+    numbers = AccessionNumber.objects.all()
+    if batch_ids is not None:
+        numbers = numbers.filter(batch__in=batch_ids)
+    rows = numbers.order_by().values('batch').annotate(
+        numbers=Count('pk'),
+        parts=Sum(Case(When(part_number__isnull=False, then=1), default=0, output_field=IntegerField())),
+        distinct=Count('object_number', distinct=True),
+        last=Max('object_number'),
+        earliest=Min('work__data_date'),
+        latest=Max('work__data_date'),
+    )
+    stats = {}
+    for row in rows:
+        stats[row['batch']] = {
+            # A work and its parts share one object number.
+            'works': row['distinct'],
+            'parts': row['parts'],
+            'numbers': row['numbers'],
+            'last': row['last'],
+            # Object numbers are given from 1 up.
+            'gaps': row['last'] - row['distinct'],
+            'earliest': row['earliest'],
+            'latest': row['latest'],
+        }
+    return stats
+
+EMPTY = {'works': 0, 'parts': 0, 'numbers': 0, 'last': None, 'gaps': 0, 'earliest': None, 'latest': None}
+
+def batch_stats(batch_ids):
+    """
+    Returns {batch pk: stats} for batch_ids, from the cache where
+    possible.
+    """
+    keys = dict((KEY % pk, pk) for pk in batch_ids)
+    cached = cache().get_many(list(keys))
+    stats = dict((keys[key], value) for key, value in cached.items())
+    missing = [pk for pk in batch_ids if pk not in stats]
+    if missing:
+        computed = compute(missing)
+        fresh = dict((pk, computed.get(pk, EMPTY)) for pk in missing)
+        cache().set_many(dict((KEY % pk, value) for pk, value in fresh.items()), getattr(settings, 'BATCH_STATS_SECONDS', 300))
+        stats.update(fresh)
+    return stats
+
+def remember_batch(sender, instance, **kwargs):
+    # The batch a number was loaded with, so that moving it to
+    # another batch refreshes both. Read from __dict__ so that a
+    # deferred batch_id is not fetched.
+    instance._stats_batch = instance.__dict__.get('batch_id')
+
+def invalidate_batches(batch_ids):
+    """
+    Drops the cached stats of batch_ids, now and again once the
+    transaction commits, since another request may cache the old
+    figures meanwhile.
+    """
+    keys = [KEY % pk for pk in set(batch_ids) if pk is not None]
+    cache().delete_many(keys)
+    transaction.on_commit(lambda: cache().delete_many(keys))
+
+def invalidate(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    invalidate_batches([instance.batch_id, getattr(instance, '_stats_batch', None)])
+    instance._stats_batch = instance.batch_id
+# /Batch statistics
+###########################################################
@@ -1,6 +1,11 @@
 from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.core.files.uploadedfile import SimpleUploadedFile
 from .models import *
+from .integrity import scan, repair
+from .stats import batch_stats
 from objectinfo.models import ObjectRegister, Hierarchy, ObjectName, IsoLanguage
 
 class TestStartBatch(TestCase):
@@ -49,3 +54,118 @@ class TestGenerateRefid(TestCase):
         num2 = AccessionNumber.objects.get(pk=o2.pk)
         num1 = AccessionNumber.objects.get(pk=o1.pk)
         self.assertEqual(num1.part_count,2)
+
+class TestBatchStats(TestCase):
+    def setUp(self):
+        cache.clear()
+        Batch.start_batch("First campaign")
+        self.batch = Batch.objects.get(active=True)
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        # Numbers 1, 2-1, 2-2 and 5: two works with two parts, and
+        # gaps at 3 and 4.
+        for number, part in [(1, None), (2, 1), (2, 2), (5, None)]:
+            work = ObjectRegister.objects.create(preferred_title=ObjectName.objects.create(title="Sherd", lang=ptbr))
+            AccessionNumber.objects.create(work=work, batch=self.batch, object_number=number, part_number=part, part_count=2 if part else None)
+
+    def test_stats_cached(self):
+        """
+        Check that the dashboard figures come from one grouped
+        query, are cached, and are recomputed after a change.
+        """
+        with self.assertNumQueries(1):
+            stats = batch_stats([self.batch.pk])[self.batch.pk]
+        self.assertEqual((stats['works'], stats['parts'], stats['numbers'], stats['gaps']), (3, 2, 4, 2))
+        with self.assertNumQueries(0):
+            batch_stats([self.batch.pk])
+        AccessionNumber.objects.get(object_number=5).delete()
+        self.assertEqual(batch_stats([self.batch.pk])[self.batch.pk]['gaps'], 0)
+        # Moving a number to another batch refreshes both.
+        Batch.start_batch("Second campaign")
+        second = Batch.objects.get(active=True)
+        batch_stats([self.batch.pk, second.pk])
+        number = AccessionNumber.objects.get(object_number=1)
+        number.batch = second
+        number.save()
+        stats = batch_stats([self.batch.pk, second.pk])
+        self.assertEqual((stats[self.batch.pk]['works'], stats[second.pk]['works']), (1, 1))
+        response = self.client.get('/batch/')
+        self.assertContains(response, 'First campaign')
+
+class TestIntegrity(TestCase):
+    def setUp(self):
+        Batch.start_batch("Old register")
+        self.old = Batch.objects.get(active=True)
+        Batch.start_batch("New register")
+        self.new = Batch.objects.get(active=True)
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        self.works = {}
+        # Old batch: 1, 1 (duplicate), 2 with parts 2-1 and 2-2
+        # whose counts disagree, the second part not partOf 2;
+        # 5 (gap at 3-4). New batch: 2 with part 2-1.
+        layout = [
+            ('a', self.old, 1, None, None),
+            ('b', self.old, 1, None, None),
+            ('c', self.old, 2, None, None),
+            ('c1', self.old, 2, 1, 2),
+            ('c2', self.old, 2, 2, 3),
+            ('d', self.old, 5, None, None),
+            ('e', self.new, 1, None, None),
+            ('f', self.new, 2, None, None),
+            ('f1', self.new, 2, 1, 1),
+        ]
+        for name, batch, number, part, count in layout:
+            work = ObjectRegister.objects.create(preferred_title=ObjectName.objects.create(title=name, lang=ptbr))
+            self.works[name] = work
+            AccessionNumber.objects.create(work=work, batch=batch, object_number=number, part_number=part, part_count=count)
+        Hierarchy.objects.create(lesser=self.works['c1'], greater=self.works['c'], relation_type='partOf')
+        Hierarchy.objects.create(lesser=self.works['f1'], greater=self.works['f'], relation_type='partOf')
+
+    def test_scan_and_repair(self):
+        """
+        Check that a scan in small chunks finds each issue once,
+        within the right batch, and that repairing leaves only the
+        gap.
+        """
+        issues = sorted((kind, batch, number) for kind, batch, number, detail in scan(chunk=2))
+        self.assertEqual(issues, [
+            ('duplicate', self.old.pk, 1),
+            ('gap', self.old.pk, 3),
+            ('orphan', self.old.pk, 2),
+            ('part_count', self.old.pk, 2),
+        ])
+        found, changed = repair(chunk=2)
+        self.assertEqual(found, 3)
+        self.assertEqual(AccessionNumber.objects.get(work=self.works['b']).object_number, 6)
+        self.assertEqual(AccessionNumber.objects.get(work=self.works['c2']).part_count, 2)
+        self.assertTrue(Hierarchy.objects.filter(lesser=self.works['c2'], greater=self.works['c']).exists())
+        self.assertEqual([i[0] for i in scan()], ['gap'])
+
+    def test_repair_command(self):
+        """
+        Check that repairs are refused on another database.
+        """
+        with self.assertRaises(CommandError):
+            call_command('checknumbers', repair=True, database='reporting')
+        self.assertEqual(AccessionNumber.objects.get(work=self.works['b']).object_number, 1)
+
+    def test_repair_refreshes_stats(self):
+        """
+        Check that a repair, which sends no signals, drops the cached
+        figures of the batches it renumbered.
+        """
+        cache.clear()
+        self.assertEqual(batch_stats([self.old.pk])[self.old.pk]['last'], 5)
+        repair()
+        self.assertEqual(batch_stats([self.old.pk])[self.old.pk]['last'], 6)
+
+    def test_generate_scoped_to_batch(self):
+        """
+        Check that numbering a part only counts the parts of the
+        same number in the same batch.
+        """
+        ptbr = IsoLanguage.objects.get(iso="pt_BR")
+        part = ObjectRegister.objects.create(preferred_title=ObjectName.objects.create(title="f2", lang=ptbr))
+        Hierarchy.objects.create(lesser=part, greater=self.works['f'], relation_type='partOf')
+        AccessionNumber.generate(part.pk)
+        self.assertEqual(AccessionNumber.objects.get(work=part).part_number, 2)
+        self.assertEqual(AccessionNumber.objects.get(work=self.works['c1']).part_count, 2)
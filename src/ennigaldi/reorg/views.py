@@ -1,9 +1,29 @@
-from django.shortcuts import render
-from django.views import View
+from django.contrib.auth.decorators import login_required
+from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+from django.views.generic.edit import FormView
+from django.views.generic.list import ListView
+from .forms import BatchForm
 from .models import Batch
+from .stats import batch_stats
 
-class StartBatch(View):
-    pass
+@method_decorator(login_required, name='dispatch')
+class StartBatch(FormView):
+    form_class = BatchForm
+    template_name = 'reorg/batch_form.html'
+    success_url = reverse_lazy('batch_list')
 
-class BatchList(View):
-    pass
+    def form_valid(self, form):
+        Batch.start_batch(form.cleaned_data['batch_note'], retrospective=form.cleaned_data['retrospective'])
+        return super(StartBatch, self).form_valid(form)
+
+class BatchList(ListView):
+    model = Batch
+    paginate_by = 25
+
+    def get_context_data(self, **kwargs):
+        data = super(BatchList, self).get_context_data(**kwargs)
+        batches = list(data['object_list'])
+        stats = batch_stats([b.pk for b in batches])
+        data['batches'] = [(b, stats[b.pk]) for b in batches]
+        return data
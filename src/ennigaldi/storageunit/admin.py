@@ -1,4 +1,8 @@
 from django.contrib import admin
+from objectinfo.admin import AutocompleteAdmin
 from .models import Unit
 
-admin.site.register(Unit)
+class UnitAdmin(AutocompleteAdmin):
+    autocomplete_sources = {'parent': 'unit'}
+
+admin.site.register(Unit, UnitAdmin)
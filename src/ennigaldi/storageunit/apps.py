@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class StorageunitConfig(AppConfig):
     name = 'storageunit'
+
+    def ready(self):
+        from . import signals
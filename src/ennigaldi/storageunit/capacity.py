@@ -0,0 +1,153 @@
+from objectinfo.models import ObjectRegister, ObjectUnit, Dimension
+from .models import Unit
+
+###########################################################
+# Storage capacity
+# How much of each unit's area, volume and load is taken by the
+# works kept in it or anywhere below it. The whole building is
+# computed in one pass over four queries (units, current
+# dimensions, locations, normal units), summed per unit and then
+# rolled up from the leaves to the root, instead of walking each
+# unit's subtree and each work's dimensions separately.
+
+# Values of dimension_part that describe the whole work; they
+# are preferred over measurements of a part.
+WHOLE = ('', 'total')
+TYPES = ('width', 'length', 'depth', 'diameter', 'height', 'area', 'weight')
+MEASURES = ('area', 'volume', 'load')
+
+def current_dimensions(using=None, works=None):
+    """
+    Returns {work_id: {dimension type: value}} with the latest
+    valid measurement of each type, preferring whole-work ones,
+    for every work or only the pks in works.
+    """
+    rows = (Dimension.objects.using(using)
+            .filter(dimension_deprecated=False, dimension_type__in=TYPES).order_by()
+            .values_list('work_id', 'dimension_type', 'dimension_part', 'dimension_value_date', 'pk', 'dimension_value'))
+    if works is not None:
+        rows = rows.filter(work__in=works)
+    best = {}
+    for work, kind, part, date, pk, value in rows.iterator():
+        rank = ((part or '').strip().lower() in WHOLE, date, pk)
+        current = best.get((work, kind))
+        if current is None or rank > current[0]:
+            best[(work, kind)] = (rank, value)
+    dimensions = {}
+    for (work, kind), (rank, value) in best.items():
+        dimensions.setdefault(work, {})[kind] = value
+    return dimensions
+
+def size(dims):
+    """
+    Returns the (footprint in cm², volume in litres, load in kg)
+    of a work from its dimensions in mm, cm² and g, or None for
+    the measures that cannot be worked out. Round works are
+    counted by their bounding box.
+    """
+    width = dims.get('width') or dims.get('length') or dims.get('diameter')
+    depth = dims.get('depth') or dims.get('diameter')
+    if width and depth:
+        area = width * depth / 100.0
+    else:
+        area = dims.get('area')
+    height = dims.get('height')
+    volume = area * height / 10000.0 if area and height else None
+    load = dims['weight'] / 1000.0 if dims.get('weight') else None
+    return area, volume, load
+
+def current_units(using=None):
+    """
+    Returns {work_id: unit_id} with the latest location of each
+    work, or its normal unit if it was never located.
+    """
+    located = {}
+    rows = ObjectUnit.objects.using(using).order_by().values_list('work_id', 'unit_id', 'date', 'pk')
+    for work, unit, date, pk in rows.iterator():
+        if work not in located or (date, pk) > located[work][0]:
+            located[work] = ((date, pk), unit)
+    units = dict((work, unit) for work, (rank, unit) in located.items())
+    normal = ObjectRegister.objects.using(using).filter(normal_unit__isnull=False).values_list('pk', 'normal_unit_id')
+    for work, unit in normal.iterator():
+        units.setdefault(work, unit)
+    return units
+
+class Usage(object):
+    """
+    The capacity of one unit and what its subtree holds.
+    """
+    def __init__(self, pk, parent_id, label, capacity):
+        self.pk = pk
+        self.parent_id = parent_id
+        self.label = label
+        self.capacity = dict(zip(MEASURES, capacity))
+        self.used = dict((m, 0.0) for m in MEASURES)
+        self.works = 0
+        # Works of which some measure could not be worked out.
+        self.unmeasured = 0
+
+    def add(self, measures, works=1, unmeasured=0):
+        for m, value in zip(MEASURES, measures):
+            self.used[m] += value or 0
+        self.works += works
+        self.unmeasured += unmeasured
+
+    def ratio(self, measure):
+        if not self.capacity[measure]:
+            return None
+        return self.used[measure] / self.capacity[measure]
+
+    @property
+    def over(self):
+        """
+        The measures whose capacity is exceeded.
+        """
+        return [m for m in MEASURES if self.capacity[m] and self.used[m] > self.capacity[m]]
+
+def usage(using=None):
+    """
+    Returns {unit pk: Usage} for every unit, with the totals of
+    the unit and all units below it.
+    """
+    rows = Unit.objects.using(using).values_list('pk', 'parent_id', 'acronym', 'name', 'capacity_area', 'capacity_volume', 'capacity_load')
+    units = dict((row[0], row[1:]) for row in rows)
+
+    labels = {}
+    def label(pk):
+        if pk not in labels:
+            parent, acronym, name = units[pk][:3]
+            labels[pk] = (label(parent) + ' › ' if parent is not None else '') + acronym + ' ' + name
+        return labels[pk]
+
+    depths = {}
+    def depth(pk):
+        if pk not in depths:
+            parent = units[pk][0]
+            depths[pk] = depth(parent) + 1 if parent is not None else 0
+        return depths[pk]
+
+    result = dict((pk, Usage(pk, row[0], label(pk), row[3:])) for pk, row in units.items())
+
+    dimensions = current_dimensions(using)
+    for work, unit in current_units(using).items():
+        if unit not in result:
+            continue
+        measures = size(dimensions.get(work, {}))
+        result[unit].add(measures, unmeasured=1 if None in measures else 0)
+
+    # Leaves first, so each unit is complete before it is added
+    # to its parent.
+    for pk in sorted(result, key=depth, reverse=True):
+        entry = result[pk]
+        if entry.parent_id is not None:
+            result[entry.parent_id].add([entry.used[m] for m in MEASURES], entry.works, entry.unmeasured)
+    return result
+
+def over_capacity(using=None):
+    """
+    Returns the Usage of the units holding more than they can,
+    sorted by path.
+    """
+    return sorted((u for u in usage(using).values() if u.over), key=lambda u: u.label)
+# /Storage capacity
+###########################################################
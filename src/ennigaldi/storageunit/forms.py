@@ -4,7 +4,7 @@ from .models import Unit
 class ParentUnitForm(ModelForm):
     class Meta:
         model = Unit
-        fields = ['unit_type', 'acronym', 'name', 'note']
+        fields = ['unit_type', 'acronym', 'name', 'note', 'capacity_area', 'capacity_volume', 'capacity_load']
 
 class ChildUnitForm(ModelForm):
     class Meta:
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from storageunit.capacity import usage, MEASURES
+
+
+class Command(BaseCommand):
+    help = 'Reports the area, volume and load used in each storage unit against its capacity.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--over', action='store_true', help='Only list units over capacity.')
+        parser.add_argument('--database', default='default', help='Database alias to read from, e.g. reporting.')
+
+    def handle(self, *args, **options):
+        units = sorted(usage(options['database']).values(), key=lambda u: u.label)
+        for unit in units:
+            if not any(unit.capacity.values()) or (options['over'] and not unit.over):
+                continue
+            measures = []
+            for m in MEASURES:
+                ratio = unit.ratio(m)
+                if ratio is not None:
+                    measures.append('%s %d%%' % (m, round(ratio * 100)))
+            flag = ' OVER' if unit.over else ''
+            self.stdout.write('%s: %d works, %s%s' % (unit.label, unit.works, ', '.join(measures), flag))
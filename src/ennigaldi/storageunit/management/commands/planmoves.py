@@ -0,0 +1,44 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from storageunit.models import Unit
+from storageunit.relocation import plan, leaf_targets, works_in
+
+
+class Command(BaseCommand):
+    help = 'Plans (and optionally records) the relocation of the works in some units into the shelves of others.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='source', required=True,
+                            help='Comma-separated pks of the units whose works are moved.')
+        parser.add_argument('--into', required=True,
+                            help='Comma-separated pks of the units to fill; their leaf units with an area capacity are used.')
+        parser.add_argument('--apply', action='store_true', help='Record the planned moves as new locations.')
+        parser.add_argument('--note', default='', help='Note for the new locations.')
+
+    def units(self, value):
+        try:
+            pks = [int(pk) for pk in value.split(',') if pk.strip()]
+        except ValueError:
+            raise CommandError('Expected comma-separated unit pks, got %s.' % value)
+        if Unit.objects.filter(pk__in=pks).count() != len(set(pks)):
+            raise CommandError('Unknown unit in %s.' % value)
+        return pks
+
+    def handle(self, *args, **options):
+        works = works_in(self.units(options['source']))
+        targets = leaf_targets(self.units(options['into']))
+        if not targets:
+            raise CommandError('No units with an area capacity to move into.')
+        result = plan(works, targets)
+        writer = csv.writer(self.stdout)
+        writer.writerow(['work_id', 'from_unit', 'to_unit'])
+        for work, source, to in result.moves:
+            writer.writerow([work, source or '', to])
+        for work in result.unplaced:
+            writer.writerow([work, '', 'UNPLACED'])
+        for work in result.unmeasured:
+            writer.writerow([work, '', 'UNMEASURED'])
+        self.stderr.write('%d works placed, %d do not fit, %d have no footprint.' % (len(result.moves), len(result.unplaced), len(result.unmeasured)))
+        if options['apply']:
+            count = result.apply(note=options['note'])
+            self.stderr.write('%d locations recorded.' % count)
@@ -19,14 +19,22 @@ class Unit(models.Model):
     # Root-level locations will have this set to NULL:
     parent = models.ForeignKey('self', models.CASCADE, related_name="children_set", null=True, blank=True, help_text="Storage units are arranged in hierarchies, such as:<br />Room > Furniture > Shelf")
     # A code that identifies the location, if any.
-    acronym = models.CharField(max_length=15, help_text="A code or number that identifies the location, if any. Best practices:<br />- Rooms should be numbered<br />- Shelves should be designated with capital letters starting from the bottom")
+    acronym = models.CharField(max_length=15, db_index=True, help_text="A code or number that identifies the location, if any. Best practices:<br />- Rooms should be numbered<br />- Shelves should be designated with capital letters starting from the bottom")
     # Keep the name short, follow conventions
-    name = models.CharField(max_length=31, blank=True, help_text="Use if needed to clarify the acronym only. Sould be clear and short")
+    name = models.CharField(max_length=31, blank=True, db_index=True, help_text="Use if needed to clarify the acronym only. Sould be clear and short")
     unit_type = models.CharField(max_length=31, choices=unit_types, default='exhibit')
     # Spectrum 4.0 Location note
     # VRA Core 4   location > notes
     # Notes on the location or its name (e.g. "so-called", "condemned", etc.)
     note = models.TextField(blank=True, help_text="Any required observations on the identification or conditions of this unit")
+    # Usable capacity, for storage planning (see capacity.py).
+    # Left blank where unknown or meaningless, e.g. a building.
+    capacity_area = models.PositiveIntegerField(blank=True, null=True, help_text="Usable floor or shelf area, in cm²")
+    capacity_volume = models.PositiveIntegerField(blank=True, null=True, help_text="Usable volume, in litres")
+    capacity_load = models.PositiveIntegerField(blank=True, null=True, help_text="Maximum load, in kg")
+    # Bumped on every save of the unit or of one of its children,
+    # for conditional GET on the unit pages.
+    last_modified = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         if self.parent:
@@ -35,8 +43,41 @@ class Unit(models.Model):
             parent_string = ''
         return parent_string + self.acronym + ' ' + self.name
 
+    def subtree_ids(self):
+        """
+        Returns the pks of this unit and of every unit below it,
+        with one query per level of the hierarchy.
+        """
+        ids = [self.pk]
+        level = [self.pk]
+        while level:
+            level = list(Unit.objects.filter(parent__in=level).values_list('pk', flat=True))
+            ids.extend(level)
+        return ids
+
     def get_absolute_url(self):
         return reverse('unit_detail', kwargs={'pk': self.pk})
 
     class Meta:
         unique_together = ('parent', 'acronym')
+
+def path_labels(units):
+    """
+    Returns {pk: label} for a list of units, with the labels
+    __str__ would give, but reading the ancestors with one query
+    per level instead of one per unit and level.
+    """
+    rows = dict((u.pk, (u.parent_id, u.acronym, u.name)) for u in units)
+    def parents():
+        return set(parent for parent, acronym, name in rows.values() if parent is not None) - set(rows)
+    missing = parents()
+    while missing:
+        level = Unit.objects.filter(pk__in=missing).values_list('pk', 'parent_id', 'acronym', 'name')
+        rows.update((pk, (parent, acronym, name)) for pk, parent, acronym, name in level)
+        missing = parents()
+
+    def label(pk):
+        parent, acronym, name = rows[pk]
+        prefix = label(parent) + ' › ' if parent is not None else ''
+        return prefix + acronym + ' ' + name
+    return dict((u.pk, label(u.pk)) for u in units)
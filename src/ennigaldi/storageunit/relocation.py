@@ -0,0 +1,183 @@
+from django.db.models import Max
+from django.utils import timezone
+from changefeed.models import change, record_many, row_data
+from ennigaldi.writes import serialized
+from history.models import Delta
+from history.revisions import dumps, label, plain, save_revision, tracked_fields
+from objectinfo.bulk import chunks
+from objectinfo.models import ObjectRegister, ObjectUnit
+from .capacity import MEASURES, current_dimensions, current_units, size, usage
+from .models import Unit
+
+###########################################################
+# Relocation planning
+# Assigns a set of works to a set of target units (usually the
+# shelves of a reorganised reserve) so that no target goes over
+# its area, volume or load capacity. This is a vector bin-packing
+# problem; the first-fit decreasing heuristic used here places
+# the largest works first, each into the first target with room,
+# which is fast (works × targets comparisons at worst) and in
+# practice close to the fewest shelves.
+#
+# A work whose normal unit is one of the targets, or contains
+# one, is tried there first.
+
+class Plan(object):
+    def __init__(self):
+        # [(work_id, current unit_id or None, target unit_id)]
+        self.moves = []
+        # Works that fit in no target.
+        self.unplaced = []
+        # Works whose footprint is unknown, so were not placed.
+        self.unmeasured = []
+
+    def __len__(self):
+        return len(self.moves)
+
+    def changed(self):
+        return [m for m in self.moves if m[1] != m[2]]
+
+    def apply(self, user=None, note=''):
+        """
+        Records the planned moves as new locations; see
+        apply_moves.
+        """
+        return apply_moves(self.changed(), user, note)
+
+def parents(using=None):
+    return dict(Unit.objects.using(using).values_list('pk', 'parent_id'))
+
+def ancestors(pk, parent_of):
+    while pk is not None:
+        yield pk
+        pk = parent_of.get(pk)
+
+def plan(work_ids, target_ids, using=None):
+    """
+    Returns a Plan placing the works in work_ids into the units
+    in target_ids, given the room left in each by the works that
+    stay where they are.
+    """
+    work_ids = set(work_ids)
+    parent_of = parents(using)
+    totals = usage(using)
+    dimensions = current_dimensions(using)
+    located = current_units(using)
+    normal = dict(ObjectRegister.objects.using(using).filter(normal_unit__isnull=False).values_list('pk', 'normal_unit_id'))
+
+    # Room left in each target once the works being moved are
+    # taken out of it. Missing capacities are unlimited.
+    targets = [t for t in target_ids if t in totals]
+    room = {}
+    for t in targets:
+        entry = totals[t]
+        room[t] = [entry.capacity[m] - entry.used[m] if entry.capacity[m] else None for m in MEASURES]
+    target_set = set(targets)
+    sizes = {}
+    for work in work_ids:
+        sizes[work] = size(dimensions.get(work, {}))
+        unit = located.get(work)
+        if unit is None:
+            continue
+        for up in ancestors(unit, parent_of):
+            if up in target_set:
+                for i, value in enumerate(sizes[work]):
+                    if room[up][i] is not None and value:
+                        room[up][i] += value
+
+    result = Plan()
+
+    def fits(t, measures):
+        return all(free is None or (value or 0) <= free for free, value in zip(room[t], measures))
+
+    def place(work, t, measures):
+        for i, value in enumerate(measures):
+            if room[t][i] is not None:
+                room[t][i] -= value or 0
+        result.moves.append((work, located.get(work), t))
+
+    # Targets at or below each unit, in the order they were
+    # given, to try a work's normal unit first.
+    below = {}
+    for t in targets:
+        for up in ancestors(t, parent_of):
+            below.setdefault(up, []).append(t)
+
+    measured = []
+    for work in work_ids:
+        if sizes[work][0] is None:
+            result.unmeasured.append(work)
+        else:
+            measured.append(work)
+    measured.sort(key=lambda w: (sizes[w][0], sizes[w][1] or 0, sizes[w][2] or 0, -w), reverse=True)
+
+    for work in measured:
+        measures = sizes[work]
+        for t in below.get(normal.get(work), []) + targets:
+            if fits(t, measures):
+                place(work, t, measures)
+                break
+        else:
+            result.unplaced.append(work)
+    result.unmeasured.sort()
+    result.unplaced.sort()
+    return result
+
+def leaf_targets(unit_ids, using=None):
+    """
+    Returns the units with an area capacity at or below the given
+    units that have no children, e.g. the shelves of a room.
+    """
+    parent_of = parents(using)
+    has_children = set(p for p in parent_of.values() if p is not None)
+    roots = set(unit_ids)
+    with_capacity = set(Unit.objects.using(using).filter(capacity_area__isnull=False).values_list('pk', flat=True))
+    leaves = [pk for pk in parent_of if pk not in has_children and pk in with_capacity and roots & set(ancestors(pk, parent_of))]
+    return sorted(leaves)
+
+def works_in(unit_ids, using=None):
+    """
+    Returns the pks of the works currently located at or below
+    the given units.
+    """
+    parent_of = parents(using)
+    roots = set(unit_ids)
+    return sorted(work for work, unit in current_units(using).items() if roots & set(ancestors(unit, parent_of)))
+
+@serialized
+def apply_moves(moves, user=None, note=''):
+    """
+    Creates one ObjectUnit per (work_id, from, to) move with a
+    single INSERT, and records what the model signals would have:
+    the works' and units' last_modified stamps, change feed
+    entries and one history revision. Returns the number of
+    locations created.
+    """
+    if not moves:
+        return 0
+    now = timezone.now()
+    start = ObjectUnit.objects.aggregate(last=Max('pk'))['last'] or 0
+    ObjectUnit.objects.bulk_create([ObjectUnit(work_id=work, unit_id=to, date=now, note=note) for work, source, to in moves])
+    # Writes are serialised, so the new rows are the ones after
+    # the previous largest pk.
+    created = list(ObjectUnit.objects.filter(pk__gt=start).order_by('pk'))
+
+    works = set(work for work, source, to in moves)
+    units = set(u for work, source, to in moves for u in (source, to) if u is not None)
+    for part in chunks(works):
+        ObjectRegister.objects.filter(pk__in=part).update(last_modified=now)
+    for part in chunks(units):
+        Unit.objects.filter(pk__in=part).update(last_modified=now)
+
+    record_many([change(ObjectUnit, obj.pk, 'save', row_data(obj), [obj.work_id]) for obj in created])
+    if user is not None and not user.is_authenticated:
+        user = None
+    fields = tracked_fields(ObjectUnit)
+    save_revision([
+        Delta(model=label(ObjectUnit), object_pk=str(obj.pk), work=obj.work_id, action='create',
+              changes=dumps(dict((f.attname, plain(f.value_from_object(obj))) for f in fields)))
+        for obj in created
+    ], user, note or 'Relocation')
+    return len(created)
+# /Relocation planning
+###########################################################
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+from .models import Unit
+
+# A unit page lists the unit's children, so saving or deleting
+# a child changes its parent's page as well.
+def touch_parent(sender, instance, **kwargs):
+    if kwargs.get('raw') or instance.parent_id is None:
+        return
+    Unit.objects.filter(pk=instance.parent_id).update(last_modified=timezone.now())
+
+post_save.connect(touch_parent, sender=Unit, dispatch_uid='touch_parent')
+post_delete.connect(touch_parent, sender=Unit, dispatch_uid='touch_parent')
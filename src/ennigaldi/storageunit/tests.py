@@ -1,5 +1,9 @@
 from django.test import TestCase
+from changefeed.models import Change
+from objectinfo.models import IsoLanguage, ObjectName, ObjectRegister, ObjectUnit, Dimension
+from .capacity import usage, over_capacity
 from .models import Unit
+from .relocation import plan, leaf_targets, works_in
 
 class TestStorageUnit(TestCase):
     def setUp(self):
@@ -24,3 +28,78 @@ class TestStorageUnit(TestCase):
         self.assertTrue("Main Building" in r01f01.__str__())
         self.assertTrue("Greek" in r01f01.__str__())
         self.assertTrue("A" in r01f02a.__str__())
+
+class TestCapacity(TestCase):
+    def setUp(self):
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        self.room = Unit.objects.create(acronym='R01', name="Reserve", capacity_area=2000)
+        self.shelf = Unit.objects.create(parent=self.room, acronym='A', name="Shelf", capacity_area=500, capacity_load=10)
+        for i, (width, depth, weight) in enumerate([(200, 150, 4000), (300, 100, 8000), (100, 100, None)]):
+            work = ObjectRegister.objects.create(preferred_title=ObjectName.objects.create(title="Jar %d" % i, lang=ptbr))
+            ObjectUnit.objects.create(work=work, unit=self.shelf)
+            Dimension.objects.create(work=work, dimension_type='width', dimension_value=width)
+            Dimension.objects.create(work=work, dimension_type='depth', dimension_value=depth)
+            if weight:
+                Dimension.objects.create(work=work, dimension_type='weight', dimension_value=weight)
+        # A superseded measurement is ignored.
+        Dimension.objects.create(work=work, dimension_type='width', dimension_value=900, dimension_deprecated=True)
+
+    def test_rollup(self):
+        """
+        Check that footprints and loads are summed per unit and
+        rolled up to the parent, and overloads flagged.
+        """
+        with self.assertNumQueries(4):
+            result = usage()
+        shelf, room = result[self.shelf.pk], result[self.room.pk]
+        self.assertEqual(shelf.used['area'], 300 + 300 + 100)
+        self.assertEqual(shelf.used['load'], 12)
+        self.assertEqual(shelf.unmeasured, 3)
+        self.assertEqual(room.works, 3)
+        self.assertEqual(room.used['area'], 700)
+        self.assertEqual(shelf.over, ['area', 'load'])
+        self.assertEqual(room.over, [])
+        self.assertEqual([u.pk for u in over_capacity()], [self.shelf.pk])
+        response = self.client.get('/unit/capacity/', {'over': 1})
+        self.assertContains(response, 'R01 Reserve › A Shelf')
+
+class TestRelocation(TestCase):
+    def setUp(self):
+        ptbr = IsoLanguage.objects.create(iso="pt_BR", language="Portuguese (Brazil)")
+        self.old = Unit.objects.create(acronym='R01', name="Old reserve")
+        self.new = Unit.objects.create(acronym='R02', name="New reserve")
+        self.a = Unit.objects.create(parent=self.new, acronym='A', name="Shelf", capacity_area=1100)
+        self.b = Unit.objects.create(parent=self.new, acronym='B', name="Shelf", capacity_area=600)
+        self.works = []
+        # Footprints of about 600, 502, 396 and 81 cm²; the last
+        # work would also fit on shelf A, but belongs on B.
+        for i, side in enumerate([245, 224, 199, 90]):
+            title = ObjectName.objects.create(title="Chest %d" % i, lang=ptbr)
+            work = ObjectRegister.objects.create(preferred_title=title, normal_unit=self.b if i == 3 else None)
+            ObjectUnit.objects.create(work=work, unit=self.old)
+            Dimension.objects.create(work=work, dimension_type='width', dimension_value=side)
+            Dimension.objects.create(work=work, dimension_type='depth', dimension_value=side)
+            self.works.append(work.pk)
+        title = ObjectName.objects.create(title="Unmeasured", lang=ptbr)
+        self.unmeasured = ObjectRegister.objects.create(preferred_title=title)
+        ObjectUnit.objects.create(work=self.unmeasured, unit=self.old)
+
+    def test_plan_and_apply(self):
+        """
+        Check that works are packed largest first without going
+        over capacity, normal units are preferred, and applying
+        the plan records one new location per move.
+        """
+        works = works_in([self.old.pk])
+        self.assertEqual(works, sorted(self.works + [self.unmeasured.pk]))
+        targets = leaf_targets([self.new.pk])
+        self.assertEqual(targets, [self.a.pk, self.b.pk])
+        result = plan(works, targets)
+        placed = dict((work, to) for work, source, to in result.moves)
+        self.assertEqual(placed, {self.works[0]: self.a.pk, self.works[1]: self.b.pk, self.works[2]: self.a.pk, self.works[3]: self.b.pk})
+        self.assertEqual(result.unplaced, [])
+        self.assertEqual(result.unmeasured, [self.unmeasured.pk])
+        seq = Change.objects.order_by('-seq').values_list('seq', flat=True).first()
+        self.assertEqual(result.apply(note='Move to R02'), 4)
+        self.assertEqual(ObjectUnit.objects.filter(note='Move to R02').count(), 4)
+        self.assertEqual(Change.objects.filter(seq__gt=seq, model='objectinfo.objectunit').count(), 4)
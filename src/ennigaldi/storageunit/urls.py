@@ -7,5 +7,6 @@ urlpatterns = [
     url(r'^(?P<pk>[0-9]+)/edit/$', views.UpdateUnit.as_view(), name='update_unit'),
     url(r'^(?P<pk>[0-9]+)/delete/$', views.DeleteUnit.as_view(), name='delete_unit'),
     url(r'^add/$', views.AddUnit.as_view(), name='field_entry_form'),
+    url(r'^capacity/$', views.capacity_report, name='capacity_report'),
     url(r'^', views.TopLevelUnits.as_view(), name='unit_list_top'),
 ]
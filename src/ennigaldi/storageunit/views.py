@@ -7,9 +7,11 @@ from django.shortcuts import render, redirect
 from django.urls import reverse_lazy, reverse
 from django.utils.decorators import method_decorator
 from django.views import View
+from django.views.decorators.http import condition
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.views.generic.list import ListView
+from .capacity import usage, MEASURES
 from .models import Unit
 from .forms import ParentUnitForm, ChildUnitForm, unit_formset
 
@@ -23,6 +25,17 @@ class TopLevelUnits(ListView):
     paginate_by = 25
     queryset = Unit.objects.filter(parent=None)
 
+def unit_modified(request, pk, **kwargs):
+    if not hasattr(request, '_unit_modified'):
+        request._unit_modified = Unit.objects.filter(pk=pk).values_list('last_modified', flat=True).first()
+    return request._unit_modified
+
+def unit_etag(request, pk, **kwargs):
+    modified = unit_modified(request, pk)
+    if modified:
+        return 'u%s-%d' % (pk, int(modified.timestamp() * 1000000))
+
+@method_decorator(condition(etag_func=unit_etag, last_modified_func=unit_modified), name='dispatch')
 class UnitDetail(DetailView):
     model = Unit
     # query_pk_and_slug = True
@@ -31,7 +44,7 @@ class UnitDetail(DetailView):
 class AddUnit(CreateView):
     model = Unit
     form = ParentUnitForm
-    fields = ['unit_type', 'acronym', 'name', 'note']
+    fields = ['unit_type', 'acronym', 'name', 'note', 'capacity_area', 'capacity_volume', 'capacity_load']
 
     def get_context_data(self, **kwargs):
         data = super(AddUnit, self).get_context_data(**kwargs)
@@ -59,7 +72,7 @@ class AddUnit(CreateView):
 class UpdateUnit(UpdateView):
     model = Unit
     form = ParentUnitForm
-    fields = ['unit_type', 'acronym', 'name', 'parent', 'note']
+    fields = ['unit_type', 'acronym', 'name', 'parent', 'note', 'capacity_area', 'capacity_volume', 'capacity_load']
 
     def get_context_data(self, **kwargs):
         data = super(UpdateUnit, self).get_context_data(**kwargs)
@@ -88,3 +101,15 @@ class UpdateUnit(UpdateView):
 class DeleteUnit(DeleteView):
     model = Unit
     success_url = reverse_lazy('unit_list')
+
+def capacity_report(request):
+    """
+    Lists the space, volume and load used in every unit with a
+    capacity set, or only the units over capacity with ?over=1.
+    """
+    units = sorted(usage().values(), key=lambda u: u.label)
+    units = [u for u in units if any(u.capacity.values())]
+    if request.GET.get('over'):
+        units = [u for u in units if u.over]
+    rows = [(u, [(m, u.used[m], u.capacity[m], u.ratio(m)) for m in MEASURES]) for u in units]
+    return render(request, 'storageunit/capacity_report.html', {'rows': rows, 'measures': MEASURES})